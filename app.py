@@ -2,29 +2,39 @@ from flask import Flask
 from flask_cors import CORS
 from src.virtualization.digital_replica.schema_registry import SchemaRegistry
 from src.services.database_service import DatabaseService
+from src.services.async_database_service import AsyncDatabaseService
 from src.digital_twin.dt_factory import DTFactory
 from src.digital_twin.house_factory import HouseFactory
+from src.services.fetch_weather import FetchWeatherService
+from src.services.weather_cache import WeatherCache
+from src.services.notification_dispatcher import NotificationDispatcher
 from src.application.api import register_api_blueprints
 from config.config_loader import ConfigLoader
 from src.application.ventilation_api import register_led_blueprint
 from src.application.user_rooms_api import register_user_blueprint
 from src.application.housing_api import register_housing_blueprint
+from src.application.metrics_api import register_metrics_blueprint, register_component_stats
 from src.application.mqtt_handler import VentilationMQTTHandler, MeasurementMQTTHandler
 
 from pyngrok import ngrok
 from telegram.ext import Application, CommandHandler, MessageHandler, filters
 import asyncio
 import nest_asyncio
+from threading import Thread
 from src.application.telegram.config.settings import (
     TELEGRAM_TOKEN,
     NGROK_TOKEN,
     WEBHOOK_PATH,
     TELEGRAM_BLUE_PRINTS,
+    TELEGRAM_CONCURRENT_UPDATES,
 )
 from src.application.mqtt_settings import (
     MQTT_USERNAME,
     MQTT_PASSWORD,
     MQTT_BROKER_URL,
+    MQTT_PORT,
+    MQTT_TLS,
+    MQTT_EMBEDDED_INGEST,
 )
 from src.application.telegram.handlers.base_handlers import (
     start_handler,
@@ -77,13 +87,34 @@ class FlaskServer:
         # Initialize MQTT config
         self.app.config["MQTT_CONFIG"] = {
             "broker_url": MQTT_BROKER_URL,
-            "port": 8883,
+            "port": MQTT_PORT,
+            "tls": MQTT_TLS,
             "username": MQTT_USERNAME,
             "password": MQTT_PASSWORD,
+            "ingest": {
+                "workers": 2,
+                "queue_size": 10000,
+                "batch_size": 200,
+                "max_linger": 0.05,
+                # Latest room values are written at most every 30 s per
+                # room, or at once when they move by the default deltas
+                "write_behind": {"interval": 30.0},
+            },
+        }
+        # Humidity alerting: thresholds, hysteresis and reminder cooldown
+        self.app.config["ALERT_CONFIG"] = {
+            "humidity_threshold": 60.0,
+            "clear_threshold": 55.0,
+            "difference_threshold": 0.0,
+            "difference_clear_threshold": -0.5,
+            "cooldown": 1800.0,
+            "max_level": 3,
+            "min_hold": 300.0,
         }
         # Initialize MQTT handler
         self.app.mqtt_measurement_handler = MeasurementMQTTHandler(self.app)
         self.app.mqtt_ventilation_handler = VentilationMQTTHandler(self.app)
+        self.telegram_application.bot_data["MQTT_VENTILATION_HANDLER"] = self.app.mqtt_ventilation_handler
 
     def _init_components(self):
         try:
@@ -129,13 +160,24 @@ class FlaskServer:
             ####################################################
 
             # TELEGRAM INITIALIZATION########################
-            application = Application.builder().token(TELEGRAM_TOKEN).build()
+            application = (
+                Application.builder()
+                .token(TELEGRAM_TOKEN)
+                .concurrent_updates(TELEGRAM_CONCURRENT_UPDATES)
+                .build()
+            )
             application.loop = loop
             setup_handlers(application)
             init_routes(application)
             loop.run_until_complete(application.initialize())
             loop.run_until_complete(application.start())
             loop.run_until_complete(application.bot.set_webhook(webhook_url))
+            # The loop keeps running in its own thread: application.start()
+            # left the update fetcher there, which handles the updates the
+            # webhook queues concurrently
+            self.telegram_application = application
+            self.telegram_thread = Thread(target=loop.run_forever, name="telegram-loop", daemon=True)
+            self.telegram_thread.start()
             ################################################
 
             # Initialize DatabaseService
@@ -143,18 +185,52 @@ class FlaskServer:
                 connection_string=connection_string,
                 db_name=db_config["settings"]["name"],
                 schema_registry=schema_registry,
+                client_options=ConfigLoader.build_client_options(db_config),
+                profiles=ConfigLoader.load_profiles(db_config),
+                cache_config=ConfigLoader.load_cache_config(db_config),
             )
             db_service.connect()
+            db_service.ensure_indexes(rebuild=db_config["settings"].get("rebuild_indexes", False))
+            # Awaitable view for the Telegram handlers on the event loop
+            async_db_service = AsyncDatabaseService(
+                db_service, max_workers=ConfigLoader.load_async_workers(db_config)
+            )
+            # The handlers run on the Telegram loop thread, outside any Flask
+            # app context, and read their services from bot_data
+            application.bot_data["ASYNC_DB_SERVICE"] = async_db_service
 
             # Initialize DTFactory
             dt_factory = DTFactory(db_service, schema_registry)
             house_factory = HouseFactory(db_service, schema_registry)
 
+            # Shared outdoor conditions, refreshed in the background
+            weather_service = FetchWeatherService()
+            weather_cache = WeatherCache(
+                weather_service.fetch_weather,
+                ttl=900,
+                precision=2,
+                refresh_interval=60,
+                fetch_many=weather_service.fetch_weather_batch,
+            )
+            weather_cache.add_listener(house_factory.apply_weather)
+            for house in house_factory.iter_dts(projection=["longitude", "latitude"]):
+                if house.get("longitude") is not None and house.get("latitude") is not None:
+                    weather_cache.register(house["longitude"], house["latitude"], owner=house["_id"])
+
             # Store references
             self.app.config["SCHEMA_REGISTRY"] = schema_registry
             self.app.config["DB_SERVICE"] = db_service
+            self.app.config["ASYNC_DB_SERVICE"] = async_db_service
             self.app.config["DT_FACTORY"] = dt_factory
             self.app.config["HOUSE_FACTORY"] = house_factory
+            self.app.config["WEATHER_CACHE"] = weather_cache
+            self.app.config["NOTIFICATION_DISPATCHER"] = NotificationDispatcher(
+                TELEGRAM_TOKEN,
+                queue_size=1000,
+                global_rate=30.0,
+                per_chat_interval=1.0,
+            )
+            register_component_stats(self.app)
 
         except Exception as e:
             print(f"Initialization error: {str(e)}")
@@ -168,21 +244,51 @@ class FlaskServer:
         register_led_blueprint(self.app)
         register_user_blueprint(self.app)
         register_housing_blueprint(self.app)
+        register_metrics_blueprint(self.app)
         register_webhook(self.app)  # ----> TELEGRAM
 
     def run(self, host="0.0.0.0", port=SERVER_PORT):
         """Run the Flask server"""
         try:
-            self.app.mqtt_measurement_handler.start()
+            self.app.config["WEATHER_CACHE"].start()
+            self.app.config["NOTIFICATION_DISPATCHER"].start()
+            if MQTT_EMBEDDED_INGEST:
+                self.app.mqtt_measurement_handler.start()
             self.app.mqtt_ventilation_handler.start()
             self.app.run(host=host, port=port, use_reloader=False)
         finally:
+            if MQTT_EMBEDDED_INGEST:
+                self.app.mqtt_measurement_handler.stop()
+            self.app.config["WEATHER_CACHE"].stop()
+            self.app.config["NOTIFICATION_DISPATCHER"].stop()
+            self._stop_telegram()
+            if "ASYNC_DB_SERVICE" in self.app.config:
+                self.app.config["ASYNC_DB_SERVICE"].shutdown()
             if "DB_SERVICE" in self.app.config:
                 self.app.config["DB_SERVICE"].disconnect()
             if self.ngrok_tunnel:
                 ngrok.disconnect(self.ngrok_tunnel.public_url)
 
 
+    def _stop_telegram(self):
+        """Finish the queued updates and stop the Telegram event loop thread"""
+        application = getattr(self, "telegram_application", None)
+        if application is None:
+            return
+        loop = application.loop
+
+        async def shutdown():
+            await application.stop()
+            await application.shutdown()
+
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown(), loop).result(timeout=10)
+        except Exception as e:
+            print(f"Telegram shutdown error: {str(e)}")
+        loop.call_soon_threadsafe(loop.stop)
+        self.telegram_thread.join(timeout=5)
+
+
 if __name__ == "__main__":
     server = FlaskServer()
     server.run()
@@ -0,0 +1,394 @@
+"""End-to-end benchmark of the measurement ingest pipeline
+
+Simulates a fleet of houses x rooms publishing readings shaped like
+src2/MQTT_Publisher/MQTT_Publisher.ino at a fixed total rate and reports
+end-to-end latency percentiles, sustained throughput and a per-stage
+breakdown of MeasurementMQTTHandler.
+
+Usage (from the repository root):
+    # straight into MeasurementMQTTHandler._on_message, in-memory database
+    python -m benchmarks.bench_ingest --houses 50 --rooms 10 --rate 2000 --db memory
+
+    # through a local broker and MongoDB
+    python -m benchmarks.bench_ingest --mode broker --broker localhost --port 1883 \\
+        --db mongo --mongo-uri mongodb://localhost:27017
+
+    # embedded SQLite backend of edge nodes
+    python -m benchmarks.bench_ingest --houses 1 --rooms 10 --rate 100 --db sqlite
+
+--db memory needs mongomock (pip install mongomock). The benchmark uses its
+own database (default: bench_ingest, or the --sqlite-path file) which is
+dropped before each run.
+Outdoor weather is synthetic, nothing is fetched from Open-Meteo.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import time
+from collections import defaultdict
+from threading import Lock
+
+# mqtt_settings insists on these, the benchmark passes its own broker settings
+os.environ.setdefault("MQTT_USERNAME", "bench")
+os.environ.setdefault("MQTT_PASSWORD", "bench")
+os.environ.setdefault("MQTT_BROKER_URL", "localhost")
+
+from flask import Flask
+
+from src.virtualization.digital_replica.schema_registry import SchemaRegistry
+from src.virtualization.digital_replica.dr_factory import DRFactory
+from src.services.database_service import DatabaseService
+from src.digital_twin.dt_factory import DTFactory
+from src.digital_twin.house_factory import HouseFactory
+from src.services.weather_cache import WeatherCache
+from src.services.unit_of_work import UnitOfWork
+from src.application.mqtt_handler import MeasurementMQTTHandler, INGEST_SAMPLES
+from src.application.payload_codec import encode_binary, encode_binary_batch
+from src.application.metrics_api import register_metrics_blueprint, register_component_stats
+
+
+class StageTimer:
+    """Collects durations per stage from wrapped callables"""
+
+    def __init__(self):
+        self.durations = defaultdict(list)
+        self._lock = Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.durations[stage].append(seconds)
+
+    def wrap(self, stage, function):
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - started)
+        return wrapper
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list"""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def synthetic_weather(longitude, latitude):
+    return {"temperature": 12.0, "humidity": 70.0}
+
+
+def create_app(args):
+    """Flask app wired like app.py, minus Telegram, ngrok and Open-Meteo"""
+    app = Flask(__name__)
+
+    schema_registry = SchemaRegistry()
+    schema_registry.load_schema("room", "src/virtualization/templates/room.yaml")
+    schema_registry.load_schema("user", "src/virtualization/templates/user.yaml")
+
+    connection_string = f"sqlite:///{args.sqlite_path}" if args.db == "sqlite" else args.mongo_uri
+    db_service = DatabaseService(connection_string, args.db_name, schema_registry)
+    if args.db == "memory":
+        import mongomock
+
+        db_service.client = mongomock.MongoClient()
+        db_service.db = db_service.client[args.db_name]
+        db_service._init_measurement_collection()
+    else:
+        db_service.connect()
+        db_service.client.drop_database(args.db_name)
+        db_service._init_measurement_collection()
+        db_service._init_dedup_collection()
+        db_service.ensure_indexes()
+
+    house_factory = HouseFactory(db_service, schema_registry)
+    weather_cache = WeatherCache(synthetic_weather)
+    weather_cache.add_listener(house_factory.apply_weather)
+
+    app.config["SCHEMA_REGISTRY"] = schema_registry
+    app.config["DB_SERVICE"] = db_service
+    app.config["DT_FACTORY"] = DTFactory(db_service, schema_registry)
+    app.config["HOUSE_FACTORY"] = house_factory
+    app.config["WEATHER_CACHE"] = weather_cache
+    app.config["MQTT_CONFIG"] = {
+        "broker_url": args.broker,
+        "port": args.port,
+        "tls": False,
+        "username": None,
+        "password": None,
+        "ingest": {
+            "workers": args.workers,
+            "queue_size": args.queue_size,
+            "batch_size": args.batch_size,
+            "max_linger": args.max_linger,
+            **({"write_behind": {"interval": args.write_behind}} if args.write_behind else {}),
+        },
+    }
+    register_metrics_blueprint(app)
+    register_component_stats(app)
+    return app
+
+
+def create_fleet(app, houses, rooms_per_house):
+    """Create houses and rooms like the housing API does, return (house_id, room_id, device_handle)"""
+    house_factory = app.config["HOUSE_FACTORY"]
+    db_service = app.config["DB_SERVICE"]
+    dr_factory = DRFactory("src/virtualization/templates/room.yaml")
+    weather_cache = app.config["WEATHER_CACHE"]
+
+    rooms = []
+    for h in range(houses):
+        longitude, latitude = 9.0 + h * 0.05, 45.0 + h * 0.05
+        house_id = house_factory.create_dt(f"bench-house-{h}", longitude, latitude)
+        house_factory.add_service(house_id, "FetchWeatherService")
+        house_factory.add_service(house_id, "HumidityComparisonService")
+        weather_cache.register(longitude, latitude, owner=house_id)
+        for r in range(rooms_per_house):
+            room = dr_factory.create_dr(
+                "room",
+                {"profile": {"name": f"room-{r}", "room_number": str(r), "floor": 0}},
+            )
+            room_id = db_service.save_dr("room", room)
+            db_service.update_dr("room", room_id, {"house_id": house_id})
+            house_factory.add_room(house_id, "room", room_id)
+            device_handle = db_service.next_sequence("device_handle")
+            db_service.update_dr_fields("room", room_id, {"profile.device_handle": device_handle})
+            rooms.append((house_id, room_id, device_handle))
+    weather_cache.refresh_all()
+    return rooms
+
+
+def instrument(handler, db_service, timer, sent_at, completed):
+    """Wrap the pipeline stages with timers and track end-to-end latency"""
+    on_message = handler._on_message
+    submit = handler.ingest_queue.submit
+    process_batch = handler.ingest_queue.process_batch
+    current = {}
+
+    def timed_on_message(client, userdata, msg):
+        # Decoding happens on one thread (paho loop or the generator)
+        current["sent_at"] = sent_at.pop(msg.payload, None) or time.perf_counter()
+        timer.wrap("decode_enqueue", on_message)(client, userdata, msg)
+
+    def tagged_submit(item, key=None):
+        item["_sent_at"] = current["sent_at"]
+        return submit(item, key=key)
+
+    def timed_batch(readings):
+        started = time.perf_counter()
+        for reading in readings:
+            timer.record("queue_wait", started - reading["_sent_at"])
+        timer.record("batch_size", len(readings))
+        timer.wrap("batch_total", process_batch)(readings)
+        finished = time.perf_counter()
+        for reading in readings:
+            completed.append(finished - reading["_sent_at"])
+
+    handler._on_message = timed_on_message
+    handler.client.on_message = timed_on_message
+    handler.ingest_queue.submit = tagged_submit
+    handler.ingest_queue.process_batch = timed_batch
+    handler._process_reading = timer.wrap("services", handler._process_reading)
+    db_service.update_dr_fields_many = timer.wrap("db_latest", db_service.update_dr_fields_many)
+    db_service.append_measurements = timer.wrap("db_history", db_service.append_measurements)
+    # Alert states are written by the unit of work flush at the end of a batch
+    UnitOfWork.flush = timer.wrap("db_alert_state", UnitOfWork.flush)
+
+
+class _Message:
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+def generate(args, rooms, deliver, sent_at):
+    """Publish readings round-robin over the rooms at the configured rate
+
+    With --samples-per-message k, every message carries k timestamped
+    samples of one room and messages are sent at rate / k.
+
+    Values drift in a small random walk per room like real sensors, so
+    write-behind coalescing sees realistic changes.
+
+    Returns:
+        Tuple of the number of samples sent and the publishing seconds
+    """
+    per_message = max(1, args.samples_per_message)
+    messages = int(args.rate * args.duration / per_message)
+    message_rate = args.rate / per_message
+    flat = args.topic_layout == "flat"
+    # Samples of one room never overlap in time, as on a real device
+    spacing = len(rooms) / message_rate / per_message
+    values = {room[1]: (random.uniform(18.0, 26.0), random.uniform(40.0, 75.0)) for room in rooms}
+
+    def drift(room_id):
+        temperature, humidity = values[room_id]
+        temperature = min(26.0, max(18.0, temperature + random.uniform(-0.1, 0.1)))
+        humidity = min(75.0, max(40.0, humidity + random.uniform(-0.5, 0.5)))
+        values[room_id] = (temperature, humidity)
+        return round(temperature, 1), round(humidity, 1)
+    started = time.perf_counter()
+    for i in range(messages):
+        target = started + i / message_rate
+        delay = target - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        house_id, room_id, device_handle = rooms[i % len(rooms)]
+        topic = args.topic if flat else f"{args.topic}/{house_id}/{room_id}"
+        now = time.time()
+        samples = [
+            (now - (per_message - 1 - k) * spacing, *drift(room_id))
+            for k in range(per_message)
+        ]
+
+        if args.payload == "binary":
+            handle = device_handle if flat else None
+            if per_message == 1:
+                payload = encode_binary(samples[0][1], samples[0][2], i, device_handle=handle)
+            else:
+                payload = encode_binary_batch(samples, i, device_handle=handle)
+        else:
+            message = {"device_id": "NodeMCU", "seq": i & 0xFFFF}
+            if flat:
+                message["room_id"] = room_id
+            if per_message == 1:
+                message.update(temperature=samples[0][1], humidity=samples[0][2])
+            else:
+                message["samples"] = [
+                    {"ts": ts, "temperature": temperature, "humidity": humidity}
+                    for ts, temperature, humidity in samples
+                ]
+            payload = json.dumps(message).encode()
+        sent_at[payload] = time.perf_counter()
+        deliver(topic, payload)
+        # QoS 1 redelivery, the handler must drop the copy
+        if args.redeliver and random.random() < args.redeliver:
+            sent_at[payload] = time.perf_counter()
+            deliver(topic, payload)
+    return messages * per_message, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--houses", type=int, default=20)
+    parser.add_argument("--rooms", type=int, default=5, help="rooms per house")
+    parser.add_argument("--rate", type=float, default=500.0, help="readings per second over the whole fleet")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of publishing")
+    parser.add_argument("--mode", choices=["direct", "broker"], default="direct")
+    parser.add_argument("--broker", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--topic", default="measurement")
+    parser.add_argument("--topic-layout", choices=["hierarchical", "flat"], default="hierarchical",
+                        help="measurement/<house_id>/<room_id> or the legacy flat topic")
+    parser.add_argument("--payload", choices=["json", "binary"], default="json",
+                        help="binary uses device handles on the flat topic")
+    parser.add_argument("--samples-per-message", type=int, default=1,
+                        help="timestamped samples batched into one message")
+    parser.add_argument("--redeliver", type=float, default=0.0,
+                        help="fraction of messages delivered twice, to exercise deduplication")
+    parser.add_argument("--db", choices=["memory", "mongo", "sqlite"], default="memory")
+    parser.add_argument("--sqlite-path", default="bench_ingest.sqlite3", help="file of --db sqlite, ':memory:' for none")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", default="bench_ingest")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queue-size", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--max-linger", type=float, default=0.05)
+    parser.add_argument("--write-behind", type=float, default=None,
+                        help="write the latest room values at most every N seconds per room")
+    parser.add_argument("--drain-timeout", type=float, default=60.0)
+    parser.add_argument("--print-metrics", action="store_true", help="dump the /metrics exposition after the run")
+    parser.add_argument("--log-level", default="CRITICAL", help="pipeline log level, rooms without users log every reading")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level)
+
+    app = create_app(args)
+    rooms = create_fleet(app, args.houses, args.rooms)
+    print(f"Fleet: {args.houses} houses x {args.rooms} rooms, {args.rate:.0f} readings/s for {args.duration:.0f}s ({args.mode}, {args.topic_layout}, {args.payload}, {args.db})")
+
+    timer = StageTimer()
+    completed = []
+    sent_at = {}
+    handler = MeasurementMQTTHandler(app)
+    instrument(handler, app.config["DB_SERVICE"], timer, sent_at, completed)
+
+    if args.mode == "direct":
+        if handler.latest_state is not None:
+            handler.latest_state.start()
+        handler.ingest_queue.start()
+        deliver = lambda topic, payload: handler._on_message(None, None, _Message(topic, payload))
+        publisher = None
+    else:
+        import paho.mqtt.client as mqtt
+
+        handler.start()
+        publisher = mqtt.Client()
+        publisher.connect(args.broker, args.port, 60)
+        publisher.loop_start()
+        deadline = time.monotonic() + 10
+        while not handler.is_connected and time.monotonic() < deadline:
+            time.sleep(0.1)
+        deliver = lambda topic, payload: publisher.publish(topic, payload, qos=0)
+
+    bench_started = time.perf_counter()
+    sent, publish_seconds = generate(args, rooms, deliver, sent_at)
+
+    def duplicates():
+        return INGEST_SAMPLES.labels("duplicate").value
+
+    # Wait until everything that was accepted went through the pipeline
+    deadline = time.monotonic() + args.drain_timeout
+    while time.monotonic() < deadline:
+        stats = handler.ingest_queue.stats()
+        if stats["processed"] + stats["dropped"] + duplicates() >= sent and stats["depth"] == 0:
+            break
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - bench_started
+
+    if publisher is not None:
+        publisher.loop_stop()
+        publisher.disconnect()
+        handler.stop()
+    else:
+        handler.ingest_queue.stop()
+        if handler.latest_state is not None:
+            handler.latest_state.stop()
+
+    stats = handler.ingest_queue.stats()
+    print(f"\nSent {sent}, processed {stats['processed']}, dropped {stats['dropped']}, batch errors {stats['errors']}")
+    if handler.latest_state is not None:
+        room_state = handler.latest_state.stats("room")
+        print(f"Latest room values: {room_state['offered']} offered, {room_state['written_entities']} written in {room_state['writes']} writes")
+    if args.redeliver:
+        print(f"Duplicates dropped: {INGEST_SAMPLES.labels('duplicate').value:.0f}")
+    print(f"Offered {sent / publish_seconds:,.0f}/s, sustained {len(completed) / elapsed:,.0f}/s, max queue depth {stats['max_depth']}")
+
+    print("\nEnd-to-end latency (ms)")
+    latencies = [1000 * v for v in completed]
+    print(f"  p50 {percentile(latencies, 50):8.2f}   p95 {percentile(latencies, 95):8.2f}   p99 {percentile(latencies, 99):8.2f}   max {max(latencies, default=float('nan')):8.2f}")
+
+    print("\nStages (ms per call)")
+    print(f"  {'stage':<16}{'calls':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'total s':>10}")
+    for stage in ["decode_enqueue", "queue_wait", "batch_total", "db_latest", "db_history", "services", "db_alert_state"]:
+        values = timer.durations.get(stage, [])
+        if not values:
+            continue
+        ms = [1000 * v for v in values]
+        print(f"  {stage:<16}{len(ms):>8}{statistics.mean(ms):>10.3f}{percentile(ms, 50):>10.3f}"
+              f"{percentile(ms, 95):>10.3f}{percentile(ms, 99):>10.3f}{sum(values):>10.2f}")
+    sizes = timer.durations.get("batch_size", [])
+    if sizes:
+        print(f"\nBatches: {len(sizes)}, mean size {statistics.mean(sizes):.1f}, max {max(sizes)}")
+
+    if args.print_metrics:
+        print("\n" + app.test_client().get("/metrics").get_data(as_text=True))
+
+
+if __name__ == "__main__":
+    main()
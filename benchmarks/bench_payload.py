@@ -0,0 +1,65 @@
+"""Measurement payload formats: bytes on the wire and decode cost
+
+Usage (from the repository root):
+    python -m benchmarks.bench_payload --messages 200000
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+
+from src.application.payload_codec import decode_payload, encode_binary
+
+
+def build_messages(count):
+    house_id = "67a0c8e2f1b2c3d4e5f60718"
+    room_id = str(uuid.uuid4())
+    readings = [
+        (round(random.uniform(18.0, 26.0), 1), round(random.uniform(40.0, 75.0), 1), i & 0xFFFF)
+        for i in range(count)
+    ]
+    return {
+        "json, flat topic": (
+            "measurement",
+            [json.dumps({"room_id": room_id, "device_id": "NodeMCU", "humidity": h, "temperature": t}).encode()
+             for t, h, _ in readings],
+        ),
+        "json, routed topic": (
+            f"measurement/{house_id}/{room_id}",
+            [json.dumps({"device_id": "NodeMCU", "humidity": h, "temperature": t}).encode()
+             for t, h, _ in readings],
+        ),
+        "binary, routed topic": (
+            f"measurement/{house_id}/{room_id}",
+            [encode_binary(t, h, seq) for t, h, seq in readings],
+        ),
+        "binary + handle, flat": (
+            "measurement",
+            [encode_binary(t, h, seq, device_handle=4711) for t, h, seq in readings],
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'format':<24}{'payload B':>10}{'topic B':>9}{'total B':>9}{'decode ns':>11}{'msgs/s':>14}")
+    for name, (topic, payloads) in build_messages(args.messages).items():
+        best = float("inf")
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            for payload in payloads:
+                decode_payload(payload)
+            best = min(best, time.perf_counter() - started)
+        payload_bytes = sum(len(p) for p in payloads) / len(payloads)
+        topic_bytes = len(topic.encode())
+        print(f"{name:<24}{payload_bytes:>10.1f}{topic_bytes:>9}{payload_bytes + topic_bytes:>9.1f}"
+              f"{1e9 * best / len(payloads):>11.0f}{len(payloads) / best:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Scalar vs vectorized psychrometrics throughput
+
+Usage (from the repository root):
+    python -m benchmarks.bench_psychrometrics --sizes 1000 100000 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from src.services import psychrometrics
+
+
+def best_of(repeat, function, *args):
+    """Fastest of `repeat` runs in seconds"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def scalar_loop(function):
+    def run(*columns):
+        return [function(*values) for values in zip(*columns)]
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scalar-limit", type=int, default=200_000,
+                        help="skip the scalar loop above this size")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    cases = [
+        ("absolute_humidity", psychrometrics.absolute_humidity, psychrometrics.absolute_humidity_array, 2),
+        ("dew_point", psychrometrics.dew_point, psychrometrics.dew_point_array, 2),
+        ("surface_relative_humidity", psychrometrics.surface_relative_humidity,
+         psychrometrics.surface_relative_humidity_array, 3),
+    ]
+
+    print(f"{'function':<28}{'size':>10}{'scalar/s':>16}{'vector/s':>16}{'speedup':>10}{'max diff':>12}")
+    for size in args.sizes:
+        temperature = rng.uniform(-10, 35, size)
+        humidity = rng.uniform(5, 100, size)
+        surface = temperature - rng.uniform(0, 10, size)
+        columns = (temperature, humidity, surface)
+
+        for name, scalar, vector, arity in cases:
+            inputs = columns[:arity]
+            vector_seconds = best_of(args.repeat, vector, *inputs)
+            vector_rate = size / vector_seconds
+
+            if size <= args.scalar_limit:
+                lists = [c.tolist() for c in inputs]
+                scalar_seconds = best_of(args.repeat, scalar_loop(scalar), *lists)
+                scalar_rate = size / scalar_seconds
+                difference = np.nanmax(np.abs(np.asarray(scalar_loop(scalar)(*lists)) - vector(*inputs)))
+                print(f"{name:<28}{size:>10}{scalar_rate:>16,.0f}{vector_rate:>16,.0f}"
+                      f"{vector_rate / scalar_rate:>9.1f}x{difference:>12.2e}")
+            else:
+                print(f"{name:<28}{size:>10}{'-':>16}{vector_rate:>16,.0f}{'-':>10}{'-':>12}")
+
+
+if __name__ == "__main__":
+    main()
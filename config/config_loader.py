@@ -1,7 +1,20 @@
 import yaml
-from typing import Dict
+from typing import Dict, Optional
 import os
 
+# database.yaml keys to MongoClient keyword arguments
+POOL_OPTIONS = {
+    "max_pool_size": "maxPoolSize",
+    "min_pool_size": "minPoolSize",
+    "max_idle_time_ms": "maxIdleTimeMS",
+    "wait_queue_timeout_ms": "waitQueueTimeoutMS",
+}
+TIMEOUT_OPTIONS = {
+    "connect_timeout_ms": "connectTimeoutMS",
+    "socket_timeout_ms": "socketTimeoutMS",
+    "server_selection_timeout_ms": "serverSelectionTimeoutMS",
+}
+
 
 class ConfigLoader:
     @staticmethod
@@ -20,7 +33,14 @@ class ConfigLoader:
 
     @staticmethod
     def build_connection_string(config: Dict) -> str:
-        """Build MongoDB connection string from configuration"""
+        """Build MongoDB connection string, or the sqlite:// URL of the embedded backend"""
+        backend = config.get("backend", "mongodb")
+        if backend == "sqlite":
+            path = (config.get("sqlite") or {}).get("path") or "digital_twin.sqlite3"
+            return f"sqlite:///{path}"
+        if backend != "mongodb":
+            raise ValueError(f"Invalid configuration file: unknown backend {backend}")
+
         conn = config["connection"]
         host = conn["host"]
         port = conn["port"]
@@ -31,3 +51,51 @@ class ConfigLoader:
             auth = f"{conn['username']}:{conn['password']}@"
 
         return f"mongodb://{auth}{host}:{port}"
+
+    @staticmethod
+    def build_client_options(config: Dict) -> Dict:
+        """Build MongoClient keyword arguments for pooling, timeouts and compression"""
+        options = {}
+        for section, names in (("pool", POOL_OPTIONS), ("timeouts", TIMEOUT_OPTIONS)):
+            for key, value in (config.get(section) or {}).items():
+                if key not in names:
+                    raise ValueError(f"Invalid configuration file: unknown {section} option {key}")
+                if value is not None:
+                    options[names[key]] = value
+
+        compressors = config.get("compressors")
+        if compressors:
+            if isinstance(compressors, str):
+                compressors = [compressors]
+            options["compressors"] = ",".join(compressors)
+
+        auth_source = config.get("settings", {}).get("auth_source")
+        if auth_source and config["connection"].get("username"):
+            options["authSource"] = auth_source
+        return options
+
+    @staticmethod
+    def load_async_workers(config: Dict) -> int:
+        """Thread pool size of the AsyncDatabaseService"""
+        max_workers = (config.get("async") or {}).get("max_workers", 8)
+        if not isinstance(max_workers, int) or max_workers < 1:
+            raise ValueError("Invalid configuration file: async max_workers must be a positive integer")
+        return max_workers
+
+    @staticmethod
+    def load_cache_config(config: Dict) -> Optional[Dict[str, Dict]]:
+        """Read-through cache settings by type, None if the cache is disabled"""
+        if "cache" not in config:
+            return None
+        cache = config["cache"] or {}
+        if not isinstance(cache, dict):
+            raise ValueError("Invalid configuration file: cache must be a mapping")
+        return cache
+
+    @staticmethod
+    def load_profiles(config: Dict) -> Dict[str, Dict]:
+        """Read/write concern profiles by name, see DatabaseService"""
+        profiles = config.get("profiles") or {}
+        if not isinstance(profiles, dict):
+            raise ValueError("Invalid configuration file: profiles must be a mapping")
+        return profiles
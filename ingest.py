@@ -0,0 +1,196 @@
+"""Standalone MQTT measurement ingest workers
+
+Runs N worker processes, each with its own MQTT client, database connection
+and MeasurementMQTTHandler, so ingest capacity scales with cores and nodes.
+Start the API with MQTT_EMBEDDED_INGEST=false when using these workers; the
+API process keeps refreshing the outdoor weather values of the houses.
+
+Usage:
+    python ingest.py --workers 4                      # hash partitioning
+    python ingest.py --workers 4 --mode shared        # $share/ingest/measurement
+    python ingest.py --workers 2 --partition-offset 2 --partition-count 4
+                                                      # second node of two
+    python ingest.py --workers 2 --houses <id>,<id> --no-legacy-topic
+                                                      # only these houses
+
+Modes:
+    hash    every worker receives all messages and keeps the rooms hashing
+            to its partition, readings of a room stay in order
+    shared  the broker balances messages over the workers through a shared
+            subscription, best balance but no per-room ordering
+
+With --write-behind N the latest room values are written at most every N
+seconds per room (at once when they change noticeably). The API process
+then reads values up to N seconds old, as only the worker holding a room
+sees its pending values.
+"""
+import argparse
+import logging
+import multiprocessing
+import signal
+import time
+from threading import Thread
+
+from flask import Flask
+from werkzeug.serving import make_server
+
+from config.config_loader import ConfigLoader
+from src.virtualization.digital_replica.schema_registry import SchemaRegistry
+from src.services.database_service import DatabaseService
+from src.digital_twin.dt_factory import DTFactory
+from src.digital_twin.house_factory import HouseFactory
+from src.services.fetch_weather import FetchWeatherService
+from src.services.weather_cache import WeatherCache
+from src.services.notification_dispatcher import NotificationDispatcher
+from src.application.mqtt_handler import MeasurementMQTTHandler
+from src.application.metrics_api import register_metrics_blueprint, register_component_stats
+from src.application.mqtt_settings import (
+    MQTT_USERNAME,
+    MQTT_PASSWORD,
+    MQTT_BROKER_URL,
+    MQTT_PORT,
+    MQTT_TLS,
+)
+from src.application.telegram.config.settings import TELEGRAM_TOKEN
+
+
+logger = logging.getLogger(__name__)
+
+
+def create_ingest_app(ingest_config: dict) -> Flask:
+    """Create a Flask app carrying only what the measurement pipeline needs"""
+    app = Flask(__name__)
+
+    schema_registry = SchemaRegistry()
+    schema_registry.load_schema("ventilation", "src/virtualization/templates/ventilation.yaml")
+    schema_registry.load_schema("user", "src/virtualization/templates/user.yaml")
+    schema_registry.load_schema("room", "src/virtualization/templates/room.yaml")
+
+    db_config = ConfigLoader.load_database_config()
+    db_service = DatabaseService(
+        connection_string=ConfigLoader.build_connection_string(db_config),
+        db_name=db_config["settings"]["name"],
+        schema_registry=schema_registry,
+        client_options=ConfigLoader.build_client_options(db_config),
+        profiles=ConfigLoader.load_profiles(db_config),
+        cache_config=ConfigLoader.load_cache_config(db_config),
+    )
+    db_service.connect()
+
+    weather_service = FetchWeatherService()
+    # Not started: the API process refreshes the outdoor values of the
+    # houses, the workers only read them from the database
+    weather_cache = WeatherCache(
+        weather_service.fetch_weather,
+        fetch_many=weather_service.fetch_weather_batch,
+    )
+
+    app.config["SCHEMA_REGISTRY"] = schema_registry
+    app.config["DB_SERVICE"] = db_service
+    app.config["DT_FACTORY"] = DTFactory(db_service, schema_registry)
+    app.config["HOUSE_FACTORY"] = HouseFactory(db_service, schema_registry)
+    app.config["WEATHER_CACHE"] = weather_cache
+    app.config["NOTIFICATION_DISPATCHER"] = NotificationDispatcher(TELEGRAM_TOKEN)
+    app.config["MQTT_CONFIG"] = {
+        "broker_url": MQTT_BROKER_URL,
+        "port": MQTT_PORT,
+        "tls": MQTT_TLS,
+        "username": MQTT_USERNAME,
+        "password": MQTT_PASSWORD,
+        "ingest": ingest_config,
+    }
+    register_metrics_blueprint(app)
+    register_component_stats(app)
+    return app
+
+
+def run_worker(ingest_config: dict, metrics_port: int = None) -> None:
+    """Run one ingest worker until SIGTERM/SIGINT, optionally serving /metrics"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s worker-{ingest_config.get('partition_index', 0)} %(levelname)s %(message)s",
+    )
+    app = create_ingest_app(ingest_config)
+    handler = MeasurementMQTTHandler(app)
+
+    stopping = multiprocessing.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    signal.signal(signal.SIGINT, lambda *_: stopping.set())
+
+    metrics_server = None
+    if metrics_port:
+        metrics_server = make_server("0.0.0.0", metrics_port, app, threaded=True)
+        Thread(target=metrics_server.serve_forever, name="metrics", daemon=True).start()
+
+    app.config["NOTIFICATION_DISPATCHER"].start()
+    handler.start()
+    try:
+        while not stopping.is_set():
+            time.sleep(1)
+    finally:
+        handler.stop()
+        app.config["NOTIFICATION_DISPATCHER"].stop()
+        app.config["DB_SERVICE"].disconnect()
+        if metrics_server:
+            metrics_server.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Standalone MQTT measurement ingest workers")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="worker processes on this node")
+    parser.add_argument("--mode", choices=["hash", "shared"], default="hash", help="how rooms are spread over the workers")
+    parser.add_argument("--group", default="ingest", help="shared subscription group (mode shared)")
+    parser.add_argument("--topic", default="measurement", help="measurement topic")
+    parser.add_argument("--houses", default="", help="comma separated house ids, subscribe only to their topics")
+    parser.add_argument("--no-legacy-topic", action="store_true", help="ignore the flat measurement topic")
+    parser.add_argument("--partition-count", type=int, default=None, help="total partitions over all nodes (mode hash)")
+    parser.add_argument("--partition-offset", type=int, default=0, help="first partition of this node (mode hash)")
+    parser.add_argument("--threads", type=int, default=2, help="ingest threads per worker")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--max-linger", type=float, default=0.05)
+    parser.add_argument("--queue-size", type=int, default=10000)
+    parser.add_argument("--write-behind", type=float, default=None,
+                        help="write the latest room values at most every N seconds per room")
+    parser.add_argument("--metrics-port", type=int, default=None, help="serve /metrics of worker i on port + i")
+    args = parser.parse_args()
+
+    partition_count = args.partition_count or args.workers
+    processes = []
+    for index in range(args.workers):
+        ingest_config = {
+            "topic": args.topic,
+            "houses": [house_id for house_id in args.houses.split(",") if house_id],
+            "legacy_topic": not args.no_legacy_topic,
+            "workers": args.threads,
+            "queue_size": args.queue_size,
+            "batch_size": args.batch_size,
+            "max_linger": args.max_linger,
+        }
+        if args.write_behind:
+            ingest_config["write_behind"] = {"interval": args.write_behind}
+        if args.mode == "shared":
+            ingest_config["shared_group"] = args.group
+        else:
+            ingest_config["partition_count"] = partition_count
+            ingest_config["partition_index"] = args.partition_offset + index
+
+        process = multiprocessing.get_context("spawn").Process(
+            target=run_worker,
+            args=(ingest_config, args.metrics_port + index if args.metrics_port else None),
+            name=f"ingest-{index}"
+        )
+        process.start()
+        processes.append(process)
+
+    def shutdown(*_):
+        for process in processes:
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -106,6 +106,18 @@ def get_dt_stats(dt_id):
         return jsonify({'error': str(e)}), 500
 
 
+@dt_management_api.route('/twin-cache', methods=['GET'])
+def get_twin_cache_stats():
+    """Get hit/miss and rebuild statistics of the live twin registries"""
+    try:
+        return jsonify({
+            'dt_factory': current_app.config['DT_FACTORY'].twin_registry.stats(),
+            'house_factory': current_app.config['HOUSE_FACTORY'].twin_registry.stats(),
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @dt_api.route('/<dt_id>/services', methods=['POST'])
 def add_service_to_dt(dt_id):
     """Add a service to Digital Twin"""
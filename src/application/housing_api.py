@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, current_app
-from datetime import datetime
+from datetime import datetime, timezone
 from src.virtualization.digital_replica.dr_factory import DRFactory
+from src.application.pagination import page_args
 from bson import ObjectId
 
 house_api = Blueprint('house_api', __name__,url_prefix = '/api/house')
@@ -9,6 +10,16 @@ def register_housing_blueprint(app):
     app.register_blueprint(house_api)
 
 
+def _parse_time(value):
+    """ISO 8601 query parameter as naive UTC, the form timestamps are stored in"""
+    if not value:
+        return None
+    timestamp = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
 @house_api.route("/",methods=['POST'])
 def create_house():
     try:
@@ -23,10 +34,26 @@ def create_house():
         current_app.config["HOUSE_FACTORY"].add_service(house_id, "FetchWeatherService")
         current_app.config["HOUSE_FACTORY"].add_service(house_id, "HumidityComparisonService")
         current_app.config["HOUSE_FACTORY"].add_service(house_id, "UserNotificationService")
+        if current_app.config.get("WEATHER_CACHE") is not None:
+            current_app.config["WEATHER_CACHE"].register(
+                float(data['longitude']), float(data['latitude']), owner=house_id
+            )
         return jsonify({"status":"success","message":"House created successfully","house_id":house_id}), 201
     except Exception as e:
         return jsonify({"error":str(e)}),500
     
+@house_api.route("/weather/refresh", methods=['POST'])
+def refresh_weather():
+    "Refresh the outdoor conditions of all registered houses now"
+    try:
+        weather_cache = current_app.config.get("WEATHER_CACHE")
+        if weather_cache is None:
+            return jsonify({"error":"Weather cache not configured"}), 503
+        refreshed = weather_cache.refresh_all()
+        return jsonify({"status":"success","locations_refreshed":refreshed}), 200
+    except Exception as e:
+        return jsonify({"error":str(e)}),500
+
 @house_api.route("/<house_id>", methods=['GET'])
 def get_house(house_id):
     "Get house details"
@@ -34,16 +61,21 @@ def get_house(house_id):
         house = current_app.config["DT_FACTORY"].get_dt(house_id)
         if not house:
             return jsonify({"error":"House not found"}), 404
+        dt_instance = current_app.config["HOUSE_FACTORY"].get_dt_instance(house_id)
+        house["weather_age"] = dt_instance.weather_age() if dt_instance else None
         return jsonify(house), 200
     except Exception as e:
         return jsonify({"error":str(e)}),500
 
 @house_api.route("/",methods=['GET'])
 def list_houses():
-    "Get all houses"
+    """Get the houses, keyset paginated with the limit and after parameters"""
     try:
-        houses = current_app.config["DT_FACTORY"].list_dts()
-        return jsonify({"houses":houses}), 200
+        limit, after = page_args(request.args)
+        houses, next_after = current_app.config["DT_FACTORY"].page_dts(limit=limit, after=after)
+        return jsonify({"houses":houses, "next_after":next_after}), 200
+    except ValueError as e:
+        return jsonify({"error":str(e)}), 400
     except Exception as e:
         return jsonify({"error":str(e)}),500
 
@@ -75,13 +107,13 @@ def create_room(house_id):
         }
         room = dr_factory.create_dr("room", initial_data)
         # Save to database
-        room_id = current_app.config["DB_SERVICE"].save_dr("room", room)
+        room_id = current_app.config["DB_SERVICE"].save_dr("room", room, profile="control")
         if not room:
             return jsonify({"error": "Room not found"}), 404
         
         #add house_id to room data
         room['house_id'] = house_id
-        current_app.config["DB_SERVICE"].update_dr("room", room_id, room)
+        current_app.config["DB_SERVICE"].update_dr("room", room_id, room, profile="control")
 
         #Add the room to the house dt
         house = current_app.config["HOUSE_FACTORY"].get_dt(house_id)
@@ -121,11 +153,31 @@ def update_room(room_id):
         #Always update the 'updated at' timestamp
         update_data["metadata"] = {"updated_at":datetime.utcnow()}
 
-        current_app.config["DB_SERVICE"].update_dr("room",room_id,update_data)
+        current_app.config["DB_SERVICE"].update_dr("room",room_id,update_data, profile="control")
         return jsonify({"status":"success","message":"Room updated successfully"}), 200
     except Exception as e:
         return jsonify({"error":str(e)}),500
     
+@house_api.route("/<house_id>/rooms/<room_id>/device-handle", methods=['POST'])
+def assign_device_handle(house_id, room_id):
+    """Assign the short integer handle a sensor uses in binary payloads
+
+    Returns the existing handle if the room already has one.
+    """
+    try:
+        db_service = current_app.config["DB_SERVICE"]
+        room = db_service.get_dr("room", room_id)
+        if not room or room.get("house_id") != house_id:
+            return jsonify({"error": "Room not found"}), 404
+
+        device_handle = room.get("profile", {}).get("device_handle")
+        if device_handle is None:
+            device_handle = db_service.next_sequence("device_handle", profile="control")
+            db_service.update_dr_fields("room", room_id, {"profile.device_handle": device_handle}, profile="control")
+        return jsonify({"status": "success", "room_id": room_id, "device_handle": device_handle}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @house_api.route("/<house_id>/rooms/<room_id>", methods=['DELETE'])
 def delete_room(room_id,house_id):
     """Delete a room"""
@@ -133,9 +185,9 @@ def delete_room(room_id,house_id):
         room = current_app.config["DB_SERVICE"].get_dr("room",room_id)
         if not room:
             return jsonify({"error":"Room not found"}), 404
-        current_app.config["DB_SERVICE"].delete_dr("room",room_id)
+        current_app.config["DB_SERVICE"].delete_dr("room",room_id, profile="control")
         # delete room_id in house->data->rooms
-        current_app.config["DT_FACTORY"].remove_room(house_id, room_id)
+        current_app.config["HOUSE_FACTORY"].remove_room(house_id, room_id)
                 
         return jsonify({"status":"success","message":"Room deleted successfully"}), 200
     except Exception as e:
@@ -144,15 +196,22 @@ def delete_room(room_id,house_id):
 
 @house_api.route("/<house_id>/rooms", methods=['GET'])
 def list_rooms(house_id):
-    """List all rooms with optional filtering"""
+    """List rooms with optional filtering, keyset paginated with limit and after"""
     try:
         filters = {}
         if request.args.get('status'):
             filters["data.status"] = request.args.get('status')
         if request.args.get('floor'):
             filters["profile.floor"] = int(request.args.get('floor'))
-        room = current_app.config["DB_SERVICE"].query_drs("room",filters)
-        return jsonify({"rooms":room}), 200
+        limit, after = page_args(request.args)
+        # The legacy history can be large, it has its own endpoint
+        room, next_after = current_app.config["DB_SERVICE"].page_drs(
+            "room", filters, projection={"data.measurements": 0},
+            limit=limit, after=after, profile="dashboard",
+        )
+        return jsonify({"rooms":room, "next_after":next_after}), 200
+    except ValueError as e:
+        return jsonify({"error":str(e)}), 400
     except Exception as e:
         return jsonify({"error":str(e)}),500
 
@@ -178,8 +237,6 @@ def add_room_measurements(room_id):
         #initilize fields if they do not exist
         if 'data' not in room:
             room['data'] = {}
-        if 'measurements' not in room['data']:
-            room['data']['measurements'] = {}
         #We need to register the measurement
         measurement = {
             "measure_type": data['measure_type'],
@@ -187,9 +244,7 @@ def add_room_measurements(room_id):
             "timestamp": datetime.utcnow()
         }
         update_data = {
-            "data": {
-                "measurements": room['data']['measurements'] + [measurement],
-            },
+            "data": {},
             "metadata": {
                 "updated_at": datetime.utcnow()
             }
@@ -204,6 +259,7 @@ def add_room_measurements(room_id):
         else:
             return jsonify({"error":"Wrong measure_type. Use 'temperature' or 'humidity"}), 404
 
+        current_app.config['DB_SERVICE'].append_measurement("room", room_id, measurement)
         current_app.config['DB_SERVICE'].update_dr("room", room_id, update_data)
         return jsonify({
             "status": "success",
@@ -212,4 +268,25 @@ def add_room_measurements(room_id):
     except Exception as e:
         return jsonify({"error":str(e)}),500
 
-
+@house_api.route("/<room_id>/measurements", methods=['GET'])
+def get_room_measurements(room_id):
+    """
+    Get the measurement history of a room
+    Optional query parameters (ISO 8601, with an offset or in UTC):
+        start, end
+    """
+    try:
+        start = request.args.get('start')
+        end = request.args.get('end')
+        measurements = current_app.config["DB_SERVICE"].get_measurements(
+            "room",
+            room_id,
+            start=_parse_time(start),
+            end=_parse_time(end),
+            profile="dashboard",
+        )
+        return jsonify({"measurements": measurements}), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error":str(e)}),500
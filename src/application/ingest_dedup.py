@@ -0,0 +1,57 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Optional
+
+
+class DedupWindow:
+    """Bounded in-memory set of recently seen ingest keys
+
+    Keys expire after their TTL and the oldest keys are evicted once
+    max_entries is reached, so memory stays bounded whatever the load.
+    """
+
+    def __init__(self, max_entries: int = 100000, ttl: float = 86400.0):
+        """
+        Args:
+            max_entries: Maximum number of keys kept
+            ttl: Default seconds a key is remembered
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._keys: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = Lock()
+        self._stats = {"checked": 0, "duplicates": 0, "evicted": 0}
+
+    def add(self, key: str, ttl: Optional[float] = None) -> bool:
+        """
+        Remember a key
+
+        Returns:
+            bool: False if the key was already seen within its TTL
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._stats["checked"] += 1
+            expires = self._keys.get(key)
+            if expires is not None and expires > now:
+                self._stats["duplicates"] += 1
+                return False
+            self._keys[key] = now + (self.ttl if ttl is None else ttl)
+            self._keys.move_to_end(key)
+            while len(self._keys) > self.max_entries:
+                self._keys.popitem(last=False)
+                self._stats["evicted"] += 1
+            return True
+
+    def discard(self, key: str) -> None:
+        """Forget a key, e.g. when its reading could not be stored"""
+        with self._lock:
+            self._keys.pop(key, None)
+
+    def stats(self) -> Dict:
+        """Snapshot of the window counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._keys)
+        return stats
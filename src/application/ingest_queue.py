@@ -0,0 +1,166 @@
+import logging
+import queue
+import time
+import zlib
+from threading import Thread, Event, Lock
+from typing import Any, Callable, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+def partition_of(key: Optional[str], count: int, salt: str = "") -> int:
+    """Stable partition index of a key, identical in every process
+
+    Different salts give independent partitionings, so a process owning one
+    partition can still spread its keys over its own worker threads.
+    """
+    if key is None or count <= 1:
+        return 0
+    return zlib.crc32(f"{salt}{key}".encode()) % count
+
+
+class IngestQueue:
+    """Bounded, partitioned queue drained by worker threads in micro-batches
+
+    Items submitted with the same key always land on the same partition and
+    are therefore processed in submission order by a single worker.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], None],
+        workers: int = 2,
+        queue_size: int = 10000,
+        batch_size: int = 200,
+        max_linger: float = 0.05,
+    ):
+        """
+        Args:
+            process_batch: Callback receiving a list of queued items
+            workers: Number of partitions / worker threads
+            queue_size: Total capacity, split evenly across partitions
+            batch_size: Maximum number of items per batch
+            max_linger: Maximum seconds to wait for a batch to fill up
+        """
+        self.process_batch = process_batch
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+        self.max_linger = float(max_linger)
+        self.partition_size = max(1, int(queue_size) // self.workers)
+        self.queues = [queue.Queue(maxsize=self.partition_size) for _ in range(self.workers)]
+        self.threads: List[Thread] = []
+        self.stopping = Event()
+
+        self._lock = Lock()
+        self._stats = {
+            "enqueued": 0,
+            "dropped": 0,
+            "processed": 0,
+            "batches": 0,
+            "errors": 0,
+            "max_depth": 0,
+            "last_batch_size": 0,
+            "last_flush_seconds": 0.0,
+        }
+
+    def start(self) -> None:
+        """Start the worker threads"""
+        self.stopping.clear()
+        for index in range(self.workers):
+            thread = Thread(target=self._worker_loop, args=(index,), name=f"ingest-worker-{index}")
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+        logger.info(f"Ingest queue started with {self.workers} workers")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the workers after draining what is already queued"""
+        self.stopping.set()
+        for thread in self.threads:
+            thread.join(timeout=timeout)
+        self.threads = []
+        logger.info("Ingest queue stopped")
+
+    def partition(self, key: Optional[str]) -> int:
+        """Stable partition index for a key"""
+        return partition_of(key, self.workers, salt="queue:")
+
+    def submit(self, item: Any, key: Optional[str] = None) -> bool:
+        """
+        Enqueue an item without blocking
+
+        Returns:
+            bool: False if the partition is full and the item was dropped
+        """
+        partition = self.queues[self.partition(key)]
+        try:
+            partition.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped"] += 1
+            return False
+
+        depth = partition.qsize()
+        with self._lock:
+            self._stats["enqueued"] += 1
+            if depth > self._stats["max_depth"]:
+                self._stats["max_depth"] = depth
+        return True
+
+    def depth(self) -> int:
+        """Number of items currently waiting in all partitions"""
+        return sum(q.qsize() for q in self.queues)
+
+    def stats(self) -> Dict:
+        """Snapshot of the queue counters"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["depth"] = self.depth()
+        stats["partition_depths"] = [q.qsize() for q in self.queues]
+        stats["capacity"] = self.partition_size * self.workers
+        return stats
+
+    def _collect_batch(self, partition: queue.Queue) -> List[Any]:
+        """Block for a first item, then linger until the batch is full"""
+        try:
+            batch = [partition.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.max_linger
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(partition.get_nowait())
+                else:
+                    batch.append(partition.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker_loop(self, index: int) -> None:
+        """Drain one partition until stopped and empty"""
+        partition = self.queues[index]
+        while not (self.stopping.is_set() and partition.empty()):
+            batch = self._collect_batch(partition)
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            try:
+                self.process_batch(batch)
+                failed = False
+            except Exception as e:
+                logger.error(f"Error processing ingest batch of {len(batch)} items: {e}")
+                failed = True
+            elapsed = time.perf_counter() - started
+
+            with self._lock:
+                self._stats["batches"] += 1
+                self._stats["processed"] += len(batch)
+                self._stats["last_batch_size"] = len(batch)
+                self._stats["last_flush_seconds"] = elapsed
+                if failed:
+                    self._stats["errors"] += 1
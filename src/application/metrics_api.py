@@ -0,0 +1,40 @@
+from functools import partial
+
+from flask import Blueprint, Response, current_app
+
+from src.services.metrics import METRICS
+
+metrics_api = Blueprint("metrics_api", __name__)
+
+
+def register_metrics_blueprint(app):
+    app.config.setdefault("METRICS", METRICS)
+    app.register_blueprint(metrics_api)
+
+
+@metrics_api.route("/metrics", methods=["GET"])
+def metrics():
+    """Process metrics in the Prometheus text exposition format"""
+    return Response(
+        current_app.config["METRICS"].render(),
+        mimetype="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+def register_component_stats(app):
+    """Export the stats() of the caches, queues and dispatcher of an app"""
+    metrics = app.config.setdefault("METRICS", METRICS)
+    if app.config.get("DB_SERVICE") is not None:
+        db_service = app.config["DB_SERVICE"]
+        metrics.register_stats("db", db_service.query_stats)
+        if db_service.cache is not None:
+            for kind in db_service.cache.kinds():
+                metrics.register_stats("dr_cache", partial(db_service.cache.stats, kind), {"type": kind})
+    if "DT_FACTORY" in app.config:
+        metrics.register_stats("twin_registry", app.config["DT_FACTORY"].twin_registry.stats, {"factory": "dt"})
+    if "HOUSE_FACTORY" in app.config:
+        metrics.register_stats("twin_registry", app.config["HOUSE_FACTORY"].twin_registry.stats, {"factory": "house"})
+    if app.config.get("WEATHER_CACHE") is not None:
+        metrics.register_stats("weather_cache", app.config["WEATHER_CACHE"].stats)
+    if app.config.get("NOTIFICATION_DISPATCHER") is not None:
+        metrics.register_stats("notification_dispatcher", app.config["NOTIFICATION_DISPATCHER"].stats)
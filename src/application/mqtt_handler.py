@@ -1,17 +1,57 @@
 from flask import current_app, jsonify
 import paho.mqtt.client as mqtt
-from datetime import datetime
+from datetime import datetime, timezone
 import json
 import logging
 import time
-from threading import Thread, Event
+from functools import partial
+from threading import Thread, Event, Lock
 from paho import mqtt as paho
-import math
 from src.services.comparing_humidity import HumidityComparisonService
+from src.application.ingest_queue import IngestQueue, partition_of
+from src.application.payload_codec import decode_payload, PayloadError
+from src.application.ingest_dedup import DedupWindow
+from src.services.humidity_alerts import HumidityAlertTracker, ESCALATE, RESOLVED
+from src.services.psychrometrics import absolute_humidity, absolute_humidity_array
+from src.services.metrics import METRICS
+from src.services.unit_of_work import UnitOfWork
+from src.services.latest_state import LatestStateTable
+from src.digital_twin.dt_factory import DT_CACHE_KIND
 
 
 logger = logging.getLogger(__name__)
 
+INGEST_MESSAGES = METRICS.counter(
+    "ingest_messages_total", "Measurement messages by outcome", ["result"]
+)
+INGEST_SAMPLES = METRICS.counter(
+    "ingest_samples_total", "Measurement samples by outcome", ["result"]
+)
+INGEST_ERRORS = METRICS.counter(
+    "ingest_errors_total", "Errors in the measurement pipeline by stage", ["stage"]
+)
+INGEST_STAGE_SECONDS = METRICS.histogram(
+    "ingest_stage_seconds", "Duration of the measurement pipeline stages", ["stage"]
+)
+INGEST_QUEUE_WAIT_SECONDS = METRICS.histogram(
+    "ingest_queue_wait_seconds", "Time readings spend in the ingest queue"
+)
+INGEST_BATCH_SIZE = METRICS.histogram(
+    "ingest_batch_size", "Readings per ingest batch", buckets=(1, 5, 10, 25, 50, 100, 200, 500, 1000)
+)
+
+# Room fields read back by the batch update, with the values just written
+# they are all the services need of the room
+ROOM_PROJECTION = ["house_id", "data.user", "data.alerts"]
+ROOM_FIELDS = ROOM_PROJECTION + ["data.temperature", "data.humidity", "data.absolute_humidity"]
+
+# Changes of the latest values written at once with write-behind enabled,
+# smaller ones wait for the interval; overridden by write_behind.deltas
+WRITE_BEHIND_DELTAS = {
+    "room": {"data.temperature": 0.2, "data.humidity": 1.0, "data.absolute_humidity": 0.1},
+    DT_CACHE_KIND: {"temperature": 0.2, "relative_humidity": 1.0, "absolute_humidity": 0.1},
+}
+
 
 class BaseMQTTHandler:
     """Base class for MQTT handlers"""
@@ -34,8 +74,11 @@ class BaseMQTTHandler:
         username = mqtt_config["username"]
         password = mqtt_config["password"]
 
-        self.client.username_pw_set(username, password)
-        self.client.tls_set(tls_version=paho.client.ssl.PROTOCOL_TLS)
+        if username:
+            self.client.username_pw_set(username, password)
+        # TLS can be switched off for a local development broker
+        if mqtt_config.get("tls", True):
+            self.client.tls_set(tls_version=paho.client.ssl.PROTOCOL_TLS)
 
     def start(self):
         """Start MQTT client in non-blocking way"""
@@ -142,11 +185,123 @@ class VentilationMQTTHandler(BaseMQTTHandler):
             logger.error(f"Error publishing Ventilation Device brightness: {e}")
 
 class MeasurementMQTTHandler(BaseMQTTHandler):
-    """MQTT handler for temperature and humidity measurements"""
+    """MQTT handler for temperature and humidity measurements
+
+    The paho network thread only decodes messages and hands them to an
+    IngestQueue. Worker threads persist them in micro-batches and run the
+    downstream services for the newest reading of every room in the batch.
+
+    Several handlers (e.g. in separate ingest processes) can share the load:
+    - shared_group: subscribe through the broker's shared subscription
+      $share/<group>/<topic>, the broker balances messages across members
+      but does not keep the order of a room's readings
+    - partition_count/partition_index: every handler receives all messages
+      and only keeps the rooms hashing to its own partition, which keeps
+      per-room ordering
+
+    Topics:
+    - measurement/<house_id>/<room_id>: ids are taken from the topic, so
+      foreign partitions are skipped before decoding the payload and the
+      room is only updated if it belongs to the house of the topic
+    - measurement/<house_id>: samples of several rooms of one house, each
+      with its room_id or device handle
+    - measurement: legacy flat topic, room_id or a device handle comes
+      from the payload
+    Payloads are JSON or the compact binary format of payload_codec, told
+    apart per message, and carry one sample or a batch of timestamped
+    samples. Device handles are short integers stored on the room
+    (profile.device_handle) and resolved through an in-memory map.
+    With `houses` set, only the topics of those houses are subscribed,
+    which lets the broker split the work by house.
+
+    With `write_behind` set, the latest values of the rooms (and the
+    outdoor values of the houses when there is no weather cache) go to a
+    LatestStateTable instead of being written with every reading, reads
+    through the DatabaseService see the values not written yet.
+    """
     def __init__(self, app):
         super().__init__(app)
-        self.topic = "measurement"
+        ingest_config = self.app.config["MQTT_CONFIG"].get("ingest", {})
+        self.topic = ingest_config.get("topic", "measurement")
+        self.houses = ingest_config.get("houses") or []
+        self.legacy_topic = ingest_config.get("legacy_topic", True)
+        self.shared_group = ingest_config.get("shared_group")
+        self.partition_count = ingest_config.get("partition_count", 1)
+        self.partition_index = ingest_config.get("partition_index", 0)
         self.humidity_comparison_service = HumidityComparisonService()  # Initialize the service
+        self.alert_tracker = HumidityAlertTracker(**self.app.config.get("ALERT_CONFIG", {}))
+        self.device_handles = {}
+        # Houses already reported without outdoor conditions, logged once
+        self._houses_without_weather = set()
+        self.device_handle_ttl = ingest_config.get("device_handle_ttl", 300)
+        self.max_clock_skew = ingest_config.get("max_clock_skew", 86400)
+
+        # Drops QoS 1 redeliveries and retained replays: keys with a device
+        # time are checked in memory and against the ingest_dedup collection,
+        # keys with only a sequence number (which wraps) in memory only
+        dedup_config = ingest_config.get("dedup", {})
+        self.dedup = DedupWindow(
+            max_entries=dedup_config.get("window", 100000),
+            ttl=dedup_config.get("ttl", 86400),
+        )
+        self.seq_dedup_ttl = dedup_config.get("seq_ttl", 600)
+        self.persist_dedup = dedup_config.get("persist", True)
+        self._device_handles_lock = Lock()
+
+        self.ingest_queue = IngestQueue(
+            self._process_batch,
+            workers=ingest_config.get("workers", 2),
+            queue_size=ingest_config.get("queue_size", 10000),
+            batch_size=ingest_config.get("batch_size", 200),
+            max_linger=ingest_config.get("max_linger", 0.05),
+        )
+        METRICS.register_stats("ingest_queue", self.ingest_queue.stats, {"partition": str(self.partition_index)})
+        METRICS.register_stats("ingest_dedup", self.dedup.stats, {"partition": str(self.partition_index)})
+
+        # An entity is written at most once per interval unless a value
+        # moved by its delta, a crash loses at most one interval of values
+        write_behind = ingest_config.get("write_behind")
+        self.latest_state = None
+        if write_behind:
+            self.latest_state = LatestStateTable(
+                interval=write_behind.get("interval", 30.0),
+                check_interval=write_behind.get("check_interval", 1.0),
+            )
+            deltas = write_behind.get("deltas", {})
+            self.latest_state.configure("room", self._write_rooms, deltas.get("room", WRITE_BEHIND_DELTAS["room"]))
+            self.latest_state.configure(
+                DT_CACHE_KIND, self._write_houses, deltas.get(DT_CACHE_KIND, WRITE_BEHIND_DELTAS[DT_CACHE_KIND])
+            )
+            self.app.config["DB_SERVICE"].latest_state = self.latest_state
+            self.app.config["LATEST_STATE"] = self.latest_state
+            for kind in ("room", DT_CACHE_KIND):
+                METRICS.register_stats(
+                    "latest_state",
+                    partial(self.latest_state.stats, kind),
+                    {"partition": str(self.partition_index), "kind": kind},
+                )
+
+    def start(self):
+        """Start the ingest workers before receiving messages"""
+        if self.latest_state is not None:
+            self.latest_state.start()
+        self.ingest_queue.start()
+        super().start()
+
+    def stop(self):
+        """Stop receiving messages, drain the ingest queue and write the pending latest values"""
+        super().stop()
+        self.ingest_queue.stop()
+        if self.latest_state is not None:
+            self.latest_state.stop()
+
+    def _write_rooms(self, updates):
+        """LatestStateTable writer of the latest room values"""
+        self.app.config["DB_SERVICE"].update_dr_fields_many("room", updates, profile="telemetry")
+
+    def _write_houses(self, updates):
+        """LatestStateTable writer of the outdoor values of the houses"""
+        self.app.config["HOUSE_FACTORY"].update_temperature_humidity_many(updates)
 
     def _on_connect(self, client, userdata, flags, rc):
         """Handle connection to broker"""
@@ -154,153 +309,497 @@ class MeasurementMQTTHandler(BaseMQTTHandler):
             self.connected = True
             logger.info("Connected to MQTT broker")
             # Subscribe to temperature topics
-            client.subscribe(self.topic)
-            logger.info(f"Subscribed to {self.topic}")
+            topics = self.subscriptions()
+            client.subscribe([(topic, 0) for topic in topics])
+            logger.info(f"Subscribed to {', '.join(topics)}")
         else:
             self.connected = False
             logger.error(f"Failed to connect to MQTT broker with code: {rc}")
 
+    def subscriptions(self):
+        """Topic filters to subscribe to, shared if a group is configured"""
+        if self.houses:
+            topics = []
+            for house_id in self.houses:
+                topics += [f"{self.topic}/{house_id}/+", f"{self.topic}/{house_id}"]
+        else:
+            topics = [f"{self.topic}/+/+", f"{self.topic}/+"]
+        if self.legacy_topic:
+            topics.append(self.topic)
+        if self.shared_group:
+            topics = [f"$share/{self.shared_group}/{topic}" for topic in topics]
+        return topics
+
+    def parse_topic(self, topic):
+        """
+        Split a measurement topic into house and room id
+
+        Returns:
+            Tuple (house_id, room_id): room_id is None on the house topic,
+            both are None on the legacy flat topic. None if the topic is not
+            a measurement topic.
+        """
+        if topic == self.topic:
+            return None, None
+        if "+" in topic or "#" in topic:
+            return None
+        parts = topic.split("/")
+        if parts[0] != self.topic or len(parts) not in (2, 3) or not all(parts[1:]):
+            return None
+        return parts[1], (parts[2] if len(parts) == 3 else None)
+
     def _on_message(self, client, userdata, msg):
-        """Handle incoming temperature measurements
-        
+        """Decode incoming temperature measurements and enqueue them
+
+        Topics:
+            measurement/<house_id>/<room_id>   samples of one room
+            measurement/<house_id>             samples of several rooms of a
+                                               house, e.g. from a gateway
+            measurement                        legacy flat topic
+
         Expected JSON-Body:
         {
-            'room_id': "room_id",
+            'room_id': "room_id",           # unless the topic names the room
             'device_id': "device_id",
             'temperature': 25.0,
-            'humidity': 50.0
+            'humidity': 50.0,
+            'ts': 1700000000.5              # optional device time (unix s)
+        }
+        or a batch of samples, each with its own ts and optionally its own
+        room_id or device_handle:
+        {
+            'device_id': "device_id",
+            'samples': [{'ts': ..., 'temperature': ..., 'humidity': ...}, ...]
+        }
+        or the binary formats of payload_codec, with a device handle unless
+        the topic names the room
         """
+        started = time.perf_counter()
         try:
-            # Parse the JSON payload
-            payload = msg.payload.decode()
-            data = json.loads(payload)
-
-            with self.app.app_context():
-                # Add temperature to room
-                # Check if data contains room_id or house_id
-                if 'room_id' in data:
-                    dr = current_app.config["DB_SERVICE"].get_dr("room",data['room_id'])
-                    type = "room"
-                else:
-                    logger.error("Room or house id not found in data")
+            route = self.parse_topic(msg.topic)
+            if route is None:
+                INGEST_MESSAGES.labels("invalid").inc()
+                logger.error(f"Unexpected measurement topic: {msg.topic}")
+                return
+            house_id, room_id = route
+            if room_id is not None and partition_of(room_id, self.partition_count) != self.partition_index:
+                # Room belongs to another ingest worker, no need to decode
+                INGEST_MESSAGES.labels("skipped").inc()
+                return
+
+            data = decode_payload(msg.payload)
+            samples = data['samples'] if 'samples' in data else [data]
+            if not isinstance(samples, list) or not samples:
+                INGEST_MESSAGES.labels("invalid").inc()
+                logger.error(f"Empty or malformed samples on {msg.topic}")
+                return
+            INGEST_MESSAGES.labels("decoded").inc()
+
+            received_at = datetime.utcnow()
+            # Retained messages are replayed on every (re)subscribe
+            retained = bool(getattr(msg, "retain", False))
+            for index, sample in enumerate(samples):
+                self._submit_sample(sample, data, house_id, room_id, received_at, started, index, retained)
+        except PayloadError as e:
+            INGEST_MESSAGES.labels("invalid").inc()
+            logger.error(f"Invalid payload on {msg.topic}: {e}")
+        except Exception as e:
+            INGEST_MESSAGES.labels("invalid").inc()
+            logger.error(f"Error decoding message: {e}")
+        finally:
+            INGEST_STAGE_SECONDS.labels("decode").observe(time.perf_counter() - started)
+
+    def _submit_sample(self, sample, message, house_id, room_id, received_at, received, index=0, retained=False):
+        """Resolve the room of one sample, drop duplicates and hand it to the ingest queue"""
+        if room_id is None:
+            handle = sample.get('device_handle', message.get('device_handle'))
+            if handle is not None:
+                route = self.resolve_device_handle(handle)
+                if route is None:
+                    INGEST_SAMPLES.labels("invalid").inc()
+                    logger.error(f"Unknown device handle {handle}")
                     return
-                if not dr:
-                    logger.error(f"Room not found: {data['room_id']}")
+                # A house topic still restricts the handle to that house
+                house_id, room_id = house_id or route[0], route[1]
+            else:
+                room_id = sample.get('room_id', message.get('room_id'))
+                if room_id is None:
+                    INGEST_SAMPLES.labels("invalid").inc()
+                    logger.error("Room id not found in data")
                     return
-                absolute_humidity = self.calculate_ah(data['temperature'], data['humidity'])
-                if type == "room":
-                    #initilize fields if they do not exist
-                    if 'data' not in dr:
-                        dr['data'] = {}
-                    if 'measurements' not in dr['data']:
-                        dr['data']['measurements'] = []
-                    #We need to register the measurement
-                    measurement = {
-                        "temperature": data['temperature'],
-                        "humidity": data['humidity'],
-                        "timestamp": datetime.utcnow()
-                    }
-                    update_data = {
-                        "data": {
-                            "measurements": dr['data']['measurements'] + [measurement],
-                            "temperature": data['temperature'],
-                            "humidity": data['humidity'],
-                            "absolute_humidity": absolute_humidity
-                        },
-                        "metadata": {
-                            "updated_at": datetime.utcnow()
-                        }
-                    }
-                    existing_data = current_app.config['DB_SERVICE'].get_dr("room", data['room_id'])
-                    # Merge existing data with update_data to make sure we don`t loose anything
-                    merged_data = existing_data.copy()
-                    merged_data['data'].update(update_data['data'])
-                    merged_data['metadata'].update(update_data['metadata'])
+            if partition_of(room_id, self.partition_count) != self.partition_index:
+                INGEST_SAMPLES.labels("skipped").inc()
+                return
+        elif sample.get('room_id', room_id) != room_id:
+            INGEST_SAMPLES.labels("invalid").inc()
+            logger.error(f"Room id {sample['room_id']} does not match the topic room {room_id}")
+            return
 
-                    current_app.config['DB_SERVICE'].update_dr("room", data['room_id'], merged_data)
+        timestamp, device_time = self._sample_time(sample.get('ts', message.get('ts')), received_at)
+        dedup_key = None
+        if device_time:
+            # Devices with a coarse clock send several samples per timestamp,
+            # the sequence number and sample index tell them apart
+            suffix = f"t{timestamp.isoformat()}"
+            if message.get('seq') is not None:
+                suffix += f"|s{message['seq']}"
+            dedup_key = self._dedup_key(room_id, sample, message, f"{suffix}.{index}")
+            is_new = self.dedup.add(dedup_key)
+        elif message.get('seq') is not None:
+            # Sequence numbers wrap, remember them only for a short while
+            is_new = self.dedup.add(
+                self._dedup_key(room_id, sample, message, f"s{message['seq']}.{index}"),
+                ttl=self.seq_dedup_ttl,
+            )
+        else:
+            # Without any key a retained message can only be a replay
+            is_new = not retained
+        if not is_new:
+            INGEST_SAMPLES.labels("duplicate").inc()
+            return
 
-                    #execute FetchWeatherService
-                    try:
-                        dt_instance = current_app.config["HOUSE_FACTORY"].get_dt_instance(dt_id=dr['house_id'])
-                        #dt = current_app.config['DT_FACTORY'].get_dt(dr['house_id'])
-                        prediction = dt_instance.execute_service(
-                            'FetchWeatherService', 
-                            longitude=dt_instance.longitude,
-                            latitude=dt_instance.latitude
-                        )
-                     
-                        # calculate absolute humidity
-                        absolute_humidity = self.calculate_ah(prediction['temperature'], prediction['humidity'])
-                        #add temperature and humidity to dt
-                        current_app.config['HOUSE_FACTORY'].update_temperature_humidity(dr['house_id'], 
-                                                                                        prediction['temperature'], 
-                                                                                        prediction['humidity'], 
-                                                                                        absolute_humidity)
+        reading = {
+            "room_id": room_id,
+            "house_id": house_id,
+            "temperature": sample['temperature'],
+            "humidity": sample['humidity'],
+            "timestamp": timestamp,
+            "received": received,
+            "dedup_key": dedup_key if self.persist_dedup else None,
+        }
+        if self.ingest_queue.submit(reading, key=room_id):
+            INGEST_SAMPLES.labels("accepted").inc()
+        else:
+            INGEST_SAMPLES.labels("dropped").inc()
+            if dedup_key:
+                self.dedup.discard(dedup_key)
+            logger.warning(f"Ingest queue full, dropped measurement for room {room_id}")
+
+    def _dedup_key(self, room_id, sample, message, suffix):
+        """Key identifying a sample: room, device and device time or sequence"""
+        device = sample.get('device_id', message.get('device_id'))
+        if device is None:
+            device = sample.get('device_handle', message.get('device_handle', ""))
+        return f"{room_id}|{device}|{suffix}"
+
+    def _sample_time(self, ts, received_at):
+        """
+        Device timestamp of a sample, the receive time if missing or implausible
 
-                    except Exception as e:
-                        logger.error(f"Error executing FetchWeatherService: {e}")
+        Returns:
+            Tuple of the timestamp and whether it came from the device
+        """
+        if ts is None:
+            return received_at, False
+        try:
+            if isinstance(ts, str):
+                timestamp = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+                if timestamp.tzinfo is not None:
+                    timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+            else:
+                timestamp = datetime.utcfromtimestamp(float(ts))
+        except (TypeError, ValueError, OverflowError, OSError):
+            INGEST_ERRORS.labels("timestamp").inc()
+            return received_at, False
+        # Devices without a synchronised clock must not rewrite history
+        if abs((timestamp - received_at).total_seconds()) > self.max_clock_skew:
+            INGEST_ERRORS.labels("clock_skew").inc()
+            return received_at, False
+        return timestamp, True
+
+    def resolve_device_handle(self, handle):
+        """
+        (house_id, room_id) of the room a device handle is assigned to
 
-                    #execute HumidityComparisonService
-                    try:
-                        comparison = dt_instance.execute_service(
-                            'HumidityComparisonService',
-                            room_id=data['room_id'],
-                            house_id=dr['house_id']
+        Lookups are cached, unknown handles for device_handle_ttl seconds so
+        a misconfigured device cannot cause a query per message.
+        """
+        now = time.monotonic()
+        with self._device_handles_lock:
+            cached = self.device_handles.get(handle)
+        if cached is not None and (cached[0] is not None or now - cached[1] < self.device_handle_ttl):
+            return cached[0]
+
+        with self.app.app_context():
+            rooms = current_app.config["DB_SERVICE"].query_drs("room", {"profile.device_handle": handle})
+        route = (rooms[0].get('house_id'), rooms[0]['_id']) if rooms else None
+        with self._device_handles_lock:
+            self.device_handles[handle] = (route, now)
+        return route
+
+    def forget_device_handle(self, handle):
+        """Drop a cached handle, e.g. after it was reassigned"""
+        with self._device_handles_lock:
+            self.device_handles.pop(handle, None)
+
+    def _process_batch(self, readings):
+        """Persist a batch of readings and run the downstream services
+
+        The latest values of all rooms are written with one bulk write, the
+        history with another one. Services only run for the newest reading of
+        each room, as older readings in the same batch are already superseded.
+        """
+        started = time.perf_counter()
+        INGEST_BATCH_SIZE.observe(len(readings))
+        for reading in readings:
+            INGEST_QUEUE_WAIT_SECONDS.observe(started - reading['received'])
+
+        with self.app.app_context():
+            db_service = current_app.config["DB_SERVICE"]
+
+            # Samples already stored by an earlier run or another worker
+            keys = [reading['dedup_key'] for reading in readings if reading.get('dedup_key')]
+            if keys:
+                try:
+                    with INGEST_STAGE_SECONDS.labels("dedup").time():
+                        new_keys = db_service.claim_ingest_keys(keys, profile="telemetry")
+                except Exception as e:
+                    # Storing a duplicate beats losing the batch
+                    INGEST_ERRORS.labels("dedup").inc()
+                    logger.error(f"Error checking ingest keys: {e}")
+                    new_keys = set(keys)
+                if len(new_keys) < len(keys):
+                    readings = [
+                        reading for reading in readings
+                        if not reading.get('dedup_key') or reading['dedup_key'] in new_keys
+                    ]
+                    INGEST_SAMPLES.labels("duplicate").inc(len(keys) - len(new_keys))
+                    if not readings:
+                        return
+
+            # One vectorized evaluation for the whole batch
+            absolute_humidities = absolute_humidity_array(
+                [reading['temperature'] for reading in readings],
+                [reading['humidity'] for reading in readings],
+            )
+            # The newest sample of each room drives the latest values and alerts
+            latest = {}
+            for reading, ah in zip(readings, absolute_humidities.tolist()):
+                reading['absolute_humidity'] = ah
+                current = latest.get(reading['room_id'])
+                if current is None or reading['timestamp'] >= current['timestamp']:
+                    latest[reading['room_id']] = reading
+
+            with INGEST_STAGE_SECONDS.labels("room_update").time():
+                rooms = self._update_rooms(db_service, latest)
+            for room_id, reading in latest.items():
+                if room_id not in rooms:
+                    INGEST_ERRORS.labels("room_lookup").inc()
+                    logger.error(f"Room {room_id} not found in house {reading['house_id'] or '(any)'}")
+
+            #We need to register the measurements in the history store
+            with INGEST_STAGE_SECONDS.labels("history").time():
+                db_service.append_measurements(
+                    "room",
+                    [
+                        (
+                            reading['room_id'],
+                            {
+                                "temperature": reading['temperature'],
+                                "humidity": reading['humidity'],
+                                "timestamp": reading['timestamp'],
+                            },
                         )
-                        logger.info(f"Humidity comparison: {comparison}")
+                        for reading in readings
+                        if reading['room_id'] in rooms
+                    ],
+                    profile="telemetry",
+                )
+
+            # Rooms, houses and users are loaded once for the whole batch and
+            # the alert states are written together at the end
+            unit_of_work = UnitOfWork(
+                db_service,
+                dt_factory=current_app.config["DT_FACTORY"],
+                house_factory=current_app.config["HOUSE_FACTORY"],
+                profile="telemetry",
+            )
+            for room_id, room in rooms.items():
+                reading = latest[room_id]
+                room.setdefault("data", {}).update(
+                    temperature=reading['temperature'],
+                    humidity=reading['humidity'],
+                    absolute_humidity=reading['absolute_humidity'],
+                )
+                unit_of_work.register("room", room, fields=ROOM_FIELDS)
+
+            for room_id, reading in latest.items():
+                if room_id in rooms:
+                    try:
+                        with INGEST_STAGE_SECONDS.labels("services").time():
+                            self._process_reading(reading, unit_of_work)
                     except Exception as e:
-                        logger.error(f"Error executing HumidityComparisonService: {e}")
+                        INGEST_ERRORS.labels("services").inc()
+                        logger.error(f"Error processing measurement for room {room_id}: {e}")
 
-                    #check if there is a registered user
-                    if not dr['data']['user']:
-                        logger.error(f"User not found for room {data['room_id']}")
-                        return
+            try:
+                with INGEST_STAGE_SECONDS.labels("alert_state").time():
+                    unit_of_work.flush()
+            except Exception as e:
+                INGEST_ERRORS.labels("alert_state").inc()
+                logger.error(f"Error storing alert states: {e}")
 
-                    # Send user notification if required
-                    if data['humidity'] > 60 and comparison['absolute_humidity_difference'] > 0:
-                        #execute UserNotificationService
-                        for user_id in dr['data']['user']:
-                            try:
-                                dt_instance.execute_service(
-                                    'UserNotificationService',
-                                    user_id=user_id,
-                                    text=f"High humidity detected in room {data['room_id']}. The absolute humidity difference between the room and the house is {comparison['absolute_humidity_difference']:.2f} g/m³. Please take action."
-                                )
-                            except Exception as e:
-                                logger.error(f"Error executing UserNotificationService: {e}")
-                    #print(comparison)
-                
-                elif type == "house":
-                    current_app.config['HOUSE_FACTORY'].update_temperature_humidity(data['house_id'], 
-                                                                                        data['temperature'], 
-                                                                                        data['humidity'], 
-                                                                                        self.calculate_ah(data['temperature'], data['humidity']))
-        except json.JSONDecodeError:
-            logger.error(f"Invalid JSON payload: {msg.payload}")
-        except Exception as e:
-            logger.error(f"Error processing message: {e}")
+        INGEST_STAGE_SECONDS.labels("batch").observe(time.perf_counter() - started)
 
-    def calculate_ah(self, temperature, relative_humidity):
+    def _update_rooms(self, db_service, latest):
         """
-        Calculates the absolute humidity (AH) in g/m³.
+        Store the latest values of the rooms of a batch
 
-        :param temperature: Temperature in degrees Celsius (°C)
-        :param relative_humidity: Relative humidity in percentage (%)
-        :return: Absolute humidity (AH) in g/m³
+        Without write-behind the values are written with one bulk update
+        reading the rooms back. With write-behind the rooms are read through
+        the cache and only the rooms due in the LatestStateTable are written.
+
+        Returns:
+            Dict of the rooms found in the house of their reading, with the
+            ROOM_PROJECTION fields
         """
-        # Constants
-        A = 6.11
-        B = 17.67
-        C = 243.5
-        D = 2.1674
+        values = {
+            room_id: {
+                "data.temperature": reading['temperature'],
+                "data.humidity": reading['humidity'],
+                "data.absolute_humidity": reading['absolute_humidity'],
+            }
+            for room_id, reading in latest.items()
+        }
+        if self.latest_state is None:
+            return db_service.update_dr_fields_many(
+                "room",
+                values,
+                projection=ROOM_PROJECTION,
+                # Readings routed by topic must belong to the house of the topic
+                match={
+                    room_id: {"house_id": reading['house_id']}
+                    for room_id, reading in latest.items()
+                    if reading['house_id'] is not None
+                },
+                profile="telemetry",
+            )
+
+        rooms = {
+            room_id: room
+            for room_id, room in db_service.get_drs(
+                "room", list(latest), projection=ROOM_PROJECTION, profile="telemetry"
+            ).items()
+            if latest[room_id]['house_id'] is None or room.get('house_id') == latest[room_id]['house_id']
+        }
+        due = self.latest_state.offer("room", {room_id: values[room_id] for room_id in rooms})
+        try:
+            self.latest_state.write("room", due)
+        except Exception as e:
+            # The values stay pending, the table retries in the background
+            INGEST_ERRORS.labels("room_update").inc()
+            logger.error(f"Error writing latest room values: {e}")
+        return rooms
+
+    def _process_reading(self, data, unit_of_work):
+        """Run the house services for the latest reading of a room
+
+        The room was registered with the unit of work by the batch, alert
+        state changes are left in it for the batch to flush.
+        """
+        dr = unit_of_work.get_dr("room", data['room_id'], fields=ROOM_FIELDS)
+        #execute FetchWeatherService
+        try:
+            with INGEST_STAGE_SECONDS.labels("house_lookup").time():
+                dt_instance = unit_of_work.get_dt_instance(dr['house_id'])
+            # Outdoor values are refreshed by the weather cache in the
+            # background and stored on the house, here we only look them up.
+            # Standalone workers do not run the cache, the API process
+            # stores the values on the house where the services read them
+            weather_cache = current_app.config.get("WEATHER_CACHE")
+            if weather_cache is not None and not weather_cache.is_running():
+                prediction = None
+            else:
+                prediction = dt_instance.execute_service(
+                    'FetchWeatherService', 
+                    longitude=dt_instance.longitude,
+                    latitude=dt_instance.latitude,
+                    house_id=dr['house_id']
+                )
+                if prediction is None and dr['house_id'] not in self._houses_without_weather:
+                    self._houses_without_weather.add(dr['house_id'])
+                    logger.debug(f"No outdoor conditions cached yet for house {dr['house_id']}")
+            if prediction is not None and weather_cache is None:
+                # calculate absolute humidity
+                outdoor_absolute_humidity = absolute_humidity(prediction['temperature'], prediction['humidity'])
+                #add temperature and humidity to dt
+                if self.latest_state is not None:
+                    due = self.latest_state.offer(DT_CACHE_KIND, {
+                        dr['house_id']: {
+                            "temperature": prediction['temperature'],
+                            "relative_humidity": prediction['humidity'],
+                            "absolute_humidity": outdoor_absolute_humidity,
+                        }
+                    })
+                    self.latest_state.write(DT_CACHE_KIND, due)
+                else:
+                    current_app.config['HOUSE_FACTORY'].update_temperature_humidity(dr['house_id'], 
+                                                                                    prediction['temperature'], 
+                                                                                    prediction['humidity'], 
+                                                                                    outdoor_absolute_humidity)
 
-        # Saturation vapor pressure (in hPa)
-        saturation_vapor_pressure = A * math.exp((B * temperature) / (C + temperature))
+        except Exception as e:
+            INGEST_ERRORS.labels("weather").inc()
+            logger.error(f"Error executing FetchWeatherService: {e}")
 
-        # Actual vapor pressure (in hPa)
-        actual_vapor_pressure = saturation_vapor_pressure * (relative_humidity / 100.0)
+        #execute HumidityComparisonService
+        try:
+            comparison = dt_instance.execute_service(
+                'HumidityComparisonService',
+                unit_of_work=unit_of_work,
+                room_id=data['room_id'],
+                house_id=dr['house_id'],
+                room_absolute_humidity=data['absolute_humidity']
+            )
+            logger.info(f"Humidity comparison: {comparison}")
+        except Exception as e:
+            INGEST_ERRORS.labels("comparison").inc()
+            logger.error(f"Error executing HumidityComparisonService: {e}")
+            return
 
-        # Absolute humidity (in g/m³)
-        absolute_humidity = (D * actual_vapor_pressure) / (273.15 + temperature)
+        #check if there is a registered user
+        users = dr.get('data', {}).get('user')
+        if not users:
+            logger.error(f"User not found for room {data['room_id']}")
+            return
 
-        return absolute_humidity
\ No newline at end of file
+        # Notify on alert state changes only, not on every reading
+        difference = comparison['absolute_humidity_difference']
+        persisted_alerts = dr.get('data', {}).get('alerts') or {}
+        alert_changes = {}
+        for user_id in users:
+            event, state = self.alert_tracker.evaluate(
+                data['room_id'],
+                user_id,
+                data['humidity'],
+                difference,
+                persisted=persisted_alerts.get(user_id),
+            )
+            if state is not None:
+                alert_changes[f"data.alerts.{user_id}"] = state
+            if event is None:
+                continue
+
+            #execute UserNotificationService
+            try:
+                dt_instance.execute_service(
+                    'UserNotificationService',
+                    unit_of_work=unit_of_work,
+                    user_id=user_id,
+                    text=self._alert_text(event, data, difference, state)
+                )
+            except Exception as e:
+                INGEST_ERRORS.labels("notify").inc()
+                logger.error(f"Error executing UserNotificationService: {e}")
+
+        unit_of_work.set_fields("room", data['room_id'], alert_changes)
+
+    def _alert_text(self, event, data, difference, state):
+        """Notification text for an alert state change"""
+        if event == RESOLVED:
+            return f"Humidity in room {data['room_id']} is back to normal ({data['humidity']:.0f} %)."
+        text = f"High humidity detected in room {data['room_id']}. The absolute humidity difference between the room and the house is {difference:.2f} g/m³. Please take action."
+        if event == ESCALATE:
+            minutes = (datetime.utcnow() - state['t']).total_seconds() / 60
+            text = f"Reminder {state['l'] - 1}: humidity has been high for {minutes:.0f} minutes. " + text
+        return text
@@ -17,4 +17,11 @@ MQTT_BROKER_URL = os.getenv("MQTT_BROKER_URL")
 if not MQTT_BROKER_URL:
     raise ValueError("MQTT_BROKER_URL not found in .env file")
 
+MQTT_PORT = int(os.getenv("MQTT_PORT", "8883"))
 
+# Set MQTT_TLS=false to talk to a local development broker without TLS
+MQTT_TLS = os.getenv("MQTT_TLS", "true").lower() != "false"
+
+# Set MQTT_EMBEDDED_INGEST=false when measurements are ingested by the
+# standalone workers started with ingest.py
+MQTT_EMBEDDED_INGEST = os.getenv("MQTT_EMBEDDED_INGEST", "true").lower() != "false"
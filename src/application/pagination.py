@@ -0,0 +1,28 @@
+from typing import Optional, Tuple
+
+# Page size of the list endpoints without a limit parameter, and its maximum
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def page_args(args) -> Tuple[int, Optional[str]]:
+    """
+    Read the limit and after parameters of a keyset-paginated listing
+
+    Args:
+        args: The request arguments
+
+    Returns:
+        Tuple of the page size and the ID to continue after
+
+    Raises:
+        ValueError: If limit is not a positive integer
+    """
+    limit = args.get("limit", DEFAULT_PAGE_SIZE)
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid limit: {limit}")
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    return min(limit, MAX_PAGE_SIZE), args.get("after") or None
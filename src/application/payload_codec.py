@@ -0,0 +1,162 @@
+import json
+import struct
+from typing import Dict, List, Optional, Tuple
+
+
+# Compact binary measurement, little endian:
+#   version  uint8   BINARY_VERSION
+#   flags    uint8   FLAG_DEVICE_HANDLE: a device handle follows the values
+#   seq      uint16  per-device sequence number, wraps around
+#   temp     int16   temperature in 0.01 °C
+#   hum      uint16  relative humidity in 0.01 %
+#   [handle  uint32] device handle, identifies the room on the flat topic
+# 8 bytes on a measurement/<house_id>/<room_id> topic, 12 with a handle.
+#
+# With FLAG_BATCH several timestamped samples share one message:
+#   version  uint8
+#   flags    uint8   FLAG_BATCH, optionally FLAG_DEVICE_HANDLE and FLAG_MILLIS
+#   seq      uint16
+#   base_ts  uint32  unix time (s) of the first sample
+#   count    uint8   number of samples
+#   [handle  uint32]
+#   count x (offset, temp int16, hum uint16), the offset after base_ts is
+#            uint32 in ms with FLAG_MILLIS, else uint16 in 0.1 s (older
+#            devices, samples closer than 100 ms share a timestamp)
+BINARY_VERSION = 1
+FLAG_DEVICE_HANDLE = 0x01
+FLAG_BATCH = 0x02
+FLAG_MILLIS = 0x04
+MAX_BATCH_SAMPLES = 255
+
+_HEADER = struct.Struct("<BBHhH")
+_BATCH_HEADER = struct.Struct("<BBHIB")
+_SAMPLE = struct.Struct("<HhH")
+_SAMPLE_MILLIS = struct.Struct("<IhH")
+_HANDLE = struct.Struct("<I")
+
+# JSON documents start with '{', possibly after whitespace
+_JSON_START = frozenset(b"{ \t\r\n")
+
+
+class PayloadError(ValueError):
+    """Raised for payloads in neither the binary nor the JSON format"""
+
+
+def encode_binary(
+    temperature: float,
+    humidity: float,
+    seq: int = 0,
+    device_handle: Optional[int] = None,
+) -> bytes:
+    """Encode a reading in the compact binary format"""
+    values = (
+        BINARY_VERSION,
+        FLAG_DEVICE_HANDLE if device_handle is not None else 0,
+        seq & 0xFFFF,
+        int(round(temperature * 100)),
+        int(round(humidity * 100)),
+    )
+    if device_handle is None:
+        return _HEADER.pack(*values)
+    return _HEADER.pack(*values) + _HANDLE.pack(device_handle)
+
+
+def encode_binary_batch(
+    samples: List[Tuple[float, float, float]],
+    seq: int = 0,
+    device_handle: Optional[int] = None,
+) -> bytes:
+    """
+    Encode several samples in one binary message
+
+    Args:
+        samples: (unix timestamp, temperature, humidity) tuples, in time order
+            and spanning less than 49 days
+        seq: Sequence number of the message
+        device_handle: Optional handle for the flat topic
+    """
+    if not samples or len(samples) > MAX_BATCH_SAMPLES:
+        raise PayloadError(f"A batch carries 1 to {MAX_BATCH_SAMPLES} samples")
+    base = int(samples[0][0])
+    flags = FLAG_BATCH | FLAG_MILLIS | (FLAG_DEVICE_HANDLE if device_handle is not None else 0)
+    parts = [_BATCH_HEADER.pack(BINARY_VERSION, flags, seq & 0xFFFF, base, len(samples))]
+    if device_handle is not None:
+        parts.append(_HANDLE.pack(device_handle))
+    for timestamp, temperature, humidity in samples:
+        parts.append(_SAMPLE_MILLIS.pack(
+            int(round((timestamp - base) * 1000)),
+            int(round(temperature * 100)),
+            int(round(humidity * 100)),
+        ))
+    return b"".join(parts)
+
+
+def decode_binary(payload) -> Dict:
+    """
+    Decode a compact binary reading straight from the received buffer
+
+    Returns:
+        Dict: temperature, humidity, seq and, if present, device_handle;
+        for batches seq, samples (each with ts, temperature, humidity) and
+        device_handle if present
+    """
+    try:
+        version, flags = payload[0], payload[1]
+        if version != BINARY_VERSION:
+            raise PayloadError(f"Unsupported binary payload version {version}")
+        if flags & FLAG_BATCH:
+            return _decode_binary_batch(payload, flags)
+
+        _, _, seq, temperature, humidity = _HEADER.unpack_from(payload)
+        reading = {
+            "temperature": temperature / 100.0,
+            "humidity": humidity / 100.0,
+            "seq": seq,
+        }
+        if flags & FLAG_DEVICE_HANDLE:
+            reading["device_handle"] = _HANDLE.unpack_from(payload, _HEADER.size)[0]
+        return reading
+    except (struct.error, IndexError) as e:
+        raise PayloadError(f"Truncated binary payload: {e}")
+
+
+def _decode_binary_batch(payload, flags: int) -> Dict:
+    _, _, seq, base, count = _BATCH_HEADER.unpack_from(payload)
+    offset = _BATCH_HEADER.size
+    batch = {"seq": seq}
+    if flags & FLAG_DEVICE_HANDLE:
+        batch["device_handle"] = _HANDLE.unpack_from(payload, offset)[0]
+        offset += _HANDLE.size
+
+    sample, resolution = (_SAMPLE_MILLIS, 1000.0) if flags & FLAG_MILLIS else (_SAMPLE, 10.0)
+    end = offset + count * sample.size
+    if len(payload) < end:
+        raise PayloadError(f"Binary batch announces {count} samples but is {len(payload)} bytes")
+    batch["samples"] = [
+        {"ts": base + ticks / resolution, "temperature": temperature / 100.0, "humidity": humidity / 100.0}
+        for ticks, temperature, humidity in sample.iter_unpack(memoryview(payload)[offset:end])
+    ]
+    return batch
+
+
+def decode_payload(payload) -> Dict:
+    """
+    Decode a measurement payload, binary or JSON
+
+    The format is told apart by the first byte, so every device can pick its
+    own encoding on any topic.
+
+    Returns:
+        Dict: the decoded fields
+    """
+    if not payload:
+        raise PayloadError("Empty payload")
+    if payload[0] in _JSON_START:
+        try:
+            data = json.loads(payload)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise PayloadError(f"Invalid JSON payload: {e}")
+        if not isinstance(data, dict):
+            raise PayloadError("JSON payload is not an object")
+        return data
+    return decode_binary(payload)
@@ -21,3 +21,5 @@ SERVER_PORT = 88
 # Webhook Configuration
 WEBHOOK_PATH = "/telegram"
 TELEGRAM_BLUE_PRINTS = "/api/webhook"
+# Updates handled at the same time on the Telegram event loop
+TELEGRAM_CONCURRENT_UPDATES = 16
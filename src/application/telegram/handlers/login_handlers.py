@@ -2,7 +2,6 @@ from telegram import Update
 from telegram.ext import ContextTypes, CommandHandler
 from datetime import datetime
 import re
-from flask import current_app
 
 # Dizionario per tenere traccia degli utenti loggati
 # telegram_id -> user_id
@@ -32,8 +31,8 @@ async def login_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         username, password = match.groups()
 
         # Cerca l'utente nel database
-        db_service = current_app.config["DB_SERVICE"]
-        users = db_service.query_drs(
+        db_service = context.bot_data["ASYNC_DB_SERVICE"]
+        users = await db_service.query_drs(
             "user", {"profile.username": username, "profile.password": password}
         )
 
@@ -45,14 +44,17 @@ async def login_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         current_data = user["data"].copy()  # Copia i dati attuali
         current_data["last_login"] = datetime.utcnow()  # Aggiorna solo last_login
+        # Persist the chat, so ingest workers in other processes can notify the user
+        current_data["telegram_id"] = telegram_id
 
-        db_service.update_dr(
+        await db_service.update_dr(
             "user",
             user["_id"],
             {
                 "data": current_data,  # Usa i dati aggiornati
                 "metadata": {"updated_at": datetime.utcnow()},
             },
+            profile="control",
         )
 
         # Salva l'utente come loggato
@@ -83,7 +85,10 @@ async def logout_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
 
         # Rimuovi l'utente dai loggati
-        del logged_users[telegram_id]
+        user_id = logged_users.pop(telegram_id)
+        await context.bot_data["ASYNC_DB_SERVICE"].update_dr_fields(
+            "user", user_id, {"data.telegram_id": None}, profile="control"
+        )
         await update.message.reply_text("Logout executed!")
 
     except Exception as e:
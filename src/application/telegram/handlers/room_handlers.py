@@ -2,7 +2,6 @@ from telegram import Update
 from telegram.ext import ContextTypes, CommandHandler
 from datetime import datetime
 import re
-from flask import current_app
 from src.application.telegram.handlers.login_handlers import (
     check_auth,
     logged_users,
@@ -12,7 +11,7 @@ async def list_rooms(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler to list all the rooms assigned to the user"""
     telegram_id = update.effective_user.id
     user_id = logged_users[telegram_id]
-    user = current_app.config["DB_SERVICE"].get_dr("user", user_id)
+    user = await context.bot_data["ASYNC_DB_SERVICE"].get_dr("user", user_id)
     if not user:
         await update.message.reply_text("User not found")
         return
@@ -27,7 +26,7 @@ async def get_room_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler to get the status of a room"""
     telegram_id = update.effective_user.id
     user_id = logged_users[telegram_id]
-    user = current_app.config["DB_SERVICE"].get_dr("user", user_id)
+    user = await context.bot_data["ASYNC_DB_SERVICE"].get_dr("user", user_id)
     if not user:
         await update.message.reply_text("User not found")
         return
@@ -35,8 +34,9 @@ async def get_room_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not assigned_rooms:
         await update.message.reply_text("No rooms assigned to the user")
         return
+    rooms = await context.bot_data["ASYNC_DB_SERVICE"].get_drs("room", assigned_rooms)
     for room_id in assigned_rooms:
-        room = current_app.config["DB_SERVICE"].get_dr("room", room_id)
+        room = rooms.get(room_id)
         if room:
             await update.message.reply_text(f"Room {room_id}")
             await update.message.reply_text(f"Name: {room['profile']['name']}, Floor: {room['profile']['floor']}, Room number: {room['profile']['room_number']}")
@@ -2,7 +2,6 @@ from telegram import Update
 from telegram.ext import ContextTypes, CommandHandler
 from datetime import datetime
 import re
-from flask import current_app
 from src.application.telegram.handlers.login_handlers import (
     check_auth,
     logged_users,
@@ -35,21 +34,20 @@ async def ventilation_on_handler(update: Update, context: ContextTypes.DEFAULT_T
         ventilation_id = match.group(1)
 
         # Verify ownership
-        db_service = current_app.config["DB_SERVICE"]
-        user = db_service.get_dr("user", logged_users[telegram_id])
+        db_service = context.bot_data["ASYNC_DB_SERVICE"]
+        user = await db_service.get_dr("user", logged_users[telegram_id])
 
         devices_list = []
-        for room_id in user["data"]["assigned_rooms"]:
-            room = db_service.get_dr("room", room_id)
-            if "devices" in room["data"]:
-                devices_list.extend(room["data"]["devices"])
+        rooms = await db_service.get_drs("room", user["data"]["assigned_rooms"], projection=["data.devices"])
+        for room in rooms.values():
+            devices_list.extend(room.get("data", {}).get("devices", []))
 
         if ventilation_id not in devices_list:
             await update.message.reply_text("You don't own this Device!")
             return
 
         # Get status
-        ventilation = db_service.get_dr("ventilation", ventilation_id)
+        ventilation = await db_service.get_dr("ventilation", ventilation_id)
         if not ventilation:
             await update.message.reply_text("Ventilation Device not found!")
             return
@@ -60,15 +58,20 @@ async def ventilation_on_handler(update: Update, context: ContextTypes.DEFAULT_T
             "data": {
                 "state": "on",
                 "controlled_by": f"telegram_{telegram_id}",
-                "measurements": ventilation["data"]["measurements"]
-                + [{"type": "state_change", "value": 1.0, "timestamp": current_time}],
             },
             "metadata": {"updated_at": current_time, "last_state_change": current_time},
         }
 
-        db_service.update_dr("ventilation", ventilation_id, update_data)
-        if current_app.mqtt_ventilation_handler.is_connected:
-            current_app.mqtt_ventilation_handler.publish_ventilation_state(ventilation_id, "on")
+        await db_service.update_dr("ventilation", ventilation_id, update_data, profile="control")
+        await db_service.append_measurement(
+            "ventilation",
+            ventilation_id,
+            {"type": "state_change", "value": 1.0, "timestamp": current_time},
+            profile="control",
+        )
+        mqtt_handler = context.bot_data["MQTT_VENTILATION_HANDLER"]
+        if mqtt_handler.is_connected:
+            mqtt_handler.publish_ventilation_state(ventilation_id, "on")
             await update.message.reply_text(f"Device {ventilation_id} turned ON!")
 
     except Exception as e:
@@ -101,21 +104,20 @@ async def ventilation_off_handler(update: Update, context: ContextTypes.DEFAULT_
         ventilation_id = match.group(1)
 
         # Verify ownership
-        db_service = current_app.config["DB_SERVICE"]
-        user = db_service.get_dr("user", logged_users[telegram_id])
+        db_service = context.bot_data["ASYNC_DB_SERVICE"]
+        user = await db_service.get_dr("user", logged_users[telegram_id])
 
         devices_list = []
-        for room_id in user["data"]["assigned_rooms"]:
-            room = db_service.get_dr("room", room_id)
-            if "devices" in room["data"]:
-                devices_list.extend(room["data"]["devices"])
+        rooms = await db_service.get_drs("room", user["data"]["assigned_rooms"], projection=["data.devices"])
+        for room in rooms.values():
+            devices_list.extend(room.get("data", {}).get("devices", []))
 
         if ventilation_id not in devices_list:
             await update.message.reply_text("You don't own this Device!")
             return
 
         # Get status
-        ventilation = db_service.get_dr("ventilation", ventilation_id)
+        ventilation = await db_service.get_dr("ventilation", ventilation_id)
         if not ventilation:
             await update.message.reply_text("Ventilation Device not found!")
             return
@@ -126,15 +128,20 @@ async def ventilation_off_handler(update: Update, context: ContextTypes.DEFAULT_
             "data": {
                 "state": "off",
                 "controlled_by": f"telegram_{telegram_id}",
-                "measurements": ventilation["data"]["measurements"]
-                + [{"type": "state_change", "value": 0.0, "timestamp": current_time}],
             },
             "metadata": {"updated_at": current_time, "last_state_change": current_time},
         }
 
-        db_service.update_dr("ventilation", ventilation_id, update_data)
-        if current_app.mqtt_ventilation_handler.is_connected:
-            current_app.mqtt_ventilation_handler.publish_ventilation_state(ventilation_id, "off")
+        await db_service.update_dr("ventilation", ventilation_id, update_data, profile="control")
+        await db_service.append_measurement(
+            "ventilation",
+            ventilation_id,
+            {"type": "state_change", "value": 0.0, "timestamp": current_time},
+            profile="control",
+        )
+        mqtt_handler = context.bot_data["MQTT_VENTILATION_HANDLER"]
+        if mqtt_handler.is_connected:
+            mqtt_handler.publish_ventilation_state(ventilation_id, "off")
             await update.message.reply_text(f"Device {ventilation_id} turned ON!")
 
     except Exception as e:
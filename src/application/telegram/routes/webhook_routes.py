@@ -1,3 +1,5 @@
+import asyncio
+
 from flask import Blueprint, request, jsonify, current_app
 from telegram import Update
 from src.application.telegram.config.settings import TELEGRAM_BLUE_PRINTS
@@ -22,7 +24,9 @@ def telegram_webhook():
     """Webhook endpoint for receiving updates from Telegram"""
     if request.method == "POST":
         update = Update.de_json(request.get_json(), application.bot)
-        application.loop.run_until_complete(application.process_update(update))
+        # The update fetcher on the Telegram event loop thread runs the
+        # handlers, several updates at once, the request only queues it
+        asyncio.run_coroutine_threadsafe(application.update_queue.put(update), application.loop).result(timeout=5)
     return "OK"
 
 
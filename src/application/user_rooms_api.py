@@ -38,7 +38,7 @@ def register_user():
         user = dr_factory.create_dr("user", initial_data)
 
         # Salva nel database
-        user_id = current_app.config["DB_SERVICE"].save_dr("user", user)
+        user_id = current_app.config["DB_SERVICE"].save_dr("user", user, profile="control")
 
         return (
             jsonify(
@@ -103,6 +103,7 @@ def assign_user(user_id, room_id):
                     "data": {"assigned_rooms": assigned_rooms},
                     "metadata": {"updated_at": datetime.utcnow()},
                 },
+                profile="control",
             )
         
         # Assign the user to the room
@@ -116,7 +117,7 @@ def assign_user(user_id, room_id):
                 "data": {"user": room['data']['user']},
                 "metadata": {"updated_at": datetime.utcnow()}
             }
-            current_app.config['DB_SERVICE'].update_dr("room", room_id, room_update)
+            current_app.config['DB_SERVICE'].update_dr("room", room_id, room_update, profile="control")
 
         return (
             jsonify(
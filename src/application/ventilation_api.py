@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify, current_app
 from datetime import datetime
 import json
 from src.virtualization.digital_replica.dr_factory import DRFactory
+from src.application.pagination import page_args
 
 ventilation_api = Blueprint("ventilation_api", __name__, url_prefix="/api/ventilation")
 
@@ -39,7 +40,7 @@ def create_device():
         ventilation = dr_factory.create_dr("ventilation", initial_data)
 
         # Save to database
-        ventilation_id = current_app.config["DB_SERVICE"].save_dr("ventilation", ventilation)
+        ventilation_id = current_app.config["DB_SERVICE"].save_dr("ventilation", ventilation, profile="control")
 
         # Add the device to rooms -> devices
         room_id = data["room_id"]
@@ -49,7 +50,7 @@ def create_device():
         if "devices" not in room["data"]:
             room["data"]["devices"] = []
         room["data"]["devices"].append(ventilation_id)
-        current_app.config["DB_SERVICE"].update_dr("room", room_id, room)
+        current_app.config["DB_SERVICE"].update_dr("room", room_id, room, profile="control")
 
         return (
             jsonify(
@@ -80,7 +81,7 @@ def get_device(ventilation_id):
 
 @ventilation_api.route("/", methods=["GET"])
 def list_devices():
-    """List all Ventilation Devices with optional filtering"""
+    """List Ventilation Devices with optional filtering, keyset paginated with limit and after"""
     try:
         filters = {}
         if request.args.get("status"):
@@ -88,8 +89,14 @@ def list_devices():
         if request.args.get("state"):
             filters["data.state"] = request.args.get("state")
 
-        devices = current_app.config["DB_SERVICE"].query_drs("ventilation", filters)
-        return jsonify({"devices": devices}), 200
+        limit, after = page_args(request.args)
+        devices, next_after = current_app.config["DB_SERVICE"].page_drs(
+            "ventilation", filters, projection={"data.measurements": 0},
+            limit=limit, after=after, profile="dashboard",
+        )
+        return jsonify({"devices": devices, "next_after": next_after}), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -128,7 +135,6 @@ def toggle_ventilation(ventilation_id):
             "data": {
                 "state": new_state,
                 "controlled_by": controlled_by,
-                "measurements": ventilation["data"]["measurements"] + [measurement],
             },
             "metadata": {
                 "updated_at": datetime.utcnow(),
@@ -137,7 +143,8 @@ def toggle_ventilation(ventilation_id):
         }
 
         # Update in database
-        current_app.config["DB_SERVICE"].update_dr("ventilation", ventilation_id, update_data)
+        current_app.config["DB_SERVICE"].update_dr("ventilation", ventilation_id, update_data, profile="control")
+        current_app.config["DB_SERVICE"].append_measurement("ventilation", ventilation_id, measurement, profile="control")
 
         # Publish state change to MQTT if handler exists
         if (
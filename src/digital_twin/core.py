@@ -1,6 +1,16 @@
 from typing import Dict, List, Type, Any
 from src.services.base import BaseService
+from src.services.metrics import METRICS
 from datetime import datetime
+import time
+
+
+SERVICE_SECONDS = METRICS.histogram(
+    "dt_service_seconds", "Duration of Digital Twin service executions", ["service"]
+)
+SERVICE_ERRORS = METRICS.counter(
+    "dt_service_errors_total", "Digital Twin service executions that raised", ["service"]
+)
 
 
 class DigitalTwin:
@@ -34,8 +44,17 @@ class DigitalTwin:
         """Get all DT data including DRs"""
         return {"digital_replicas": self.digital_replicas}
 
-    def execute_service(self, service_name: str, **kwargs):
-        """Execute a named service with parameters"""
+    def execute_service(self, service_name: str, unit_of_work=None, **kwargs):
+        """
+        Execute a named service with parameters
+
+        Args:
+            service_name: Name of an active service
+            unit_of_work: Optional UnitOfWork of the current request or
+                message, handed to the service as data['unit_of_work'] so
+                that documents are loaded once and written together
+            kwargs: Service parameters
+        """
         if service_name not in self.active_services:
             raise ValueError(f"Service {service_name} not found")
 
@@ -43,9 +62,18 @@ class DigitalTwin:
 
         # Prepare data for service
         data = {"digital_replicas": self.digital_replicas}
+        if unit_of_work is not None:
+            data["unit_of_work"] = unit_of_work
 
         # Execute service with data and additional parameters
-        return service.execute(data, **kwargs)
+        started = time.perf_counter()
+        try:
+            return service.execute(data, **kwargs)
+        except Exception:
+            SERVICE_ERRORS.labels(service_name).inc()
+            raise
+        finally:
+            SERVICE_SECONDS.labels(service_name).observe(time.perf_counter() - started)
 
     # def execute_service_on_dr(self, service_name: str, dr: Any) -> Any:
     #     """
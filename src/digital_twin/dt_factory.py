@@ -1,9 +1,25 @@
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 from datetime import datetime
+from functools import lru_cache
 from bson import ObjectId
-from src.services.database_service import DatabaseService
+import logging
+from src.services.database_service import CURSOR_BATCH_SIZE, DatabaseService, Projection, keyset_page
 from src.virtualization.digital_replica.schema_registry import SchemaRegistry
 from src.digital_twin.core import DigitalTwin
+from src.digital_twin.twin_registry import TwinRegistry
+
+
+logger = logging.getLogger(__name__)
+
+# Cache settings key of the Digital Twin documents, see DatabaseService.cache_config
+DT_CACHE_KIND = "digital_twin"
+
+
+@lru_cache(maxsize=None)
+def _load_service_class(module_name: str, service_name: str):
+    """Import a service class once per process"""
+    service_module = __import__(module_name, fromlist=[service_name])
+    return getattr(service_module, service_name)
 
 
 class DTFactory:
@@ -12,6 +28,7 @@ class DTFactory:
     def __init__(self, db_service: DatabaseService, schema_registry: SchemaRegistry):
         self.db_service = db_service
         self.schema_registry = schema_registry
+        self.twin_registry = TwinRegistry()
         self._init_dt_collection()
 
     def create_dt(self, name: str, longitude: float, latitude: float, description: str = "") -> str:
@@ -72,6 +89,8 @@ class DTFactory:
                     "$set": {"metadata.updated_at": datetime.utcnow()},
                 },
             )
+            self.twin_registry.invalidate(dt_id)
+            self.db_service.invalidate_cached(DT_CACHE_KIND, dt_id)
         except Exception as e:
             raise Exception(f"Failed to add Digital Replica: {str(e)}")
 
@@ -112,8 +131,7 @@ class DTFactory:
             module_name = module_mapping[service_name]
 
             try:
-                service_module = __import__(module_name, fromlist=[service_name])
-                service_class = getattr(service_module, service_name)
+                service_class = _load_service_class(module_name, service_name)
 
                 # Verifica che il servizio esista prima di aggiungerlo
                 service = service_class()
@@ -132,6 +150,8 @@ class DTFactory:
                         "$set": {"metadata.updated_at": datetime.utcnow()},
                     },
                 )
+                self.twin_registry.invalidate(dt_id)
+                self.db_service.invalidate_cached(DT_CACHE_KIND, dt_id)
             except (ImportError, AttributeError) as e:
                 raise ValueError(
                     f"Failed to load service {service_name} from module {module_name}: {str(e)}"
@@ -152,7 +172,7 @@ class DTFactory:
         """
         try:
             dt_collection = self.db_service.db["digital_twins"]
-            return dt_collection.find_one({"_id": dt_id})
+            return self.db_service.cached_find_one(DT_CACHE_KIND, dt_collection, dt_id)
         except Exception as e:
             raise Exception(f"Failed to get Digital Twin: {str(e)}")
 
@@ -172,19 +192,71 @@ class DTFactory:
     #     except Exception as e:
     #         raise Exception(f"Failed to get Digital Twin: {str(e)}")
 
-    def list_dts(self) -> List[Dict]:
+    def list_dts(self, projection: Projection = None) -> List[Dict]:
         """
         List all Digital Twins
 
+        Args:
+            projection: Optional fields to return or, as a dict, to leave out
+
         Returns:
             List[Dict]: List of Digital Twins
         """
         try:
             dt_collection = self.db_service.db["digital_twins"]
-            return list(dt_collection.find())
+            return list(dt_collection.find({}, projection))
         except Exception as e:
             raise Exception(f"Failed to list Digital Twins: {str(e)}")
 
+    def iter_dts(
+        self,
+        query: Optional[Dict] = None,
+        projection: Projection = None,
+        batch_size: int = CURSOR_BATCH_SIZE,
+    ) -> Iterator[Dict]:
+        """
+        Stream the Digital Twins matching a query, one cursor batch at a time
+
+        Args:
+            query: Optional filter
+            projection: Optional fields to return or, as a dict, to leave out
+            batch_size: Documents fetched per round trip
+
+        Yields:
+            Dict: The matching Digital Twins
+        """
+        try:
+            dt_collection = self.db_service.db["digital_twins"]
+            with dt_collection.find(query or {}, projection, batch_size=batch_size) as cursor:
+                yield from cursor
+        except Exception as e:
+            raise Exception(f"Failed to iterate Digital Twins: {str(e)}")
+
+    def page_dts(
+        self,
+        query: Optional[Dict] = None,
+        projection: Projection = None,
+        limit: int = 100,
+        after: Optional[str] = None,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Read one keyset page of the Digital Twins matching a query
+
+        Args:
+            query: Optional filter
+            projection: Optional fields to return or, as a dict, to leave out
+            limit: Maximum Digital Twins in the page
+            after: ID of the last Digital Twin of the previous page
+
+        Returns:
+            Tuple of the Digital Twins and the cursor for the next page, None
+            on the last page
+        """
+        try:
+            return keyset_page(self.db_service.db["digital_twins"], query, projection, limit, after)
+        except Exception as e:
+            raise Exception(f"Failed to page Digital Twins: {str(e)}")
+
     # def update_dt(self, dt_id: str, update_data: Dict) -> None:
     #     """
     #     Update a Digital Twin
@@ -299,72 +371,67 @@ class DTFactory:
         except Exception as e:
             raise Exception(f"Failed to initialize DT collection: {str(e)}")
 
+    def _create_instance(self, dt_data: dict) -> DigitalTwin:
+        """Create the bare DigitalTwin instance, subclasses add their own values"""
+        return DigitalTwin()
+
     def create_dt_from_data(self, dt_data: dict) -> DigitalTwin:
         """
-        Create a DigitalTwin instance from database data with enhanced debugging
+        Create a DigitalTwin instance from database data
         """
-        print("\n=== Creating DT Instance ===")
+        logger.debug(f"Creating DT instance for {dt_data.get('name', 'unnamed')}")
         try:
             # Create new DT instance
-            dt = DigitalTwin()
-            print(f"Created new DT instance for {dt_data.get('name', 'unnamed')}")
+            dt = self._create_instance(dt_data)
 
-            # Add Digital Replicas
-            for dr_ref in dt_data.get("digital_replicas", []):
-                dr = self.db_service.get_dr(dr_ref["type"], dr_ref["id"])
+            # Add Digital Replicas, read with one query per type
+            dr_refs = dt_data.get("digital_replicas", [])
+            drs = {
+                dr_type: self.db_service.get_drs(
+                    dr_type, [ref["id"] for ref in dr_refs if ref["type"] == dr_type]
+                )
+                for dr_type in {ref["type"] for ref in dr_refs}
+            }
+            for dr_ref in dr_refs:
+                dr = drs[dr_ref["type"]].get(dr_ref["id"])
                 if dr:
                     dt.add_digital_replica(dr)
-                    print(f"Added DR: {dr_ref['type']} - {dr_ref['id']}")
 
             # Add Services
-            print("\nLoading services...")
             service_mapping = self._get_service_module_mapping()
-            print(f"Service mapping: {service_mapping}")
 
             for service_data in dt_data.get("services", []):
                 service_name = service_data["name"]
-                print(f"\nProcessing service: {service_name}")
 
                 if service_name in service_mapping:
                     try:
-                        module_name = service_mapping[service_name]
-                        print(f"Loading module: {module_name}")
-
-                        service_module = __import__(
-                            module_name, fromlist=[service_name]
+                        service_class = _load_service_class(
+                            service_mapping[service_name], service_name
                         )
-                        print(f"Module loaded successfully")
-
-                        service_class = getattr(service_module, service_name)
-                        print(f"Got service class: {service_class}")
-
                         service = service_class()
-                        print(f"Service instance created")
 
                         if hasattr(service, "configure") and "config" in service_data:
                             service.configure(service_data["config"])
-                            print(f"Service configured with: {service_data['config']}")
 
                         dt.add_service(service)
-                        print(f"Service added to DT")
-                        print(f"Current DT services: {dt.list_services()}")
                     except Exception as e:
-                        print(f"Error adding service {service_name}: {str(e)}")
-                        print(f"Exception type: {type(e)}")
+                        logger.error(f"Error adding service {service_name}: {str(e)}")
                 else:
-                    print(f"Warning: Service {service_name} not found in mapping")
+                    logger.warning(f"Service {service_name} not found in mapping")
 
+            logger.debug(f"DT services: {dt.list_services()}")
             return dt
 
         except Exception as e:
-            print(f"Error creating DT: {str(e)}")
-            print(f"Exception type: {type(e)}")
             raise Exception(f"Failed to create DT from data: {str(e)}")
 
     def get_dt_instance(self, dt_id: str) -> Optional[DigitalTwin]:
         """
         Get a fully initialized DigitalTwin instance by ID
 
+        Instances are kept alive in the twin registry and only rebuilt after
+        the factory changed the Digital Twin.
+
         Args:
             dt_id: Digital Twin ID
 
@@ -372,14 +439,16 @@ class DTFactory:
             Optional[DigitalTwin]: Digital Twin instance if found, None otherwise
         """
         try:
-            # Get DT data from database
-            dt_data = self.get_dt(dt_id)
-            if not dt_data:
-                return None
-
-            # Create and return DT instance
-            return self.create_dt_from_data(dt_data)
-
+            return self.twin_registry.get(dt_id, lambda: self._build_dt_instance(dt_id))
         except Exception as e:
             raise Exception(f"Failed to get DT instance: {str(e)}")
-        
+
+    def _build_dt_instance(self, dt_id: str) -> Optional[DigitalTwin]:
+        """Load a Digital Twin from the database and create its instance"""
+        # Get DT data from database
+        dt_data = self.get_dt(dt_id)
+        if not dt_data:
+            return None
+
+        # Create and return DT instance
+        return self.create_dt_from_data(dt_data)
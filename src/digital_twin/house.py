@@ -2,7 +2,7 @@ from typing import Dict, List, Type, Any
 from src.services.base import BaseService
 from datetime import datetime
 from src.digital_twin.core import DigitalTwin
-import math
+from src.services.psychrometrics import absolute_humidity
 
 class HouseTwin(DigitalTwin):
     def __init__(self):
@@ -24,26 +24,16 @@ class HouseTwin(DigitalTwin):
         self.relative_humidity = relative_humidity
 
     def calculate_absolute_humidity(self):
-        relative_humidity = self.relative_humidity
-        temperature = self.temperature
+        self.absolute_humidity = absolute_humidity(self.temperature, self.relative_humidity)
 
-        # Calculate absolute humidity
-        # Constants
-        A = 6.11
-        B = 17.67
-        C = 243.5
-        D = 2.1674
-
-        # Saturation vapor pressure (in hPa)
-        saturation_vapor_pressure = A * math.exp((B * temperature) / (C + temperature))
-
-        # Actual vapor pressure (in hPa)
-        actual_vapor_pressure = saturation_vapor_pressure * (relative_humidity / 100.0)
+    def add_rooms(self, rooms: List):
+        self.rooms = rooms
 
-        # Absolute humidity (in g/m³)
-        absolute_humidity = (D * actual_vapor_pressure) / (273.15 + temperature)
+    def add_weather_updated_at(self, weather_updated_at: datetime):
+        self.weather_updated_at = weather_updated_at
 
-        self.absolute_humidity = absolute_humidity
-    
-    def add_rooms(self, rooms: List):
-        self.rooms = rooms
\ No newline at end of file
+    def weather_age(self):
+        """Seconds since the outdoor values were fetched, None if never"""
+        if getattr(self, "weather_updated_at", None) is None:
+            return None
+        return (datetime.utcnow() - self.weather_updated_at).total_seconds()
\ No newline at end of file
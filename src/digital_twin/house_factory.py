@@ -1,11 +1,13 @@
-from src.digital_twin.dt_factory import DTFactory
+from src.digital_twin.dt_factory import DTFactory, DT_CACHE_KIND
 from typing import Dict, List, Optional
 from datetime import datetime
 from bson import ObjectId
+from pymongo import UpdateOne
 from src.services.database_service import DatabaseService
 from src.virtualization.digital_replica.schema_registry import SchemaRegistry
 from src.digital_twin.core import DigitalTwin
 from src.digital_twin.house import HouseTwin
+from src.services.psychrometrics import absolute_humidity_array
 
 class HouseFactory(DTFactory):
     def __init__(self, db_service: DatabaseService, schema_registry: SchemaRegistry):
@@ -86,6 +88,8 @@ class HouseFactory(DTFactory):
                     "$set": {"metadata.updated_at": datetime.utcnow()},
                 },
             )
+            self.twin_registry.invalidate(dt_id)
+            self.db_service.invalidate_cached(DT_CACHE_KIND, dt_id)
         except Exception as e:
             raise Exception(f"Failed to add Room: {str(e)}")
         
@@ -113,124 +117,98 @@ class HouseFactory(DTFactory):
                     }
                 }
             )
+            self.twin_registry.invalidate(dt_id)
+            self.db_service.invalidate_cached(DT_CACHE_KIND, dt_id)
         except Exception as e:
             raise Exception(f"Failed to remove Room: {str(e)}")
 
-    def create_dt_from_data(self, dt_data: dict) -> DigitalTwin:
+    def _create_instance(self, dt_data: dict) -> DigitalTwin:
+        """Create a HouseTwin instance carrying the house values"""
+        dt = HouseTwin()
+
+        # Add Values
+        dt.add_longitude(dt_data.get("longitude"))
+        dt.add_latitude(dt_data.get("latitude"))
+        dt.add_temperature(dt_data.get("temperature"))
+        dt.add_relative_humidity(dt_data.get("relative_humidity"))
+        dt.absolute_humidity = dt_data.get("absolute_humidity")
+        dt.add_rooms(dt_data.get("rooms", []))
+        dt.add_weather_updated_at(dt_data.get("weather_updated_at"))
+        return dt
+
+    def update_temperature_humidity(self, dt_id: str, temperature: float, relative_humidity: float, absolute_humidity: float, weather_updated_at: Optional[datetime] = None) -> None:
         """
-        Create a DigitalTwin instance from database data with enhanced debugging
-        """
-        print("\n=== Creating DT Instance ===")
-        try:
-            # Create new DT instance
-            dt = HouseTwin()
-            print(f"Created new DT instance for {dt_data.get('name', 'unnamed')}")
-
-            # Add Values
-            dt.add_longitude(dt_data.get("longitude"))
-            dt.add_latitude(dt_data.get("latitude"))
-            dt.add_temperature(dt_data.get("temperature"))
-            dt.add_relative_humidity(dt_data.get("relative_humidity"))
-            #dt.calculate_absolute_humidity()
-            dt.add_rooms(dt_data.get("rooms", []))
-
-            # Add Digital Replicas
-            for dr_ref in dt_data.get("digital_replicas", []):
-                dr = self.db_service.get_dr(dr_ref["type"], dr_ref["id"])
-                if dr:
-                    dt.add_digital_replica(dr)
-                    print(f"Added DR: {dr_ref['type']} - {dr_ref['id']}")
-
-            # Add Services
-            print("\nLoading services...")
-            service_mapping = self._get_service_module_mapping()
-            print(f"Service mapping: {service_mapping}")
-
-            for service_data in dt_data.get("services", []):
-                service_name = service_data["name"]
-                print(f"\nProcessing service: {service_name}")
-
-                if service_name in service_mapping:
-                    try:
-                        module_name = service_mapping[service_name]
-                        print(f"Loading module: {module_name}")
-
-                        service_module = __import__(
-                            module_name, fromlist=[service_name]
-                        )
-                        print(f"Module loaded successfully")
-
-                        service_class = getattr(service_module, service_name)
-                        print(f"Got service class: {service_class}")
-
-                        service = service_class()
-                        print(f"Service instance created")
-
-                        if hasattr(service, "configure") and "config" in service_data:
-                            service.configure(service_data["config"])
-                            print(f"Service configured with: {service_data['config']}")
-
-                        dt.add_service(service)
-                        print(f"Service added to DT")
-                        print(f"Current DT services: {dt.list_services()}")
-                    except Exception as e:
-                        print(f"Error adding service {service_name}: {str(e)}")
-                        print(f"Exception type: {type(e)}")
-                else:
-                    print(f"Warning: Service {service_name} not found in mapping")
-
-            return dt
-
-        except Exception as e:
-            print(f"Error creating DT: {str(e)}")
-            print(f"Exception type: {type(e)}")
-            raise Exception(f"Failed to create DT from data: {str(e)}")
-
-    def get_dt_instance(self, dt_id: str) -> Optional[DigitalTwin]:
-        """
-        Get a fully initialized DigitalTwin instance by ID
+        Update temperature and humidity values for a Digital Twin
 
         Args:
             dt_id: Digital Twin ID
-
-        Returns:
-            Optional[DigitalTwin]: Digital Twin instance if found, None otherwise
+            temperature: Temperature value
+            relative_humidity: Relative humidity value
+            absolute_humidity: Absolute humidity value
+            weather_updated_at: Optional time the values were fetched
         """
-        try:
-            # Get DT data from database
-            dt_data = self.get_dt(dt_id)
-            if not dt_data:
-                return None
-
-            # Create and return DT instance
-            return self.create_dt_from_data(dt_data)
+        values = {
+            "temperature": temperature,
+            "relative_humidity": relative_humidity,
+            "absolute_humidity": absolute_humidity,
+        }
+        if weather_updated_at is not None:
+            values["weather_updated_at"] = weather_updated_at
+        self.update_temperature_humidity_many({dt_id: values})
 
-        except Exception as e:
-            raise Exception(f"Failed to get DT instance: {str(e)}")
-        
-    def update_temperature_humidity(self, dt_id: str, temperature: float, relative_humidity: float, absolute_humidity: float) -> None:
+    def update_temperature_humidity_many(self, values: Dict[str, Dict]) -> None:
         """
-        Update temperature and humidity values for a Digital Twin
+        Update temperature and humidity values of many Digital Twins in one bulk write
 
         Args:
-            dt_id: Digital Twin ID
-            temperature: Temperature value
-            relative_humidity: Relative humidity value
-            absolute_humidity: Absolute humidity value
+            values: Mapping of Digital Twin ID to a dict with temperature,
+                relative_humidity, absolute_humidity and optionally
+                weather_updated_at
         """
         try:
+            if not values:
+                return
             dt_collection = self.db_service.db["digital_twins"]
-
-            dt_collection.update_one(
-                {"_id": dt_id},
-                {
-                    "$set": {
-                        "temperature": temperature,
-                        "relative_humidity": relative_humidity,
-                        "absolute_humidity": absolute_humidity,
-                        "metadata.updated_at": datetime.utcnow(),
-                    }
-                }
+            now = datetime.utcnow()
+
+            dt_collection.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": dt_id},
+                        {"$set": {**house_values, "metadata.updated_at": now}},
+                    )
+                    for dt_id, house_values in values.items()
+                ],
+                ordered=False,
             )
+            # Only plain values changed, refresh the live instances in place
+            for dt_id, house_values in values.items():
+                self.twin_registry.update(dt_id, **house_values)
+                self.db_service.invalidate_cached(DT_CACHE_KIND, dt_id)
         except Exception as e:
-            raise Exception(f"Failed to update temperature and humidity: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Failed to update temperature and humidity: {str(e)}")
+
+    def apply_weather(self, updates: List) -> None:
+        """
+        WeatherCache listener storing refreshed outdoor values on the houses
+
+        Args:
+            updates: List of (location, weather, house_ids) with the cache
+                entry (temperature, humidity, fetched_at) of each location
+                and the houses registered there
+        """
+        # One vectorized evaluation for all refreshed locations
+        absolute_humidities = absolute_humidity_array(
+            [weather["temperature"] for _, weather, _ in updates],
+            [weather["humidity"] for _, weather, _ in updates],
+        )
+        values = {}
+        for (location, weather, house_ids), absolute_humidity in zip(updates, absolute_humidities.tolist()):
+            for house_id in house_ids:
+                values[house_id] = {
+                    "temperature": weather["temperature"],
+                    "relative_humidity": weather["humidity"],
+                    "absolute_humidity": absolute_humidity,
+                    "weather_updated_at": weather["fetched_at"],
+                }
+        self.update_temperature_humidity_many(values)
@@ -0,0 +1,92 @@
+import time
+from threading import Lock
+from typing import Callable, Dict, Optional
+from src.digital_twin.core import DigitalTwin
+
+
+class TwinRegistry:
+    """In-process registry of live Digital Twin instances keyed by dt_id
+
+    Instances are built once and reused until the factory invalidates them
+    after a change, or until they are older than ttl seconds (changes made by
+    other processes are picked up at the latest then).
+    """
+
+    def __init__(self, ttl: Optional[float] = 300.0):
+        self.ttl = ttl
+        self._instances: Dict[str, tuple] = {}  # dt_id -> (instance, built_at)
+        self._lock = Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "invalidations": 0,
+            "rebuild_seconds_total": 0.0,
+            "rebuild_seconds_max": 0.0,
+        }
+
+    def get(
+        self, dt_id: str, build: Callable[[], Optional[DigitalTwin]]
+    ) -> Optional[DigitalTwin]:
+        """
+        Return the live instance for dt_id, building it on a miss
+
+        Args:
+            dt_id: Digital Twin ID
+            build: Callable creating the instance, may return None
+
+        Returns:
+            Optional[DigitalTwin]: The cached or newly built instance
+        """
+        with self._lock:
+            entry = self._instances.get(dt_id)
+            if entry and (self.ttl is None or time.monotonic() - entry[1] < self.ttl):
+                self._stats["hits"] += 1
+                return entry[0]
+            self._stats["misses"] += 1
+
+        started = time.perf_counter()
+        instance = build()
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self._stats["rebuild_seconds_total"] += elapsed
+            self._stats["rebuild_seconds_max"] = max(self._stats["rebuild_seconds_max"], elapsed)
+            if instance is not None:
+                self._instances[dt_id] = (instance, time.monotonic())
+        return instance
+
+    def update(self, dt_id: str, **attributes) -> bool:
+        """
+        Refresh attributes of a live instance in place instead of rebuilding it
+
+        Returns:
+            bool: True if a live instance was updated
+        """
+        with self._lock:
+            entry = self._instances.get(dt_id)
+            if not entry:
+                return False
+            for name, value in attributes.items():
+                setattr(entry[0], name, value)
+            return True
+
+    def invalidate(self, dt_id: Optional[str] = None) -> None:
+        """Drop one live instance, or all of them if dt_id is None"""
+        with self._lock:
+            if dt_id is None:
+                self._stats["invalidations"] += len(self._instances)
+                self._instances.clear()
+            elif self._instances.pop(dt_id, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict:
+        """Snapshot of the registry counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._instances)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["rebuild_seconds_avg"] = (
+            stats["rebuild_seconds_total"] / stats["misses"] if stats["misses"] else 0.0
+        )
+        return stats
@@ -1,11 +1,9 @@
-from typing import List, Dict
-from datetime import datetime
-from .base import BaseService
-
 from typing import List, Dict, Any
 from datetime import datetime
 from .base import BaseService
-import statistics
+from .psychrometrics import absolute_humidity_array, dew_point_array
+from flask import current_app
+import numpy as np
 
 
 class AggregationService(BaseService):
@@ -29,43 +27,77 @@ class AggregationService(BaseService):
         if not drs:
             return {"error": f"No digital replicas found of type {dr_type}"}
 
-        # Collect all measurements
-        all_measurements = []
+        # Collect all measurements as (measure_type, value) columns
+        grouped_measurements = {}
         for dr in drs:
-            if 'data' in dr and 'measurements' in dr['data']:
-                measurements = dr['data']['measurements']
-                if attribute:
-                    # Filter measurements by attribute
-                    measurements = [m for m in measurements
-                                    if m['measure_type'] == attribute]
-                all_measurements.extend(measurements)
+            # Legacy embedded history plus the bucketed measurement store
+            measurements = list(dr.get('data', {}).get('measurements', []))
+            measurements.extend(
+                current_app.config["DB_SERVICE"].get_measurements(dr['type'], dr['_id'], profile="dashboard")
+            )
+            for measure_type, values in self._columns(measurements).items():
+                grouped_measurements.setdefault(measure_type, []).extend(values)
 
-        if not all_measurements:
-            return {"error": f"No measurements found for attribute {attribute}"}
+        if attribute:
+            # Filter measurements by attribute
+            grouped_measurements = {
+                measure_type: values
+                for measure_type, values in grouped_measurements.items()
+                if measure_type == attribute
+            }
 
-        # Group measurements by type
-        grouped_measurements = {}
-        for measure in all_measurements:
-            measure_type = measure['measure_type']
-            if measure_type not in grouped_measurements:
-                grouped_measurements[measure_type] = []
-            grouped_measurements[measure_type].append(float(measure['value']))
+        if not any(grouped_measurements.values()):
+            return {"error": f"No measurements found for attribute {attribute}"}
 
         # Calculate statistics for each measurement type
         stats = {}
         for measure_type, values in grouped_measurements.items():
+            values = np.asarray(values, dtype=np.float64)
+            values = values[~np.isnan(values)]
+            if values.size == 0:
+                stats[measure_type] = {'error': 'no numeric values', 'count': 0}
+                continue
+            stats[measure_type] = {
+                'count': int(values.size),
+                'mean': float(values.mean()),
+                'min': float(values.min()),
+                'max': float(values.max()),
+                'stddev': float(values.std(ddof=1)) if values.size > 1 else 0
+            }
+
+        return stats
+
+    def _columns(self, measurements: List[Dict]) -> Dict[str, List[float]]:
+        """
+        Split measurements into value columns per measure type
+
+        Single-value measurements ({'measure_type'|'type', 'value'}) go to
+        their type. Combined readings ({'temperature', 'humidity'}) fill both
+        columns and derive absolute humidity and dew point in one vectorized
+        pass.
+        """
+        columns: Dict[str, List[float]] = {}
+        temperatures, humidities = [], []
+        for m in measurements:
+            if 'temperature' in m and 'humidity' in m:
+                temperatures.append(float(m['temperature']))
+                humidities.append(float(m['humidity']))
+                continue
+            measure_type = m.get('measure_type', m.get('type'))
+            if measure_type is None or m.get('value') is None:
+                continue
             try:
-                stats[measure_type] = {
-                    'count': len(values),
-                    'mean': statistics.mean(values),
-                    'min': min(values),
-                    'max': max(values),
-                    'stddev': statistics.stdev(values) if len(values) > 1 else 0
-                }
-            except (statistics.StatisticsError, ValueError) as e:
-                stats[measure_type] = {
-                    'error': str(e),
-                    'count': len(values)
-                }
+                columns.setdefault(measure_type, []).append(float(m['value']))
+            except (TypeError, ValueError):
+                continue
 
-        return stats
\ No newline at end of file
+        if temperatures:
+            columns.setdefault('temperature', []).extend(temperatures)
+            columns.setdefault('humidity', []).extend(humidities)
+            columns.setdefault('absolute_humidity', []).extend(
+                absolute_humidity_array(temperatures, humidities).tolist()
+            )
+            columns.setdefault('dew_point', []).extend(
+                dew_point_array(temperatures, humidities).tolist()
+            )
+        return columns
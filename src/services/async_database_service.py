@@ -0,0 +1,70 @@
+import asyncio
+import functools
+import inspect
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterator
+
+from src.services.database_service import CURSOR_BATCH_SIZE, DatabaseService
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDatabaseService:
+    """Awaitable DatabaseService for code running on an asyncio event loop
+
+    Every method of the wrapped DatabaseService is available under the same
+    name and arguments, but returns a coroutine: the blocking pymongo call
+    runs on a small thread pool while the event loop serves other updates.
+    Generator methods such as iter_drs become async iterators fetching one
+    cursor batch per thread hop; wrap them in contextlib.aclosing() when
+    leaving the loop early so the cursor is closed at once. Plain
+    attributes are returned unchanged.
+
+    The thread pool should not be larger than the connection pool of the
+    client, extra threads would only wait for a connection.
+    """
+
+    def __init__(self, db_service: DatabaseService, max_workers: int = 8):
+        """
+        Args:
+            db_service: Connected DatabaseService doing the work
+            max_workers: Threads running database calls concurrently
+        """
+        self.db_service = db_service
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="async-db")
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self.db_service, name)
+        if not callable(attribute) or name.startswith("_"):
+            return attribute
+        if inspect.isgeneratorfunction(attribute):
+            return functools.partial(self._iterate, attribute)
+        return functools.partial(self.run, attribute)
+
+    async def run(self, function: Callable, *args, **kwargs) -> Any:
+        """Run a blocking callable on the database thread pool and await it"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+
+    async def _iterate(self, function: Callable, *args, **kwargs) -> AsyncIterator:
+        iterator: Iterator = await self.run(function, *args, **kwargs)
+        size = kwargs.get("batch_size") or CURSOR_BATCH_SIZE
+        try:
+            while True:
+                chunk = await self.run(lambda: list(itertools.islice(iterator, size)))
+                if not chunk:
+                    return
+                for item in chunk:
+                    yield item
+        finally:
+            # A consumer leaving early must not leak the server side cursor,
+            # closing the generator runs its cleanup (cursor.close)
+            if hasattr(iterator, "close"):
+                await self.run(iterator.close)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the thread pool, the wrapped DatabaseService stays connected"""
+        self._executor.shutdown(wait=wait)
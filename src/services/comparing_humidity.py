@@ -15,8 +15,12 @@ class HumidityComparisonService(BaseService):
         Execute the service to compare absolute humidity between a room and a house.
 
         Args:
-            data: Dictionary containing digital replicas data
-            kwargs: Must include 'room_id' and 'house_id' to analyze
+            data: Dictionary containing digital replicas data and, if the
+                caller runs one, the 'unit_of_work' the room and house are
+                looked up in
+            kwargs: Must include 'room_id' and 'house_id' to analyze,
+                may include 'room_absolute_humidity' when the caller
+                already knows the current room value
 
         Returns:
             Dict containing the comparison result
@@ -26,25 +30,32 @@ class HumidityComparisonService(BaseService):
         if not room_id or not house_id:
             raise ValueError("room_id and house_id are required")
 
-        # Get the room from digital replicas
-        room = current_app.config["DB_SERVICE"].get_dr("room", room_id)
+        unit_of_work = data.get('unit_of_work')
+        room_ah = kwargs.get('room_absolute_humidity')
+        if room_ah is None:
+            # Get the room from digital replicas
+            if unit_of_work is not None:
+                room = unit_of_work.get_dr("room", room_id, fields=["data.absolute_humidity"])
+            else:
+                room = current_app.config["DB_SERVICE"].get_dr("room", room_id)
+            if not room:
+                raise ValueError(f"Room {room_id} not found")
+            if 'absolute_humidity' not in room['data']:
+                raise ValueError("Room does not have absolute humidity data")
+            room_ah = room['data']['absolute_humidity']
 
         # Get House from dt_factory
-        house = current_app.config["DT_FACTORY"].get_dt(house_id)
-
-
-        if not room:
-            raise ValueError(f"Room {room_id} not found")
+        if unit_of_work is not None:
+            house = unit_of_work.get_dt(house_id)
+        else:
+            house = current_app.config["DT_FACTORY"].get_dt(house_id)
         if not house:
             raise ValueError(f"House {house_id} not found")
 
-        # Validate that both room and house have absolute humidity data
-        if 'absolute_humidity' not in room['data']:
-            raise ValueError("Room does not have absolute humidity data")
+        # Validate that the house has absolute humidity data
         if 'absolute_humidity' not in house:
             raise ValueError("House does not have absolute humidity data")
 
-        room_ah = room['data']['absolute_humidity']
         house_ah = house['absolute_humidity']
 
         # Calculate the difference
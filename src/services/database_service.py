@@ -1,23 +1,253 @@
-from typing import Dict, List, Optional, Any
-from pymongo import MongoClient
-from datetime import datetime
+import logging
+from threading import Lock
+from typing import Dict, Iterator, List, Optional, Any, Set, Tuple, Union
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+from pymongo.write_concern import WriteConcern
+from datetime import datetime, timedelta
 from src.virtualization.digital_replica.schema_registry import SchemaRegistry
+from src.services.document_cache import DocumentCache, project
+from src.services.storage import create_client
+
+logger = logging.getLogger(__name__)
+
+# Measurement history is kept outside of the DR documents in fixed-size buckets,
+# one bucket per (dr_type, dr_id, time window). A full bucket is rolled over
+# into a new document for the same window.
+MEASUREMENT_COLLECTION = "measurement_buckets"
+MEASUREMENT_BUCKET_SECONDS = 3600
+MEASUREMENT_BUCKET_SIZE = 500
+
+# Keys of ingested samples, used to drop redelivered and replayed readings.
+# Documents expire after INGEST_DEDUP_TTL seconds.
+INGEST_DEDUP_COLLECTION = "ingest_dedup"
+INGEST_DEDUP_TTL = 86400
+
+# Read and write behaviour per workload, selected with the profile argument
+# of the methods below. Profiles from database.yaml replace these by name;
+# without a profile the client defaults apply.
+DEFAULT_PROFILES = {
+    # High-rate measurement ingest
+    "telemetry": {"write_concern": {"w": 1, "j": False}},
+    # Users, rooms and device control
+    "control": {
+        "write_concern": {"w": "majority", "j": True, "wtimeout": 5000},
+        "read_concern": "majority",
+        "read_preference": "primary",
+    },
+    # Dashboards and history
+    "dashboard": {"read_preference": "secondaryPreferred", "read_concern": "local"},
+}
+
+# Documents fetched per round trip when streaming a cursor
+CURSOR_BATCH_SIZE = 500
+
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+
+Projection = Optional[Union[List[str], Dict[str, int]]]
+
+
+def keyset_page(
+    collection,
+    query: Optional[Dict] = None,
+    projection: Projection = None,
+    limit: int = 100,
+    after: Optional[str] = None,
+) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Read one page of a collection in _id order
+
+    The next page starts after the last _id of this one, so every page is
+    an index range scan however deep the client pages.
+
+    Args:
+        collection: pymongo collection
+        query: Optional filter
+        projection: Optional fields to return or, as a dict, to leave out
+        limit: Maximum documents in the page
+        after: _id of the last document of the previous page
+
+    Returns:
+        Tuple of the documents and the cursor for the next page, None on
+        the last page
+    """
+    query = dict(query or {})
+    if after is not None:
+        query = {"$and": [query, {"_id": {"$gt": after}}]} if query else {"_id": {"$gt": after}}
+    # One extra document tells whether another page follows
+    docs = list(collection.find(query, projection).sort("_id", ASCENDING).limit(limit + 1))
+    if len(docs) > limit:
+        docs = docs[:limit]
+        return docs, docs[-1]["_id"]
+    return docs, None
 
 
 class DatabaseService:
     def __init__(
-        self, connection_string: str, db_name: str, schema_registry: SchemaRegistry
+        self,
+        connection_string: str,
+        db_name: str,
+        schema_registry: SchemaRegistry,
+        bucket_seconds: int = MEASUREMENT_BUCKET_SECONDS,
+        bucket_size: int = MEASUREMENT_BUCKET_SIZE,
+        dedup_ttl: int = INGEST_DEDUP_TTL,
+        client_options: Optional[Dict] = None,
+        profiles: Optional[Dict[str, Dict]] = None,
+        cache_config: Optional[Dict[str, Dict]] = None,
     ):
+        """
+        Args:
+            connection_string: MongoDB connection string, or sqlite:///<path>
+                for the embedded backend (see storage.py)
+            db_name: Database name
+            schema_registry: Registry of the DR schemas
+            bucket_seconds: Time window of a measurement bucket
+            bucket_size: Maximum measurements per bucket
+            dedup_ttl: Seconds ingest keys are kept
+            client_options: MongoClient keyword arguments, e.g. maxPoolSize
+            profiles: Read/write concern profiles by name, merged over
+                DEFAULT_PROFILES
+            cache_config: Read-through cache settings by DR type (or
+                'digital_twin'), merged over the cache section of the
+                templates. None disables the cache.
+        """
         self.connection_string = connection_string
         self.db_name = db_name
         self.schema_registry = schema_registry
+        self.bucket_seconds = bucket_seconds
+        self.bucket_size = bucket_size
+        self.dedup_ttl = dedup_ttl
+        self.client_options = client_options or {}
+        self.profiles = {
+            name: self._profile_options(name, profile)
+            for name, profile in {**DEFAULT_PROFILES, **(profiles or {})}.items()
+        }
+        self._collections: Dict[Tuple[str, str], Any] = {}
+        # Filter shapes seen by query_drs, see unindexed_queries
+        self._query_shapes: Dict[Tuple[str, Tuple[str, ...]], int] = {}
+        self._query_lock = Lock()
+        self.cache_config = cache_config
+        self.cache = DocumentCache() if cache_config is not None else None
+        if self.cache is not None:
+            for kind in set(schema_registry.list_schema_types()) | set(cache_config):
+                self._cache_enabled(kind)
+        # Optional LatestStateTable holding latest values not written yet,
+        # applied over the documents read by cached_find_one and get_drs
+        self.latest_state = None
         self.client = None
         self.db = None
 
+    def _overlay_latest(self, kind: str, doc: Optional[Dict], projection: Projection = None) -> Optional[Dict]:
+        """Apply the latest values not written yet to a document read with a projection"""
+        if self.latest_state is None:
+            return doc
+        if isinstance(projection, dict):
+            included = [field for field, value in projection.items() if value and field != "_id"]
+            if included:
+                return self.latest_state.overlay(kind, doc, included)
+            return self.latest_state.overlay(kind, doc, excluded=[field for field, value in projection.items() if not value])
+        return self.latest_state.overlay(kind, doc, projection)
+
+    def _cache_enabled(self, kind: str) -> bool:
+        """Configure the cache of a kind from its template and cache_config on first use"""
+        if self.cache is None:
+            return False
+        if not self.cache.is_configured(kind):
+            settings = dict(self.schema_registry.get_cache_config(kind)) if kind in self.schema_registry.schemas else {}
+            settings.update(self.cache_config.get(kind) or {})
+            if settings:
+                self.cache.configure(kind, **settings)
+            else:
+                self.cache.configure(kind, enabled=False)
+        return self.cache.is_enabled(kind)
+
+    def cached_find_one(self, kind: str, collection, doc_id: str, fields: Optional[List[str]] = None) -> Optional[Dict]:
+        """
+        Read a document by _id through the read-through cache
+
+        Args:
+            kind: DR type or 'digital_twin', selects the cache settings
+            collection: Collection holding the document
+            doc_id: Document ID
+            fields: Optional dotted paths to return
+
+        Returns:
+            Optional[Dict]: The document, None if it does not exist
+        """
+        if not self._cache_enabled(kind):
+            return self._overlay_latest(kind, collection.find_one({"_id": doc_id}, fields), fields)
+        doc = self.cache.get(kind, doc_id, fields)
+        if doc is not None:
+            return self._overlay_latest(kind, doc, fields)
+        if not self.cache.covers(kind, fields):
+            return self._overlay_latest(kind, collection.find_one({"_id": doc_id}, fields), fields)
+        version = self.cache.version(kind)
+        doc = collection.find_one({"_id": doc_id})
+        if doc is None:
+            return None
+        self.cache.put(kind, doc, version)
+        return self._overlay_latest(kind, project(doc, fields) if fields is not None else doc, fields)
+
+    def invalidate_cached(self, kind: str, doc_id: Optional[str] = None, paths: Optional[List[str]] = None) -> None:
+        """
+        Drop a cached document after writing it
+
+        Args:
+            kind: DR type or 'digital_twin'
+            doc_id: Document written, all of the kind if None
+            paths: Dotted paths written, None for the whole document
+        """
+        if self.cache is not None:
+            self.cache.invalidate(kind, doc_id, paths)
+
+    @staticmethod
+    def _profile_options(name: str, profile: Dict) -> Dict:
+        """Turn a profile from the configuration into Collection.with_options arguments"""
+        options = {}
+        if profile.get("write_concern") is not None:
+            options["write_concern"] = WriteConcern(**profile["write_concern"])
+        if profile.get("read_concern") is not None:
+            options["read_concern"] = ReadConcern(profile["read_concern"])
+        mode = profile.get("read_preference")
+        if mode is not None:
+            if mode not in READ_PREFERENCES:
+                raise ValueError(f"Unknown read preference {mode} in database profile {name}")
+            if mode == "primary":
+                options["read_preference"] = Primary()
+            else:
+                options["read_preference"] = READ_PREFERENCES[mode](
+                    max_staleness=profile.get("max_staleness_seconds", -1)
+                )
+        return options
+
+    def _collection(self, name: str, profile: Optional[str] = None):
+        """Collection handle configured for a profile, the plain one without"""
+        if profile is None:
+            return self.db[name]
+        collection = self._collections.get((name, profile))
+        if collection is None:
+            if profile not in self.profiles:
+                raise ValueError(f"Unknown database profile: {profile}")
+            collection = self.db[name].with_options(**self.profiles[profile])
+            self._collections[(name, profile)] = collection
+        return collection
+
     def connect(self) -> None:
         try:
-            self.client = MongoClient(self.connection_string)
+            self.client = create_client(self.connection_string, **self.client_options)
+            self._collections = {}
             self.db = self.client[self.db_name]
+            self._init_measurement_collection()
+            self._init_dedup_collection()
         except Exception as e:
             raise ConnectionError(f"Failed to connect to MongoDB: {str(e)}")
 
@@ -26,11 +256,12 @@ class DatabaseService:
             self.client.close()
             self.client = None
             self.db = None
+            self._collections = {}
 
     def is_connected(self) -> bool:
         return self.client is not None and self.db is not None
 
-    def save_dr(self, dr_type: str, dr_data: Dict) -> str:
+    def save_dr(self, dr_type: str, dr_data: Dict, profile: Optional[str] = None) -> str:
         """Save a Digital Replica"""
         if not self.is_connected():
             raise ConnectionError("Not connected to MongoDB")
@@ -41,34 +272,140 @@ class DatabaseService:
             validation_schema = self.schema_registry.get_validation_schema(dr_type)
 
             # The SchemaRegistry handles ALL validation - no type-specific logic here!
-            collection = self.db[collection_name]
+            collection = self._collection(collection_name, profile)
 
             result = collection.insert_one(dr_data)
             return str(dr_data["_id"])
         except Exception as e:
             raise Exception(f"Failed to save Digital Replica: {str(e)}")
 
-    def get_dr(self, dr_type: str, dr_id: str) -> Optional[Dict]:
+    def get_dr(
+        self,
+        dr_type: str,
+        dr_id: str,
+        profile: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+    ) -> Optional[Dict]:
+        """
+        Get a Digital Replica, through the read-through cache if configured
+
+        Args:
+            dr_type: Type of Digital Replica
+            dr_id: Digital Replica ID
+            profile: Optional read/write concern profile, see DEFAULT_PROFILES
+            fields: Optional dotted paths to return; reads of cached fields
+                only are served from the cache
+
+        Returns:
+            Optional[Dict]: The Digital Replica, None if not found
+        """
         if not self.is_connected():
             raise ConnectionError("Not connected to MongoDB")
 
         try:
             collection_name = self.schema_registry.get_collection_name(dr_type)
-            return self.db[collection_name].find_one({"_id": dr_id})
+            return self.cached_find_one(dr_type, self._collection(collection_name, profile), dr_id, fields)
         except Exception as e:
             raise Exception(f"Failed to get Digital Replica: {str(e)}")
 
-    def query_drs(self, dr_type: str, query: Dict = None) -> List[Dict]:
+    def query_drs(
+        self,
+        dr_type: str,
+        query: Dict = None,
+        profile: Optional[str] = None,
+        projection: Projection = None,
+    ) -> List[Dict]:
         if not self.is_connected():
             raise ConnectionError("Not connected to MongoDB")
 
         try:
             collection_name = self.schema_registry.get_collection_name(dr_type)
-            return list(self.db[collection_name].find(query or {}))
+            self._record_query(dr_type, query)
+            return [
+                self._overlay_latest(dr_type, doc, projection)
+                for doc in self._collection(collection_name, profile).find(query or {}, projection)
+            ]
         except Exception as e:
             raise Exception(f"Failed to query Digital Replicas: {str(e)}")
 
-    def update_dr(self, dr_type: str, dr_id: str, update_data: Dict) -> None:
+    def iter_drs(
+        self,
+        dr_type: str,
+        query: Dict = None,
+        projection: Projection = None,
+        batch_size: int = CURSOR_BATCH_SIZE,
+        profile: Optional[str] = None,
+    ) -> Iterator[Dict]:
+        """
+        Stream the Digital Replicas matching a query
+
+        Unlike query_drs only one cursor batch is held in memory at a time.
+
+        Args:
+            dr_type: Type of Digital Replica
+            query: Optional filter
+            projection: Optional fields to return or, as a dict, to leave out
+            batch_size: Documents fetched per round trip
+            profile: Optional read/write concern profile, see DEFAULT_PROFILES
+
+        Yields:
+            Dict: The matching documents
+        """
+        if not self.is_connected():
+            raise ConnectionError("Not connected to MongoDB")
+
+        try:
+            collection_name = self.schema_registry.get_collection_name(dr_type)
+            self._record_query(dr_type, query)
+            cursor = self._collection(collection_name, profile).find(
+                query or {}, projection, batch_size=batch_size
+            )
+            with cursor:
+                for doc in cursor:
+                    yield self._overlay_latest(dr_type, doc, projection)
+        except Exception as e:
+            raise Exception(f"Failed to iterate Digital Replicas: {str(e)}")
+
+    def page_drs(
+        self,
+        dr_type: str,
+        query: Dict = None,
+        projection: Projection = None,
+        limit: int = 100,
+        after: Optional[str] = None,
+        profile: Optional[str] = None,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Read one keyset page of the Digital Replicas matching a query
+
+        Args:
+            dr_type: Type of Digital Replica
+            query: Optional filter
+            projection: Optional fields to return or, as a dict, to leave out
+            limit: Maximum Digital Replicas in the page
+            after: ID of the last Digital Replica of the previous page
+            profile: Optional read/write concern profile, see DEFAULT_PROFILES
+
+        Returns:
+            Tuple of the Digital Replicas and the cursor for the next page,
+            None on the last page
+        """
+        if not self.is_connected():
+            raise ConnectionError("Not connected to MongoDB")
+
+        try:
+            collection_name = self.schema_registry.get_collection_name(dr_type)
+            self._record_query(dr_type, query)
+            docs, next_after = keyset_page(
+                self._collection(collection_name, profile), query, projection, limit, after
+            )
+            for doc in docs:
+                self._overlay_latest(dr_type, doc, projection)
+            return docs, next_after
+        except Exception as e:
+            raise Exception(f"Failed to page Digital Replicas: {str(e)}")
+
+    def update_dr(self, dr_type: str, dr_id: str, update_data: Dict, profile: Optional[str] = None) -> None:
         if not self.is_connected():
             raise ConnectionError("Not connected to MongoDB")
 
@@ -81,25 +418,663 @@ class DatabaseService:
             update_data["metadata"]["updated_at"] = datetime.utcnow()
 
             # Let SchemaRegistry handle validation through MongoDB schema
-            result = self.db[collection_name].update_one(
+            result = self._collection(collection_name, profile).update_one(
                 {"_id": dr_id}, {"$set": update_data}
             )
 
+            self.invalidate_cached(dr_type, dr_id, list(update_data))
             if result.matched_count == 0:
                 raise ValueError(f"Digital Replica not found: {dr_id}")
 
         except Exception as e:
             raise Exception(f"Failed to update Digital Replica: {str(e)}")
 
-    def delete_dr(self, dr_type: str, dr_id: str) -> None:
+    def get_drs(
+        self,
+        dr_type: str,
+        dr_ids: List[str],
+        projection: Optional[List[str]] = None,
+        profile: Optional[str] = None,
+    ) -> Dict[str, Dict]:
+        """
+        Read many Digital Replicas with one query
+
+        Args:
+            dr_type: Type of Digital Replica
+            dr_ids: Digital Replica IDs, duplicates are fine
+            projection: Optional list of fields to return
+            profile: Optional read/write concern profile, see DEFAULT_PROFILES
+
+        Returns:
+            Dict[str, Dict]: Documents by ID, missing Digital Replicas are left out
+        """
+        if not self.is_connected():
+            raise ConnectionError("Not connected to MongoDB")
+
+        try:
+            dr_ids = list(dict.fromkeys(dr_ids))
+            if not dr_ids:
+                return {}
+            collection_name = self.schema_registry.get_collection_name(dr_type)
+            collection = self._collection(collection_name, profile)
+            if not self._cache_enabled(dr_type) or not self.cache.covers(dr_type, projection):
+                return {
+                    doc["_id"]: self._overlay_latest(dr_type, doc, projection)
+                    for doc in collection.find({"_id": {"$in": dr_ids}}, projection)
+                }
+
+            docs = {}
+            for dr_id in dr_ids:
+                doc = self.cache.get(dr_type, dr_id, projection)
+                if doc is not None:
+                    docs[dr_id] = doc
+            missing = [dr_id for dr_id in dr_ids if dr_id not in docs]
+            if missing:
+                version = self.cache.version(dr_type)
+                for doc in collection.find({"_id": {"$in": missing}}):
+                    self.cache.put(dr_type, doc, version)
+                    docs[doc["_id"]] = project(doc, projection) if projection is not None else doc
+            for doc in docs.values():
+                self._overlay_latest(dr_type, doc, projection)
+            return docs
+        except Exception as e:
+            raise Exception(f"Failed to get Digital Replicas: {str(e)}")
+
+    def save_drs(
+        self,
+        dr_type: str,
+        drs: List[Dict],
+        ordered: bool = True,
+        profile: Optional[str] = None,
+    ) -> List[str]:
+        """
+        Save many Digital Replicas with one insert
+
+        Args:
+            dr_type: Type of Digital Replica
+            drs: Digital Replica documents, each with its _id
+            ordered: Stop at the first failing document instead of
+                inserting all others
+            profile: Optional read/write concern profile, see DEFAULT_PROFILES
+
+        Returns:
+            List[str]: IDs of the saved Digital Replicas, in input order
+        """
+        if not self.is_connected():
+            raise ConnectionError("Not connected to MongoDB")
+
+        try:
+            if not drs:
+                return []
+            collection_name = self.schema_registry.get_collection_name(dr_type)
+            self._collection(collection_name, profile).insert_many(drs, ordered=ordered)
+            return [str(dr["_id"]) for dr in drs]
+        except Exception as e:
+            raise Exception(f"Failed to save Digital Replicas: {str(e)}")
+
+    def update_drs(
+        self,
+        dr_type: str,
+        updates: Dict[str, Dict],
+        ordered: bool = False,
+        profile: Optional[str] = None,
+    ) -> int:
+        """
+        Update many Digital Replicas with one bulk write
+
+        Like update_dr the top-level fields of each update are set, but the
+        metadata fields are merged into the existing metadata and
+        metadata.updated_at is refreshed.
+
+        Args:
+            dr_type: Type of Digital Replica
+            updates: Mapping of DR ID to update data
+            ordered: Apply the updates in order and stop at the first error
+            profile: Optional read/write concern profile, see DEFAULT_PROFILES
+
+        Returns:
+            int: Number of Digital Replicas found, missing ones are skipped
+        """
+        if not self.is_connected():
+            raise ConnectionError("Not connected to MongoDB")
+
+        try:
+            if not updates:
+                return 0
+            collection_name = self.schema_registry.get_collection_name(dr_type)
+            now = datetime.utcnow()
+            operations = []
+            written = {}
+            for dr_id, update_data in updates.items():
+                fields = {key: value for key, value in update_data.items() if key != "metadata"}
+                # Metadata fields are set one by one, so created_at survives
+                for key, value in update_data.get("metadata", {}).items():
+                    fields[f"metadata.{key}"] = value
+                fields["metadata.updated_at"] = now
+                operations.append(UpdateOne({"_id": dr_id}, {"$set": fields}))
+                written[dr_id] = list(fields)
+            result = self._collection(collection_name, profile).bulk_write(operations, ordered=ordered)
+            for dr_id, paths in written.items():
+                self.invalidate_cached(dr_type, dr_id, paths)
+            return result.matched_count
+        except Exception as e:
+            raise Exception(f"Failed to update Digital Replicas: {str(e)}")
+
+    def update_dr_fields(
+        self,
+        dr_type: str,
+        dr_id: str,
+        fields: Dict,
+        projection: Optional[List[str]] = None,
+        profile: Optional[str] = None,
+    ) -> Optional[Dict]:
+        """
+        Atomically set individual fields of a Digital Replica
+
+        Unlike update_dr the document is never read and rewritten as a whole,
+        so concurrent writers of different fields do not overwrite each other.
+
+        Args:
+            dr_type: Type of Digital Replica
+            dr_id: Digital Replica ID
+            fields: Mapping of dotted field paths to new values
+            projection: Optional list of fields to return
+            profile: Optional read/write concern profile, see DEFAULT_PROFILES
+
+        Returns:
+            Optional[Dict]: The projected document after the update,
+            None if the Digital Replica does not exist
+        """
+        if not self.is_connected():
+            raise ConnectionError("Not connected to MongoDB")
+
+        try:
+            collection_name = self.schema_registry.get_collection_name(dr_type)
+            doc = self._collection(collection_name, profile).find_one_and_update(
+                {"_id": dr_id},
+                {"$set": {**fields, "metadata.updated_at": datetime.utcnow()}},
+                projection=projection,
+                return_document=ReturnDocument.AFTER,
+            )
+            self.invalidate_cached(dr_type, dr_id, list(fields) + ["metadata.updated_at"])
+            return doc
+        except Exception as e:
+            raise Exception(f"Failed to update Digital Replica fields: {str(e)}")
+
+    def update_dr_fields_many(
+        self,
+        dr_type: str,
+        updates: Dict[str, Dict],
+        projection: Optional[List[str]] = None,
+        match: Optional[Dict[str, Dict]] = None,
+        profile: Optional[str] = None,
+    ) -> Dict[str, Dict]:
+        """
+        Set individual fields on many Digital Replicas with one bulk write
+
+        Args:
+            dr_type: Type of Digital Replica
+            updates: Mapping of DR ID to {dotted field path: value}
+            projection: Optional list of fields to read back
+            match: Optional mapping of DR ID to extra filter conditions,
+                e.g. {"house_id": ...}. DRs not matching them are neither
+                updated nor returned.
+            profile: Optional read/write concern profile, see DEFAULT_PROFILES
+
+        Returns:
+            Dict[str, Dict]: Projected documents after the update by ID,
+            missing Digital Replicas are left out. Empty if no projection
+            was requested.
+        """
+        if not self.is_connected():
+            raise ConnectionError("Not connected to MongoDB")
+
+        try:
+            if not updates:
+                return {}
+            match = match or {}
+            collection = self._collection(self.schema_registry.get_collection_name(dr_type), profile)
+            now = datetime.utcnow()
+            collection.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": dr_id, **match.get(dr_id, {})},
+                        {"$set": {**fields, "metadata.updated_at": now}},
+                    )
+                    for dr_id, fields in updates.items()
+                ],
+                ordered=False,
+            )
+            for dr_id, fields in updates.items():
+                self.invalidate_cached(dr_type, dr_id, list(fields) + ["metadata.updated_at"])
+            if projection is None:
+                return {}
+            if match:
+                # The match fields are needed to filter the read back
+                extra = {field for conditions in match.values() for field in conditions}
+                projection = list(projection) + sorted(extra - set(projection))
+            return {
+                doc["_id"]: doc
+                for doc in collection.find(
+                    {"_id": {"$in": list(updates.keys())}}, projection
+                )
+                if all(
+                    self._get_path(doc, field) == value
+                    for field, value in match.get(doc["_id"], {}).items()
+                )
+            }
+        except Exception as e:
+            raise Exception(f"Failed to update Digital Replicas: {str(e)}")
+
+    def next_sequence(self, name: str, profile: Optional[str] = None) -> int:
+        """
+        Atomically allocate the next value of a named counter
+
+        Args:
+            name: Counter name, e.g. 'device_handle'
+            profile: Optional read/write concern profile, see DEFAULT_PROFILES
+
+        Returns:
+            int: The new value, starting at 1
+        """
+        if not self.is_connected():
+            raise ConnectionError("Not connected to MongoDB")
+
+        try:
+            counter = self._collection("counters", profile).find_one_and_update(
+                {"_id": name},
+                {"$inc": {"value": 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            return counter["value"]
+        except Exception as e:
+            raise Exception(f"Failed to allocate {name}: {str(e)}")
+
+    @staticmethod
+    def _get_path(doc: Dict, path: str) -> Any:
+        """Value of a dotted field path in a document, None if missing"""
+        for part in path.split("."):
+            if not isinstance(doc, dict):
+                return None
+            doc = doc.get(part)
+        return doc
+
+    def delete_dr(self, dr_type: str, dr_id: str, profile: Optional[str] = None) -> None:
         if not self.is_connected():
             raise ConnectionError("Not connected to MongoDB")
 
         try:
             collection_name = self.schema_registry.get_collection_name(dr_type)
-            result = self.db[collection_name].delete_one({"_id": dr_id})
+            result = self._collection(collection_name, profile).delete_one({"_id": dr_id})
+            self.invalidate_cached(dr_type, dr_id)
 
             if result.deleted_count == 0:
                 raise ValueError(f"Digital Replica not found: {dr_id}")
+
+            # The history is meaningless without its Digital Replica
+            self.delete_measurements(dr_type, dr_id, profile=profile)
         except Exception as e:
             raise Exception(f"Failed to delete Digital Replica: {str(e)}")
+
+    def ensure_indexes(
+        self, dr_types: Optional[List[str]] = None, rebuild: bool = False
+    ) -> Dict[str, Dict[str, List[str]]]:
+        """
+        Create the indexes declared in the templates, report or rebuild changed ones
+
+        Safe to run on every startup: indexes matching their declaration are
+        left alone. An existing index with the name or the keys of a
+        declaration but other options is only reported as mismatched unless
+        rebuild is set. Undeclared indexes are reported, never dropped. A
+        failing index, e.g. a unique index over duplicate values, is logged
+        and reported without stopping the others.
+
+        Args:
+            dr_types: Types to process, all loaded schemas by default
+            rebuild: Replace mismatched indexes; MongoDB refuses two indexes
+                on the same keys, so the old one is dropped first and
+                restored if the new one cannot be built
+
+        Returns:
+            Dict[str, Dict[str, List[str]]]: Per collection the index names
+            that were created, rebuilt, mismatched, unchanged, failed and
+            undeclared
+        """
+        if not self.is_connected():
+            raise ConnectionError("Not connected to MongoDB")
+
+        reports = {}
+        try:
+            for dr_type in dr_types or self.schema_registry.list_schema_types():
+                collection_name = self.schema_registry.get_collection_name(dr_type)
+                collection = self.db[collection_name]
+                existing = collection.index_information()
+                report = {
+                    "created": [], "rebuilt": [], "mismatched": [], "unchanged": [], "failed": [], "undeclared": []
+                }
+
+                declared = self.schema_registry.get_indexes(dr_type)
+                for index in declared:
+                    current = existing.get(index["name"])
+                    if current is not None and self._index_matches(current, index):
+                        report["unchanged"].append(index["name"])
+                        continue
+                    # Same keys under another name would make create_index fail
+                    stale = [
+                        name for name, info in existing.items()
+                        if name != "_id_" and (name == index["name"] or self._index_keys(info) == index["keys"])
+                    ]
+                    if stale and not rebuild:
+                        report["mismatched"].append(index["name"])
+                        continue
+                    dropped = []
+                    try:
+                        for name in stale:
+                            collection.drop_index(name)
+                            dropped.append(name)
+                        collection.create_index(index["keys"], name=index["name"], **self._index_options(index))
+                        report["rebuilt" if stale else "created"].append(index["name"])
+                    except Exception as e:
+                        report["failed"].append(index["name"])
+                        logger.error(f"Failed to create index {index['name']} on {collection_name}: {e}")
+                        self._restore_indexes(collection, {name: existing[name] for name in dropped})
+
+                declared_names = {index["name"] for index in declared}
+                declared_keys = [index["keys"] for index in declared]
+                report["undeclared"] = [
+                    name for name, info in existing.items()
+                    if name != "_id_" and name not in declared_names and self._index_keys(info) not in declared_keys
+                ]
+                for action in ("created", "rebuilt", "mismatched", "undeclared"):
+                    if report[action]:
+                        logger.info(f"Indexes {action} on {collection_name}: {', '.join(report[action])}")
+                reports[collection_name] = report
+            return reports
+        except Exception as e:
+            raise Exception(f"Failed to ensure indexes: {str(e)}")
+
+    def _restore_indexes(self, collection, indexes: Dict[str, Dict]) -> None:
+        """Recreate dropped indexes from their index_information() entries"""
+        for name, info in indexes.items():
+            options = {
+                option: info[option]
+                for option in ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+                if option in info
+            }
+            try:
+                collection.create_index(self._index_keys(info), name=name, **options)
+            except Exception as e:
+                logger.error(f"Failed to restore index {name} on {collection.name}: {e}")
+
+    @staticmethod
+    def _index_keys(info: Dict) -> List[Tuple[str, int]]:
+        """Key list of an index_information() entry, directions as int"""
+        return [(field, int(direction)) for field, direction in info["key"]]
+
+    @staticmethod
+    def _index_options(index: Dict) -> Dict:
+        """create_index keyword arguments of a declared index"""
+        options = {}
+        if index["unique"]:
+            options["unique"] = True
+        if index["sparse"]:
+            options["sparse"] = True
+        if index["expire_after_seconds"] is not None:
+            options["expireAfterSeconds"] = index["expire_after_seconds"]
+        if index["partial_filter"] is not None:
+            options["partialFilterExpression"] = index["partial_filter"]
+        return options
+
+    def _index_matches(self, info: Dict, index: Dict) -> bool:
+        """Whether an existing index has the keys and options of its declaration"""
+        partial_filter = info.get("partialFilterExpression")
+        return (
+            self._index_keys(info) == index["keys"]
+            and bool(info.get("unique", False)) == index["unique"]
+            and bool(info.get("sparse", False)) == index["sparse"]
+            and info.get("expireAfterSeconds") == index["expire_after_seconds"]
+            and (dict(partial_filter) if partial_filter is not None else None) == index["partial_filter"]
+        )
+
+    def _record_query(self, dr_type: str, query: Optional[Dict]) -> None:
+        """Count the filter shape of a query, warn once if no index serves it"""
+        fields = tuple(sorted(field for field in (query or {}) if not field.startswith("$")))
+        if not fields:
+            return
+        key = (dr_type, fields)
+        with self._query_lock:
+            count = self._query_shapes.get(key, 0)
+            self._query_shapes[key] = count + 1
+        if count == 0 and not self._is_indexed(dr_type, fields):
+            logger.warning(f"Query on {dr_type} by {', '.join(fields)} is not served by any declared index")
+
+    def _is_indexed(self, dr_type: str, fields: Tuple[str, ...]) -> bool:
+        """An index serves a filter if its first key is one of the filter fields"""
+        if "_id" in fields:
+            return True
+        return any(
+            index["keys"][0][0] in fields for index in self.schema_registry.indexes.get(dr_type, [])
+        )
+
+    def unindexed_queries(self) -> List[Dict]:
+        """
+        Filter shapes seen by query_drs that no declared index serves
+
+        Returns:
+            List[Dict]: dr_type, fields and count of every such shape
+        """
+        with self._query_lock:
+            shapes = list(self._query_shapes.items())
+        return [
+            {"dr_type": dr_type, "fields": list(fields), "count": count}
+            for (dr_type, fields), count in shapes
+            if not self._is_indexed(dr_type, fields)
+        ]
+
+    def query_stats(self) -> Dict:
+        """Counters of the query_drs filter shapes, for the metrics endpoint"""
+        unindexed = self.unindexed_queries()
+        with self._query_lock:
+            total = sum(self._query_shapes.values())
+            shapes = len(self._query_shapes)
+        return {
+            "queries": total,
+            "shapes": shapes,
+            "unindexed_queries": sum(shape["count"] for shape in unindexed),
+            "unindexed_shapes": len(unindexed),
+        }
+
+    def _init_measurement_collection(self) -> None:
+        """Create the indexes used by the measurement bucket store"""
+        buckets = self.db[MEASUREMENT_COLLECTION]
+        buckets.create_index(
+            [("dr_type", ASCENDING), ("dr_id", ASCENDING), ("bucket_start", ASCENDING)]
+        )
+        buckets.create_index(
+            [("dr_type", ASCENDING), ("dr_id", ASCENDING), ("last", ASCENDING)]
+        )
+
+    def _init_dedup_collection(self) -> None:
+        """Create the TTL index expiring old ingest keys"""
+        self.db[INGEST_DEDUP_COLLECTION].create_index(
+            [("created_at", ASCENDING)], expireAfterSeconds=self.dedup_ttl
+        )
+
+    def claim_ingest_keys(self, keys: List[str], profile: Optional[str] = None) -> Set[str]:
+        """
+        Record ingest keys, the unique _id rejects keys already recorded
+
+        Args:
+            keys: Keys identifying samples, e.g. room, device and device time
+            profile: Optional read/write concern profile, see DEFAULT_PROFILES
+
+        Returns:
+            Set[str]: The keys that were not seen before
+        """
+        if not self.is_connected():
+            raise ConnectionError("Not connected to MongoDB")
+
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return set()
+        now = datetime.utcnow()
+        try:
+            self._collection(INGEST_DEDUP_COLLECTION, profile).insert_many(
+                [{"_id": key, "created_at": now} for key in keys], ordered=False
+            )
+            return set(keys)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in errors):
+                raise Exception(f"Failed to record ingest keys: {str(e)}")
+            duplicates = {error["op"]["_id"] for error in errors}
+            return set(keys) - duplicates
+        except Exception as e:
+            raise Exception(f"Failed to record ingest keys: {str(e)}")
+
+    def _bucket_start(self, timestamp: datetime) -> datetime:
+        """Align a timestamp to the start of its bucket window"""
+        epoch = datetime(1970, 1, 1)
+        seconds = int((timestamp - epoch).total_seconds())
+        return epoch + timedelta(seconds=seconds - seconds % self.bucket_seconds)
+
+    def append_measurement(
+        self, dr_type: str, dr_id: str, measurement: Dict, profile: Optional[str] = None
+    ) -> None:
+        """
+        Append a measurement to the history of a Digital Replica
+
+        The write is a single upsert on the current bucket, so its cost does not
+        depend on how much history already exists.
+
+        Args:
+            dr_type: Type of Digital Replica
+            dr_id: Digital Replica ID
+            measurement: Measurement data, "timestamp" defaults to now
+            profile: Optional read/write concern profile, see DEFAULT_PROFILES
+        """
+        self.append_measurements(dr_type, [(dr_id, measurement)], profile=profile)
+
+    def append_measurements(
+        self,
+        dr_type: str,
+        measurements: List[Tuple[str, Dict]],
+        profile: Optional[str] = None,
+    ) -> None:
+        """
+        Append many measurements with a single bulk write
+
+        Measurements falling into the same bucket are pushed together, so the
+        number of operations grows with the number of buckets touched rather
+        than with the number of measurements.
+
+        Args:
+            dr_type: Type of Digital Replica
+            measurements: List of (dr_id, measurement) pairs
+            profile: Optional read/write concern profile, see DEFAULT_PROFILES
+        """
+        if not self.is_connected():
+            raise ConnectionError("Not connected to MongoDB")
+
+        try:
+            grouped: Dict[Tuple[str, datetime], List[Dict]] = {}
+            for dr_id, measurement in measurements:
+                if "timestamp" not in measurement:
+                    measurement = {**measurement, "timestamp": datetime.utcnow()}
+                key = (dr_id, self._bucket_start(measurement["timestamp"]))
+                grouped.setdefault(key, []).append(measurement)
+
+            operations = []
+            for (dr_id, bucket_start), items in grouped.items():
+                for i in range(0, len(items), self.bucket_size):
+                    chunk = items[i : i + self.bucket_size]
+                    timestamps = [m["timestamp"] for m in chunk]
+                    operations.append(
+                        UpdateOne(
+                            {
+                                "dr_type": dr_type,
+                                "dr_id": dr_id,
+                                "bucket_start": bucket_start,
+                                "count": {"$lte": self.bucket_size - len(chunk)},
+                            },
+                            {
+                                "$push": {"measurements": {"$each": chunk}},
+                                "$inc": {"count": len(chunk)},
+                                "$min": {"first": min(timestamps)},
+                                "$max": {"last": max(timestamps)},
+                                "$setOnInsert": {
+                                    "bucket_end": bucket_start
+                                    + timedelta(seconds=self.bucket_seconds)
+                                },
+                            },
+                            upsert=True,
+                        )
+                    )
+
+            if operations:
+                self._collection(MEASUREMENT_COLLECTION, profile).bulk_write(operations, ordered=False)
+        except Exception as e:
+            raise Exception(f"Failed to append measurements: {str(e)}")
+
+    def get_measurements(
+        self,
+        dr_type: str,
+        dr_id: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        profile: Optional[str] = None,
+    ) -> List[Dict]:
+        """
+        Read the measurements of a Digital Replica in a time range
+
+        Args:
+            dr_type: Type of Digital Replica
+            dr_id: Digital Replica ID
+            start: Optional inclusive lower bound
+            end: Optional inclusive upper bound
+            profile: Optional read/write concern profile, see DEFAULT_PROFILES
+
+        Returns:
+            List[Dict]: Measurements ordered by timestamp
+        """
+        if not self.is_connected():
+            raise ConnectionError("Not connected to MongoDB")
+
+        try:
+            query = {"dr_type": dr_type, "dr_id": dr_id}
+            if start is not None:
+                query["last"] = {"$gte": start}
+            if end is not None:
+                query["first"] = {"$lte": end}
+
+            buckets = self._collection(MEASUREMENT_COLLECTION, profile).find(
+                query, {"measurements": 1}
+            ).sort("bucket_start", ASCENDING)
+
+            measurements = []
+            for bucket in buckets:
+                for measurement in bucket.get("measurements", []):
+                    timestamp = measurement["timestamp"]
+                    if start is not None and timestamp < start:
+                        continue
+                    if end is not None and timestamp > end:
+                        continue
+                    measurements.append(measurement)
+
+            measurements.sort(key=lambda m: m["timestamp"])
+            return measurements
+        except Exception as e:
+            raise Exception(f"Failed to get measurements: {str(e)}")
+
+    def delete_measurements(self, dr_type: str, dr_id: str, profile: Optional[str] = None) -> None:
+        """Delete the whole measurement history of a Digital Replica"""
+        if not self.is_connected():
+            raise ConnectionError("Not connected to MongoDB")
+
+        try:
+            self._collection(MEASUREMENT_COLLECTION, profile).delete_many(
+                {"dr_type": dr_type, "dr_id": dr_id}
+            )
+        except Exception as e:
+            raise Exception(f"Failed to delete measurements: {str(e)}")
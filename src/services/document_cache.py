@@ -0,0 +1,196 @@
+import copy
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional
+
+_MISSING = object()
+
+
+def _overlaps(path: str, field: str) -> bool:
+    """Whether two dotted paths address the same data, one containing the other"""
+    return path == field or path.startswith(field + ".") or field.startswith(path + ".")
+
+
+def _get_path(doc: Dict, path: str) -> Any:
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return _MISSING
+        doc = doc[part]
+    return doc
+
+
+def project(doc: Dict, fields: Iterable[str]) -> Dict:
+    """Copy of a document with only _id and the given dotted paths"""
+    projected = {"_id": doc["_id"]} if "_id" in doc else {}
+    for path in fields:
+        value = _get_path(doc, path)
+        if value is _MISSING:
+            continue
+        target = projected
+        parts = path.split(".")
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = copy.deepcopy(value)
+    return projected
+
+
+class DocumentCache:
+    """Read-through cache of documents by kind (DR type or 'digital_twin')
+
+    Every kind has its own LRU bound and TTL, so a burst of rooms cannot
+    evict the users. A kind may cache only some fields, e.g. the cold
+    profile of a room: lookups are then served only for reads asking for a
+    subset of them, and writes invalidate an entry only if they touch one.
+    Entries older than the TTL are reloaded, which bounds the staleness of
+    changes made by other processes.
+    """
+
+    def __init__(self):
+        self._kinds: Dict[str, Optional[Dict]] = {}
+        self._entries: Dict[str, "OrderedDict[str, tuple]"] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        # Bumped by every write, a read started before a write is not cached
+        self._versions: Dict[str, int] = {}
+        self._lock = Lock()
+
+    def configure(
+        self,
+        kind: str,
+        max_entries: int = 1000,
+        ttl: Optional[float] = 60.0,
+        fields: Optional[List[str]] = None,
+        enabled: bool = True,
+    ) -> None:
+        """
+        Set the limits of a kind, dropping its cached entries
+
+        Args:
+            kind: DR type or 'digital_twin'
+            max_entries: Maximum cached documents of this kind
+            ttl: Seconds an entry is served, None for no expiry
+            fields: Dotted paths to cache, the whole document if None
+            enabled: False to never cache this kind
+        """
+        with self._lock:
+            self._kinds[kind] = (
+                {"max_entries": max_entries, "ttl": ttl, "fields": list(fields) if fields else None}
+                if enabled
+                else None
+            )
+            self._entries[kind] = OrderedDict()
+            self._versions.setdefault(kind, 0)
+            self._stats.setdefault(
+                kind, {"hits": 0, "misses": 0, "bypassed": 0, "evictions": 0, "invalidations": 0}
+            )
+
+    def is_configured(self, kind: str) -> bool:
+        return kind in self._kinds
+
+    def is_enabled(self, kind: str) -> bool:
+        return self._kinds.get(kind) is not None
+
+    def kinds(self) -> List[str]:
+        """Kinds with caching enabled"""
+        return [kind for kind, config in self._kinds.items() if config is not None]
+
+    def covers(self, kind: str, fields: Optional[Iterable[str]] = None) -> bool:
+        """Whether reads of these fields (None: whole document) can be served"""
+        config = self._kinds.get(kind)
+        if config is None:
+            return False
+        if config["fields"] is None:
+            return True
+        if fields is None:
+            return False
+        return all(
+            any(path == field or path.startswith(field + ".") for field in config["fields"])
+            for path in fields
+        )
+
+    def get(self, kind: str, doc_id: str, fields: Optional[Iterable[str]] = None) -> Optional[Dict]:
+        """
+        Cached copy of a document
+
+        Returns:
+            Optional[Dict]: The document (projected to fields if given),
+            None on a miss or if the read is not covered
+        """
+        if not self.covers(kind, fields):
+            if kind in self._stats:
+                with self._lock:
+                    self._stats[kind]["bypassed"] += 1
+            return None
+        with self._lock:
+            entries = self._entries[kind]
+            entry = entries.get(doc_id)
+            ttl = self._kinds[kind]["ttl"]
+            if entry is None or (ttl is not None and time.monotonic() - entry[1] >= ttl):
+                self._stats[kind]["misses"] += 1
+                return None
+            entries.move_to_end(doc_id)
+            self._stats[kind]["hits"] += 1
+            doc = entry[0]
+        return project(doc, fields) if fields is not None else copy.deepcopy(doc)
+
+    def version(self, kind: str) -> int:
+        """Write counter of a kind, taken before reading from the database"""
+        return self._versions.get(kind, 0)
+
+    def put(self, kind: str, doc: Dict, version: Optional[int] = None) -> None:
+        """
+        Cache a document as read from the database
+
+        Args:
+            kind: DR type or 'digital_twin'
+            doc: The document with at least all cached fields
+            version: version() taken before the read; the document is not
+                cached if a write happened since
+        """
+        config = self._kinds.get(kind)
+        if config is None or doc is None:
+            return
+        stored = project(doc, config["fields"]) if config["fields"] else copy.deepcopy(doc)
+        with self._lock:
+            if version is not None and self._versions[kind] != version:
+                return
+            entries = self._entries[kind]
+            entries[doc["_id"]] = (stored, time.monotonic())
+            entries.move_to_end(doc["_id"])
+            while len(entries) > config["max_entries"]:
+                entries.popitem(last=False)
+                self._stats[kind]["evictions"] += 1
+
+    def invalidate(self, kind: str, doc_id: Optional[str] = None, paths: Optional[Iterable[str]] = None) -> None:
+        """
+        Drop cached documents after a write
+
+        Args:
+            kind: DR type or 'digital_twin'
+            doc_id: Document written, all documents of the kind if None
+            paths: Dotted paths written; the entry is kept if none of them
+                overlaps a cached field. None means the whole document.
+        """
+        config = self._kinds.get(kind)
+        if config is None:
+            return
+        if paths is not None and config["fields"] is not None:
+            if not any(_overlaps(path, field) for path in paths for field in config["fields"]):
+                return
+        with self._lock:
+            self._versions[kind] += 1
+            entries = self._entries[kind]
+            if doc_id is None:
+                self._stats[kind]["invalidations"] += len(entries)
+                entries.clear()
+            elif entries.pop(doc_id, None) is not None:
+                self._stats[kind]["invalidations"] += 1
+
+    def stats(self, kind: str) -> Dict:
+        """Snapshot of the counters of one kind"""
+        with self._lock:
+            stats = dict(self._stats.get(kind, {}))
+            stats["size"] = len(self._entries.get(kind, ()))
+        lookups = stats.get("hits", 0) + stats.get("misses", 0)
+        stats["hit_rate"] = stats.get("hits", 0) / lookups if lookups else 0.0
+        return stats
@@ -1,4 +1,4 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 from src.services.base import BaseService
 from datetime import datetime
 from flask import current_app
@@ -8,35 +8,66 @@ import openmeteo_requests
 import requests_cache
 import pandas as pd
 from retry_requests import retry
+from threading import Lock
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+
+_openmeteo_client = None
+_openmeteo_lock = Lock()
+
+
+def get_openmeteo_client():
+    """Return the process-wide Open-Meteo client, created on first use"""
+    global _openmeteo_client
+    with _openmeteo_lock:
+        if _openmeteo_client is None:
+            # Setup the Open-Meteo API client with cache and retry on error
+            cache_session = requests_cache.CachedSession('.cache', expire_after = 3600)
+            retry_session = retry(cache_session, retries = 5, backoff_factor = 0.2)
+            _openmeteo_client = openmeteo_requests.Client(session = retry_session)
+        return _openmeteo_client
+
 
 class FetchWeatherService(BaseService):
     """Service to fetch weather data from a weather API"""
 
-    def __init__(self):
+    def __init__(self, url: str = OPEN_METEO_URL, chunk_size: int = 50):
         self.name = "FetchWeatherService"
 
-        # Setup the Open-Meteo API client with cache and retry on error
-        self.cache_session = requests_cache.CachedSession('.cache', expire_after = 3600)
-        self.retry_session = retry(self.cache_session, retries = 5, backoff_factor = 0.2)
-        self.openmeteo = openmeteo_requests.Client(session = self.retry_session)
+        # All instances share one cached HTTP session
+        self.openmeteo = get_openmeteo_client()
 
-        self.url = "https://api.open-meteo.com/v1/forecast"
+        self.url = url
+        # Locations per multi-location request
+        self.chunk_size = chunk_size
 
-    def execute(self, data: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+    def execute(self, data: Dict[str, Any], **kwargs) -> Optional[Dict[str, Any]]:
         """
         Execute the service to fetch weather data from a weather API.
 
+        When a shared WeatherCache is configured this is a memory lookup only,
+        the cache refreshes the location in the background.
+
         Args:
             data: Dictionary containing digital replicas data
-            kwargs: Must include 'longitude' and 'latitude' to fetch weather data
+            kwargs: Must include 'longitude' and 'latitude' to fetch weather data,
+                may include 'house_id' to register the house with the cache
 
         Returns:
-            Dict containing the weather data
+            Dict containing the weather data, None if the cache has no entry yet
         """
-
-        # Fetch weather data from the weather API
         longitude = kwargs.get('longitude')
         latitude = kwargs.get('latitude')
+
+        weather_cache = current_app.config.get("WEATHER_CACHE")
+        if weather_cache is not None:
+            return weather_cache.get(longitude, latitude, owner=kwargs.get('house_id'))
+
+        # Fetch weather data from the weather API
         weather_data = self.fetch_weather(longitude, latitude)
         return weather_data
 
@@ -45,49 +76,65 @@ class FetchWeatherService(BaseService):
         Fetch weather data from a weather API.
 
         Args:
-            city: The city to fetch weather data for
+            longitude: Position
+            latitude: Position
 
         Returns:
             Dict containing the weather data
         """
-        # Call the weather API here
-        params = {
-            "latitude": latitude,
-            "longitude": longitude,
-            "current": ["temperature_2m", "relative_humidity_2m", "rain"]
-        }
-        responses = self.openmeteo.weather_api(self.url, params=params)
-
-        # Process first location. Add a for-loop for multiple locations or weather models
-        response = responses[0]
-        print(f"Coordinates {response.Latitude()}°N {response.Longitude()}°E")
-        print(f"Elevation {response.Elevation()} m asl")
-        print(f"Timezone {response.Timezone()} {response.TimezoneAbbreviation()}")
-        print(f"Timezone difference to GMT+0 {response.UtcOffsetSeconds()} s")
-
-
-        # Current values. The order of variables needs to be the same as requested.
-        current = response.Current()
-
-        current_temperature_2m = current.Variables(0).Value()
-
-        current_relative_humidity_2m = current.Variables(1).Value()
-
-        current_rain = current.Variables(2).Value()
-
-        print(f"Current time {current.Time()}")
-
-        print(f"Current temperature_2m {current_temperature_2m}")
-        print(f"Current relative_humidity_2m {current_relative_humidity_2m}")
-        print(f"Current rain {current_rain}")
-
+        weather = self.fetch_weather_batch([(longitude, latitude)])[0]
+        if weather is None:
+            raise ValueError(f"Failed to fetch weather for {longitude}, {latitude}")
+        return weather
 
+    def fetch_weather_batch(self, locations: List[Tuple[float, float]]) -> List[Dict[str, Any]]:
+        """
+        Fetch the current weather of many locations with multi-location requests.
 
-        data = {
-            "temperature": current_temperature_2m,
-            "humidity": current_relative_humidity_2m,
-        }
+        Open-Meteo accepts lists of coordinates and answers with one response
+        per location in request order, so each chunk costs a single request.
+        A failed chunk does not discard the others, its locations are None.
 
-        return data
+        Args:
+            locations: List of (longitude, latitude) pairs
 
-    
\ No newline at end of file
+        Returns:
+            List of weather data dicts (None if the chunk of the location
+            failed) in the order of the locations
+        """
+        results = []
+        for i in range(0, len(locations), self.chunk_size):
+            chunk = locations[i : i + self.chunk_size]
+            params = {
+                "latitude": [latitude for _, latitude in chunk],
+                "longitude": [longitude for longitude, _ in chunk],
+                "current": ["temperature_2m", "relative_humidity_2m", "rain"]
+            }
+            try:
+                responses = self.openmeteo.weather_api(self.url, params=params)
+                if len(responses) != len(chunk):
+                    raise ValueError(f"Expected {len(chunk)} weather responses, got {len(responses)}")
+            except Exception as e:
+                logger.error(f"Failed to fetch weather for {len(chunk)} locations: {e}")
+                results.extend([None] * len(chunk))
+                continue
+
+            for response in responses:
+                # Current values. The order of variables needs to be the same as requested.
+                current = response.Current()
+                current_temperature_2m = current.Variables(0).Value()
+                current_relative_humidity_2m = current.Variables(1).Value()
+                current_rain = current.Variables(2).Value()
+
+                logger.debug(
+                    f"Coordinates {response.Latitude()}°N {response.Longitude()}°E at {current.Time()}: "
+                    f"temperature_2m {current_temperature_2m}, "
+                    f"relative_humidity_2m {current_relative_humidity_2m}, rain {current_rain}"
+                )
+
+                results.append({
+                    "temperature": current_temperature_2m,
+                    "humidity": current_relative_humidity_2m,
+                })
+
+        return results
@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+
+ALERT = "alert"
+ESCALATE = "escalate"
+RESOLVED = "resolved"
+
+
+class HumidityAlertTracker:
+    """Per (room, user) alert state machine for high humidity notifications
+
+    A room enters the alert state when humidity and the indoor/outdoor
+    absolute humidity difference exceed their thresholds. It only leaves it
+    again once humidity dropped below the lower clear threshold or the
+    difference below its own lower clear threshold (hysteresis). A state is
+    held for at least min_hold seconds, so values hovering around a
+    threshold cannot send an alert and its resolution on every reading.
+    While alerting, reminders with an increasing level are sent at most
+    once per cooldown, up to max_level. Notifications therefore follow
+    state changes, not the sample rate.
+
+    The state is kept in memory and handed out in a compact form for
+    persisting with the room whenever it changes:
+        {"s": 1, "l": level, "t": alerting_since, "n": last_notified_at}
+        {"s": 0, "r": resolved_at}
+    """
+
+    def __init__(
+        self,
+        humidity_threshold: float = 60.0,
+        clear_threshold: float = 55.0,
+        difference_threshold: float = 0.0,
+        difference_clear_threshold: Optional[float] = None,
+        cooldown: float = 1800.0,
+        max_level: int = 3,
+        min_hold: float = 300.0,
+    ):
+        """
+        Args:
+            humidity_threshold: Relative humidity (%) raising an alert
+            clear_threshold: Relative humidity (%) below which it clears
+            difference_threshold: Absolute humidity difference (g/m³)
+                between room and outside raising an alert
+            difference_clear_threshold: Difference (g/m³) at or below which
+                it clears, 0.5 below difference_threshold if None
+            cooldown: Minimum seconds between two notifications
+            max_level: Number of notifications per alert, including the first
+            min_hold: Minimum seconds between an alert and its resolution,
+                and between a resolution and the next alert
+        """
+        self.humidity_threshold = humidity_threshold
+        self.clear_threshold = clear_threshold
+        self.difference_threshold = difference_threshold
+        self.difference_clear_threshold = (
+            difference_threshold - 0.5 if difference_clear_threshold is None else difference_clear_threshold
+        )
+        self.cooldown = timedelta(seconds=cooldown)
+        self.max_level = max_level
+        self.min_hold = timedelta(seconds=min_hold)
+        self._states: Dict[Tuple[str, str], Dict] = {}
+        self._lock = Lock()
+
+    def evaluate(
+        self,
+        room_id: str,
+        user_id: str,
+        humidity: float,
+        difference: float,
+        persisted: Optional[Dict] = None,
+        now: Optional[datetime] = None,
+    ) -> Tuple[Optional[str], Optional[Dict]]:
+        """
+        Feed a reading into the state machine of a (room, user) pair
+
+        Args:
+            room_id: Room ID
+            user_id: User ID
+            humidity: Relative humidity of the room (%)
+            difference: Room minus outdoor absolute humidity (g/m³)
+            persisted: Compact state stored with the room, used when the
+                pair is not in memory yet
+            now: Evaluation time, defaults to utcnow
+
+        Returns:
+            Tuple of the event to notify (ALERT, ESCALATE, RESOLVED or None)
+            and the compact state to persist (None if unchanged)
+        """
+        now = now or datetime.utcnow()
+        key = (room_id, user_id)
+
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = dict(persisted) if persisted else {"s": 0}
+                self._states[key] = state
+
+            if not state.get("s"):
+                if state.get("r") is not None and now - state["r"] < self.min_hold:
+                    return None, None
+                if humidity > self.humidity_threshold and difference > self.difference_threshold:
+                    state.clear()
+                    state.update({"s": 1, "l": 1, "t": now, "n": now})
+                    return ALERT, dict(state)
+                return None, None
+
+            if now - state["t"] >= self.min_hold and (
+                humidity < self.clear_threshold or difference <= self.difference_clear_threshold
+            ):
+                state.clear()
+                state.update({"s": 0, "r": now})
+                return RESOLVED, dict(state)
+
+            if state.get("l", 1) < self.max_level and now - state["n"] >= self.cooldown:
+                state["l"] = state.get("l", 1) + 1
+                state["n"] = now
+                return ESCALATE, dict(state)
+
+            return None, None
+
+    def forget(self, room_id: str) -> None:
+        """Drop the in-memory state of a room, e.g. after it was deleted"""
+        with self._lock:
+            for key in [key for key in self._states if key[0] == room_id]:
+                del self._states[key]
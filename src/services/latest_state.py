@@ -0,0 +1,276 @@
+import copy
+import logging
+import time
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from src.services.document_cache import _MISSING
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ("values", "flushed", "flushed_at", "offered_at")
+
+    def __init__(self):
+        # Latest values by dotted path, and the values last written
+        self.values: Dict[str, Any] = {}
+        self.flushed: Dict[str, Any] = {}
+        self.flushed_at: Optional[float] = None
+        self.offered_at = 0.0
+
+    def dirty_paths(self) -> List[str]:
+        return [path for path, value in self.values.items() if self.flushed.get(path, _MISSING) != value]
+
+
+class LatestStateTable:
+    """Write-behind buffer of frequently overwritten "latest value" fields
+
+    Every reading is offered to the table, but an entity (a room, a house)
+    is written at most once per interval, unless a value moved by at least
+    its delta since the last write, which is written at once. Values equal
+    to the stored ones are never written. A background thread writes
+    entries whose interval ran out, so a crash loses at most one interval
+    of latest values; stop() writes everything that is still pending.
+
+    Each kind (DR type or 'digital_twin') has a writer taking
+    {id: {dotted path: value}}, e.g. DatabaseService.update_dr_fields_many,
+    which receives all due entries of a kind in one call.
+    """
+
+    def __init__(self, interval: float = 30.0, check_interval: float = 1.0):
+        """
+        Args:
+            interval: Default seconds between two writes of an entity
+            check_interval: Seconds between two passes of the background
+                thread looking for entries whose interval ran out
+        """
+        self.interval = interval
+        self.check_interval = check_interval
+        self._kinds: Dict[str, Dict] = {}
+        self._entries: Dict[str, Dict[str, _Entry]] = {}
+        self._lock = Lock()
+        self._stopping = Event()
+        self._thread = None
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def configure(
+        self,
+        kind: str,
+        writer: Callable[[Dict[str, Dict]], Any],
+        deltas: Optional[Dict[str, float]] = None,
+        interval: Optional[float] = None,
+    ) -> None:
+        """
+        Buffer the latest values of a kind
+
+        Args:
+            kind: DR type or 'digital_twin'
+            writer: Callable({id: {path: value}}) storing the values
+            deltas: Per path change written at once, numeric paths without
+                a delta wait for the interval; other values are written at
+                once whenever they change
+            interval: Seconds between two writes, the table default if None
+        """
+        with self._lock:
+            self._kinds[kind] = {
+                "writer": writer,
+                "deltas": dict(deltas or {}),
+                "interval": self.interval if interval is None else interval,
+            }
+            self._entries.setdefault(kind, {})
+            self._stats.setdefault(
+                kind, {"offered": 0, "writes": 0, "written_entities": 0, "coalesced": 0, "write_errors": 0}
+            )
+
+    def is_configured(self, kind: str) -> bool:
+        return kind in self._kinds
+
+    def _is_due(self, config: Dict, entry: _Entry, now: float) -> bool:
+        paths = entry.dirty_paths()
+        if not paths:
+            return False
+        if entry.flushed_at is None or now - entry.flushed_at >= config["interval"]:
+            return True
+        for path in paths:
+            value, flushed = entry.values[path], entry.flushed.get(path, _MISSING)
+            numeric = isinstance(value, (int, float)) and isinstance(flushed, (int, float))
+            if not numeric:
+                return True
+            delta = config["deltas"].get(path)
+            if delta is not None and abs(value - flushed) >= delta:
+                return True
+        return False
+
+    def offer(self, kind: str, values: Dict[str, Dict]) -> Dict[str, Dict]:
+        """
+        Take the latest values of many entities of a kind
+
+        Args:
+            kind: A configured kind
+            values: {id: {dotted path: value}}
+
+        Returns:
+            Dict[str, Dict]: The entities due now with their changed
+            values; write them with write() in the caller's batch, or leave
+            them to the background thread
+        """
+        config = self._kinds[kind]
+        now = time.monotonic()
+        due = {}
+        with self._lock:
+            entries = self._entries[kind]
+            stats = self._stats[kind]
+            for doc_id, fields in values.items():
+                entry = entries.get(doc_id)
+                if entry is None:
+                    entry = entries[doc_id] = _Entry()
+                entry.values.update(fields)
+                entry.offered_at = now
+                stats["offered"] += 1
+                if self._is_due(config, entry, now):
+                    due[doc_id] = {path: entry.values[path] for path in entry.dirty_paths()}
+                else:
+                    stats["coalesced"] += 1
+        return due
+
+    def write(self, kind: str, updates: Dict[str, Dict]) -> None:
+        """
+        Store values returned by offer() or due_entries() with the writer
+
+        On failure the values stay pending and the error is raised.
+        """
+        if not updates:
+            return
+        try:
+            self._kinds[kind]["writer"](updates)
+        except Exception:
+            with self._lock:
+                self._stats[kind]["write_errors"] += 1
+            raise
+        now = time.monotonic()
+        with self._lock:
+            entries = self._entries[kind]
+            for doc_id, fields in updates.items():
+                entry = entries.get(doc_id)
+                if entry is None:
+                    continue
+                entry.flushed.update(fields)
+                entry.flushed_at = now
+            self._stats[kind]["writes"] += 1
+            self._stats[kind]["written_entities"] += len(updates)
+
+    def due_entries(self, kind: str, force: bool = False) -> Dict[str, Dict]:
+        """Changed values of the entities due now, of all changed ones if force"""
+        config = self._kinds[kind]
+        now = time.monotonic()
+        with self._lock:
+            return {
+                doc_id: {path: entry.values[path] for path in entry.dirty_paths()}
+                for doc_id, entry in self._entries[kind].items()
+                if (force and entry.dirty_paths()) or self._is_due(config, entry, now)
+            }
+
+    def flush(self, force: bool = False) -> int:
+        """
+        Write the due entries of every kind, one writer call per kind
+
+        Args:
+            force: Write every changed entry, e.g. on shutdown
+
+        Returns:
+            int: Number of entities written
+        """
+        written = 0
+        for kind in list(self._kinds):
+            updates = self.due_entries(kind, force=force)
+            if not updates:
+                continue
+            try:
+                self.write(kind, updates)
+                written += len(updates)
+            except Exception as e:
+                logger.error(f"Failed to write latest {kind} values: {e}")
+        return written
+
+    def pending(self, kind: str, doc_id: str) -> Dict[str, Any]:
+        """Values of an entity not written yet, by dotted path"""
+        with self._lock:
+            entry = self._entries.get(kind, {}).get(doc_id)
+            if entry is None:
+                return {}
+            return {path: copy.deepcopy(entry.values[path]) for path in entry.dirty_paths()}
+
+    def overlay(
+        self,
+        kind: str,
+        doc: Optional[Dict],
+        fields: Optional[Iterable[str]] = None,
+        excluded: Optional[Iterable[str]] = None,
+    ) -> Optional[Dict]:
+        """
+        Apply the pending values of an entity to a document read from the database
+
+        Args:
+            kind: DR type or 'digital_twin'
+            doc: Document with its _id, changed in place
+            fields: Projection of the read, only the pending paths inside
+                it are applied; all if None
+            excluded: Fields left out by an exclusion projection, pending
+                paths inside them are not applied
+
+        Returns:
+            Optional[Dict]: The document
+        """
+        if doc is None or kind not in self._kinds:
+            return doc
+        fields = list(fields) if fields is not None else None
+        excluded = list(excluded or [])
+        for path, value in self.pending(kind, doc.get("_id")).items():
+            if fields is not None and not any(path == field or path.startswith(field + ".") for field in fields):
+                continue
+            if any(path == field or path.startswith(field + ".") for field in excluded):
+                continue
+            target = doc
+            parts = path.split(".")
+            for part in parts[:-1]:
+                child = target.get(part)
+                if not isinstance(child, dict):
+                    child = target[part] = {}
+                target = child
+            target[parts[-1]] = value
+        return doc
+
+    def forget(self, kind: str, doc_id: str) -> None:
+        """Drop an entity, e.g. after it was deleted"""
+        with self._lock:
+            self._entries.get(kind, {}).pop(doc_id, None)
+
+    def start(self) -> None:
+        """Start the background thread writing entries whose interval ran out"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = Thread(target=self._flush_loop, name="latest-state", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread and write everything still pending"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush(force=True)
+
+    def _flush_loop(self) -> None:
+        while not self._stopping.wait(self.check_interval):
+            self.flush()
+
+    def stats(self, kind: str) -> Dict:
+        """Counters of one kind, with the number of entities and of pending ones"""
+        with self._lock:
+            stats = dict(self._stats.get(kind, {}))
+            entries = self._entries.get(kind, {})
+            stats["entities"] = len(entries)
+            stats["pending"] = sum(1 for entry in entries.values() if entry.dirty_paths())
+        return stats
@@ -0,0 +1,221 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from threading import Thread, Event, Lock
+from typing import Deque, Dict, Optional
+
+import httpx
+
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API_URL = "https://api.telegram.org"
+
+
+class _TokenBucket:
+    """Async token bucket allowing `rate` acquisitions per second"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class NotificationDispatcher:
+    """Fire-and-forget Telegram message delivery
+
+    Messages are queued from any thread and sent by sender tasks on the
+    dispatcher's own event loop, over one pooled keep-alive HTTP client.
+    Sending respects Telegram's global limit (about 30 messages per second)
+    and the per-chat limit (about one message per second).
+
+    Messages wait in a FIFO per chat and only chats that are due are handed
+    to the senders, a burst to one chat is deferred on the event loop
+    instead of keeping a sender busy while other chats wait.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        queue_size: int = 1000,
+        senders: int = 4,
+        global_rate: float = 30.0,
+        per_chat_interval: float = 1.0,
+        max_connections: int = 10,
+        api_url: str = TELEGRAM_API_URL,
+    ):
+        """
+        Args:
+            token: Telegram bot token
+            queue_size: Maximum number of messages waiting to be sent
+            senders: Number of concurrent sender tasks
+            global_rate: Maximum messages per second over all chats
+            per_chat_interval: Minimum seconds between messages to one chat
+            max_connections: Size of the HTTP connection pool
+            api_url: Base URL of the Bot API
+        """
+        self.url = f"{api_url}/bot{token}/sendMessage"
+        self.queue_size = queue_size
+        self.senders = senders
+        self.global_rate = global_rate
+        self.per_chat_interval = per_chat_interval
+        self.max_connections = max_connections
+
+        self._loop = None
+        self._queue = None
+        self._thread = None
+        self._ready = Event()
+        # Loop thread only: messages waiting per chat, a chat with an entry
+        # is queued or deferred exactly once, and its next allowed send time
+        self._chats: Dict[int, Deque[str]] = {}
+        self._chat_next: Dict[int, float] = {}
+        self._pruned = 0.0
+        self._lock = Lock()
+        self._stats = {
+            "submitted": 0,
+            "sent": 0,
+            "failed": 0,
+            "dropped": 0,
+            "rate_limited": 0,
+            "pending": 0,
+        }
+
+    def start(self) -> None:
+        """Start the event loop thread and wait until it accepts messages"""
+        self._ready.clear()
+        self._loop = asyncio.new_event_loop()
+        self._thread = Thread(target=self._run_loop, name="notification-dispatcher")
+        self._thread.daemon = True
+        self._thread.start()
+        self._ready.wait(timeout=5.0)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Send what is queued, then stop the sender tasks"""
+        if not self._loop or not self._queue:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(time.monotonic() + timeout), self._loop)
+        self._thread.join(timeout=timeout + 1.0)
+
+    def submit(self, chat_id: int, text: str) -> bool:
+        """
+        Queue a message without waiting for its delivery
+
+        Returns:
+            bool: False if the dispatcher is not running or the queue is full
+        """
+        with self._lock:
+            if not self._ready.is_set() or self._stats["pending"] >= self.queue_size:
+                self._stats["dropped"] += 1
+                return False
+            self._stats["submitted"] += 1
+            self._stats["pending"] += 1
+        self._loop.call_soon_threadsafe(self._enqueue, chat_id, text)
+        return True
+
+    def stats(self) -> Dict:
+        """Snapshot of the delivery counters"""
+        with self._lock:
+            return dict(self._stats)
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._run())
+        finally:
+            self._ready.clear()
+            self._loop.close()
+
+    async def _run(self) -> None:
+        self._queue = asyncio.Queue()
+        self._bucket = _TokenBucket(self.global_rate)
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+        )
+        async with httpx.AsyncClient(limits=limits, timeout=10.0) as client:
+            self._ready.set()
+            await asyncio.gather(*(self._sender(client) for _ in range(self.senders)))
+
+    async def _shutdown(self, deadline: float) -> None:
+        # Deferred chats still have messages to send
+        while self._chats and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for _ in range(self.senders):
+            self._queue.put_nowait(None)
+
+    def _enqueue(self, chat_id: int, text: str) -> None:
+        messages = self._chats.get(chat_id)
+        if messages is not None:
+            # Already queued or deferred, the message waits behind the others
+            messages.append(text)
+            return
+        self._chats[chat_id] = deque([text])
+        self._schedule(chat_id)
+
+    def _schedule(self, chat_id: int) -> None:
+        """Hand a chat to the senders now, or once its next slot is due"""
+        delay = self._chat_next.get(chat_id, 0.0) - time.monotonic()
+        if delay > 0:
+            self._loop.call_later(delay, self._queue.put_nowait, chat_id)
+        else:
+            self._queue.put_nowait(chat_id)
+
+    def _prune(self, now: float) -> None:
+        """Forget the slots of chats that are due anyway, once per interval"""
+        if now - self._pruned < self.per_chat_interval:
+            return
+        self._pruned = now
+        for chat_id in [chat_id for chat_id, slot in self._chat_next.items() if slot <= now]:
+            del self._chat_next[chat_id]
+
+    async def _sender(self, client: httpx.AsyncClient) -> None:
+        while True:
+            chat_id = await self._queue.get()
+            if chat_id is None:
+                return
+            messages = self._chats[chat_id]
+            text = messages.popleft()
+            now = time.monotonic()
+            self._chat_next[chat_id] = now + self.per_chat_interval
+            self._prune(now)
+            try:
+                delivered = await self._deliver(client, chat_id, text)
+            except Exception as e:
+                logger.error(f"Error sending Telegram message to {chat_id}: {e}")
+                delivered = False
+            with self._lock:
+                self._stats["pending"] -= 1
+                self._stats["sent" if delivered else "failed"] += 1
+            if messages:
+                self._schedule(chat_id)
+            else:
+                del self._chats[chat_id]
+
+    async def _deliver(self, client: httpx.AsyncClient, chat_id: int, text: str) -> bool:
+        for attempt in range(2):
+            await self._bucket.acquire()
+            response = await client.post(self.url, json={"chat_id": chat_id, "text": text})
+            if response.status_code != 429:
+                if response.is_success:
+                    return True
+                logger.error(f"Telegram rejected message to {chat_id}: {response.status_code} {response.text}")
+                return False
+
+            # Telegram tells us how long to back off
+            with self._lock:
+                self._stats["rate_limited"] += 1
+            retry_after = response.json().get("parameters", {}).get("retry_after", 1)
+            await asyncio.sleep(retry_after)
+        return False
@@ -0,0 +1,91 @@
+"""Psychrometric helpers shared by the ingest path, the twins and the services
+
+All formulas use the Magnus approximation over water. Every quantity has a
+scalar version based on `math`, for single readings, and an `_array` version
+based on NumPy, for batches and fleet-wide sweeps. Both give the same results.
+
+Units: temperatures in °C, relative humidity in %, vapour pressure in hPa.
+Absolute humidity keeps the scale the application always stored
+(ABSOLUTE_HUMIDITY_FACTOR * vapour pressure / temperature in K), so values
+stay comparable with what is already in the database.
+"""
+import math
+from typing import Union
+
+import numpy as np
+
+
+MAGNUS_A = 6.11  # hPa
+MAGNUS_B = 17.67
+MAGNUS_C = 243.5  # °C
+ABSOLUTE_HUMIDITY_FACTOR = 2.1674
+KELVIN = 273.15
+
+ArrayLike = Union[float, list, np.ndarray]
+
+
+def saturation_vapour_pressure(temperature: float) -> float:
+    """Saturation vapour pressure (hPa) at a temperature (°C)"""
+    return MAGNUS_A * math.exp((MAGNUS_B * temperature) / (MAGNUS_C + temperature))
+
+
+def vapour_pressure(temperature: float, relative_humidity: float) -> float:
+    """Actual vapour pressure (hPa) of air"""
+    return saturation_vapour_pressure(temperature) * (relative_humidity / 100.0)
+
+
+def absolute_humidity(temperature: float, relative_humidity: float) -> float:
+    """Absolute humidity of air at a temperature (°C) and relative humidity (%)"""
+    return (ABSOLUTE_HUMIDITY_FACTOR * vapour_pressure(temperature, relative_humidity)) / (KELVIN + temperature)
+
+
+def dew_point(temperature: float, relative_humidity: float) -> float:
+    """Dew point (°C) of air, relative humidity must be above 0"""
+    gamma = math.log(relative_humidity / 100.0) + (MAGNUS_B * temperature) / (MAGNUS_C + temperature)
+    return (MAGNUS_C * gamma) / (MAGNUS_B - gamma)
+
+
+def surface_relative_humidity(temperature: float, relative_humidity: float, surface_temperature: float) -> float:
+    """
+    Relative humidity (%) of the air layer touching a colder or warmer surface
+
+    Values of 100 mean condensation on the surface, e.g. mould risk on a cold wall.
+    """
+    humidity = 100.0 * vapour_pressure(temperature, relative_humidity) / saturation_vapour_pressure(surface_temperature)
+    return min(humidity, 100.0)
+
+
+def saturation_vapour_pressure_array(temperature: ArrayLike) -> np.ndarray:
+    """Vectorized saturation_vapour_pressure"""
+    temperature = np.asarray(temperature, dtype=np.float64)
+    return MAGNUS_A * np.exp((MAGNUS_B * temperature) / (MAGNUS_C + temperature))
+
+
+def vapour_pressure_array(temperature: ArrayLike, relative_humidity: ArrayLike) -> np.ndarray:
+    """Vectorized vapour_pressure"""
+    relative_humidity = np.asarray(relative_humidity, dtype=np.float64)
+    return saturation_vapour_pressure_array(temperature) * (relative_humidity / 100.0)
+
+
+def absolute_humidity_array(temperature: ArrayLike, relative_humidity: ArrayLike) -> np.ndarray:
+    """Vectorized absolute_humidity"""
+    temperature = np.asarray(temperature, dtype=np.float64)
+    return (ABSOLUTE_HUMIDITY_FACTOR * vapour_pressure_array(temperature, relative_humidity)) / (KELVIN + temperature)
+
+
+def dew_point_array(temperature: ArrayLike, relative_humidity: ArrayLike) -> np.ndarray:
+    """Vectorized dew_point, NaN where relative humidity is not above 0"""
+    temperature = np.asarray(temperature, dtype=np.float64)
+    relative_humidity = np.asarray(relative_humidity, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gamma = np.log(relative_humidity / 100.0) + (MAGNUS_B * temperature) / (MAGNUS_C + temperature)
+        dew = (MAGNUS_C * gamma) / (MAGNUS_B - gamma)
+    return np.where(relative_humidity > 0, dew, np.nan)
+
+
+def surface_relative_humidity_array(
+    temperature: ArrayLike, relative_humidity: ArrayLike, surface_temperature: ArrayLike
+) -> np.ndarray:
+    """Vectorized surface_relative_humidity"""
+    humidity = 100.0 * vapour_pressure_array(temperature, relative_humidity) / saturation_vapour_pressure_array(surface_temperature)
+    return np.minimum(humidity, 100.0)
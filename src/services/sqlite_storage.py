@@ -0,0 +1,820 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from operator import ge, gt, le, lt
+from threading import RLock
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from pymongo.errors import BulkWriteError, CollectionInvalid, DuplicateKeyError, OperationFailure
+from pymongo.operations import DeleteMany, DeleteOne, InsertOne, UpdateMany, UpdateOne
+
+from src.services.document_cache import project
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two passes removing documents expired by a TTL index,
+# like the TTL monitor of mongod
+TTL_INTERVAL = 60.0
+
+INDEX_TABLE = "_indexes"
+
+_MISSING = object()
+
+
+# ---------------------------------------------------------------------------
+# Documents are stored as JSON text. Datetimes become {"$date": iso} objects,
+# naive UTC with microseconds, so that they sort and compare as strings.
+# ---------------------------------------------------------------------------
+
+def _iso(value: datetime) -> str:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(timespec="microseconds")
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return {"$date": _iso(value)}
+    raise TypeError(f"Cannot store values of type {type(value).__name__}")
+
+
+def _object_hook(obj: Dict):
+    if len(obj) == 1 and "$date" in obj:
+        return datetime.fromisoformat(obj["$date"])
+    return obj
+
+
+def encode(doc: Dict) -> str:
+    return json.dumps(doc, default=_default, separators=(",", ":"))
+
+
+def decode(text: str) -> Dict:
+    return json.loads(text, object_hook=_object_hook)
+
+
+# ---------------------------------------------------------------------------
+# Filters are translated to SQL over json_extract() of the stored document.
+# The same field expression is used by the indexes, so the planner can use
+# them. Compared fields are treated as scalars: a filter on a field holding
+# an array does not match its elements.
+# ---------------------------------------------------------------------------
+
+def _quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _json_path(field: str) -> str:
+    if '"' in field or "'" in field:
+        raise ValueError(f"Unsupported field name: {field}")
+    return "$." + ".".join(f'"{part}"' for part in field.split("."))
+
+
+def field_sql(field: str) -> str:
+    """SQL expression of a dotted field, datetimes as their ISO text"""
+    if field == "_id":
+        return "_id"
+    path = _json_path(field)
+    return f"COALESCE(json_extract(doc, '{path}.\"$date\"'), json_extract(doc, '{path}'))"
+
+
+def _sql_value(value):
+    if isinstance(value, datetime):
+        return _iso(value)
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float, str)):
+        return value
+    raise ValueError(f"Cannot compare a field with a {type(value).__name__} value")
+
+
+def _literal(value) -> str:
+    value = _sql_value(value)
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return repr(value)
+
+
+_COMPARISONS = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+_PY_COMPARISONS = {"$gt": gt, "$gte": ge, "$lt": lt, "$lte": le}
+
+
+def _is_operator_dict(condition) -> bool:
+    return isinstance(condition, dict) and bool(condition) and all(key.startswith("$") for key in condition)
+
+
+def where_sql(query: Optional[Dict], inline: bool = False) -> Tuple[str, List]:
+    """
+    Translate a filter to a SQL condition
+
+    Args:
+        query: Filter with equality, $eq, $ne, $gt, $gte, $lt, $lte, $in,
+            $nin, $exists, $and and $or conditions
+        inline: Write the values into the SQL instead of parameters, as
+            needed by partial indexes
+
+    Returns:
+        Tuple of the SQL condition and its parameters
+    """
+    params: List = []
+
+    def value(v) -> str:
+        if inline:
+            return _literal(v)
+        params.append(_sql_value(v))
+        return "?"
+
+    def condition(field: str, operator: str, operand) -> str:
+        expr = field_sql(field)
+        if operator == "$eq":
+            return f"{expr} IS NULL" if operand is None else f"{expr} = {value(operand)}"
+        if operator == "$ne":
+            return f"{expr} IS NOT NULL" if operand is None else f"({expr} IS NULL OR {expr} != {value(operand)})"
+        if operator in _COMPARISONS:
+            if operand is None:
+                raise ValueError(f"{operator} needs a value")
+            return f"{expr} {_COMPARISONS[operator]} {value(operand)}"
+        if operator in ("$in", "$nin"):
+            values = [v for v in operand if v is not None]
+            parts = [f"{expr} IN ({', '.join(value(v) for v in values)})"] if values else []
+            if len(values) < len(operand):
+                parts.append(f"{expr} IS NULL")
+            matched = "(" + " OR ".join(parts) + ")" if parts else "0"
+            if operator == "$in":
+                return matched
+            return f"NOT {matched}" if values or parts else "1"
+        if operator == "$exists":
+            if field == "_id":
+                return "1" if operand else "0"
+            exists = f"json_type(doc, '{_json_path(field)}') IS NOT NULL"
+            return exists if operand else f"NOT {exists}"
+        raise ValueError(f"Unsupported query operator: {operator}")
+
+    def clauses(query: Dict) -> str:
+        parts = []
+        for key, cond in query.items():
+            if key in ("$and", "$or"):
+                sub = [clauses(q) for q in cond]
+                if not sub:
+                    raise ValueError(f"{key} needs at least one condition")
+                parts.append("(" + (" AND " if key == "$and" else " OR ").join(sub) + ")")
+            elif key.startswith("$"):
+                raise ValueError(f"Unsupported query operator: {key}")
+            elif _is_operator_dict(cond):
+                parts.extend(condition(key, operator, operand) for operator, operand in cond.items())
+            else:
+                parts.append(condition(key, "$eq", cond))
+        return " AND ".join(parts) if parts else "1"
+
+    return clauses(query or {}), params
+
+
+# ---------------------------------------------------------------------------
+# In-memory evaluation, used for $pull conditions and upserted documents
+# ---------------------------------------------------------------------------
+
+def _get_path(doc, path: str):
+    for part in path.split("."):
+        if isinstance(doc, dict) and part in doc:
+            doc = doc[part]
+        elif isinstance(doc, list) and part.isdigit() and int(part) < len(doc):
+            doc = doc[int(part)]
+        else:
+            return _MISSING
+    return doc
+
+
+def _set_path(doc: Dict, path: str, value) -> None:
+    parts = path.split(".")
+    for part in parts[:-1]:
+        if isinstance(doc, list) and part.isdigit():
+            doc = doc[int(part)]
+        else:
+            child = doc.get(part)
+            if not isinstance(child, (dict, list)):
+                child = doc[part] = {}
+            doc = child
+    if isinstance(doc, list) and parts[-1].isdigit():
+        doc[int(parts[-1])] = value
+    else:
+        doc[parts[-1]] = value
+
+
+def _unset_path(doc: Dict, path: str) -> None:
+    parent, _, last = path.rpartition(".")
+    container = _get_path(doc, parent) if parent else doc
+    if isinstance(container, dict):
+        container.pop(last, None)
+
+
+def _test(value, condition) -> bool:
+    if not _is_operator_dict(condition):
+        return (None if value is _MISSING else value) == condition
+    for operator, operand in condition.items():
+        present = None if value is _MISSING else value
+        if operator == "$eq":
+            ok = present == operand
+        elif operator == "$ne":
+            ok = present != operand
+        elif operator in _PY_COMPARISONS:
+            try:
+                ok = present is not None and _PY_COMPARISONS[operator](present, operand)
+            except TypeError:
+                ok = False
+        elif operator == "$in":
+            ok = present in operand
+        elif operator == "$nin":
+            ok = present not in operand
+        elif operator == "$exists":
+            ok = (value is not _MISSING) == bool(operand)
+        else:
+            raise ValueError(f"Unsupported query operator: {operator}")
+        if not ok:
+            return False
+    return True
+
+
+def matches(doc, query: Dict) -> bool:
+    """Whether a document satisfies a filter, with the semantics of where_sql"""
+    for key, condition in query.items():
+        if key == "$and":
+            if not all(matches(doc, q) for q in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(doc, q) for q in condition):
+                return False
+        elif not _test(_get_path(doc, key) if isinstance(doc, dict) else _MISSING, condition):
+            return False
+    return True
+
+
+def apply_update(doc: Dict, update: Dict, inserting: bool = False) -> None:
+    """
+    Apply update operators to a document in place
+
+    Supports $set, $setOnInsert, $unset, $inc, $min, $max, $push (with
+    $each) and $pull.
+    """
+    if not update or not all(key.startswith("$") for key in update):
+        raise ValueError("Update documents must only contain update operators")
+    for operator, fields in update.items():
+        for path, operand in fields.items():
+            if path == "_id" and operator != "$setOnInsert" and not inserting:
+                if _get_path(doc, "_id") != operand:
+                    raise OperationFailure("Performing an update on the path '_id' would modify the immutable field '_id'", 66)
+            current = _get_path(doc, path)
+            if operator == "$set":
+                _set_path(doc, path, operand)
+            elif operator == "$setOnInsert":
+                if inserting:
+                    _set_path(doc, path, operand)
+            elif operator == "$unset":
+                _unset_path(doc, path)
+            elif operator == "$inc":
+                _set_path(doc, path, operand if current is _MISSING or current is None else current + operand)
+            elif operator in ("$min", "$max"):
+                if current is _MISSING or current is None or (
+                    operand < current if operator == "$min" else operand > current
+                ):
+                    _set_path(doc, path, operand)
+            elif operator == "$push":
+                items = operand["$each"] if isinstance(operand, dict) and "$each" in operand else [operand]
+                if current is _MISSING or current is None:
+                    _set_path(doc, path, list(items))
+                elif isinstance(current, list):
+                    current.extend(items)
+                else:
+                    raise OperationFailure(f"The field '{path}' must be an array", 2)
+            elif operator == "$pull":
+                if isinstance(current, list):
+                    if isinstance(operand, dict) and not _is_operator_dict(operand):
+                        kept = [item for item in current if not (isinstance(item, dict) and matches(item, operand))]
+                    else:
+                        kept = [item for item in current if not _test(item, operand)]
+                    _set_path(doc, path, kept)
+            else:
+                raise ValueError(f"Unsupported update operator: {operator}")
+
+
+def _upsert_document(query: Dict) -> Dict:
+    """New document for an upsert: the equality conditions of the filter"""
+    doc: Dict = {}
+    for key, condition in query.items():
+        if key == "$and":
+            for sub in condition:
+                for path, value in _upsert_document(sub).items():
+                    _set_path(doc, path, value)
+        elif key.startswith("$"):
+            continue
+        elif _is_operator_dict(condition):
+            if "$eq" in condition:
+                _set_path(doc, key, condition["$eq"])
+        else:
+            _set_path(doc, key, condition)
+    return doc
+
+
+def apply_projection(doc: Dict, projection) -> Dict:
+    """Apply a find() projection: a list of fields, or a dict of fields to include (1) or exclude (0)"""
+    if not projection:
+        return doc
+    if isinstance(projection, dict):
+        include_id = bool(projection.get("_id", 1))
+        fields = {field: flag for field, flag in projection.items() if field != "_id"}
+        if fields and all(not flag for flag in fields.values()):
+            for field in fields:
+                _unset_path(doc, field)
+            if not include_id:
+                doc.pop("_id", None)
+            return doc
+        projected = project(doc, [field for field, flag in fields.items() if flag])
+    else:
+        include_id = True
+        projected = project(doc, [field for field in projection if field != "_id"])
+    if not include_id:
+        projected.pop("_id", None)
+    return projected
+
+
+# ---------------------------------------------------------------------------
+# pymongo-like client, database, collection and cursor
+# ---------------------------------------------------------------------------
+
+class UpdateResult:
+    def __init__(self, matched_count: int, modified_count: int, upserted_id=None):
+        self.acknowledged = True
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.upserted_id = upserted_id
+
+
+class DeleteResult:
+    def __init__(self, deleted_count: int):
+        self.acknowledged = True
+        self.deleted_count = deleted_count
+
+
+class InsertOneResult:
+    def __init__(self, inserted_id):
+        self.acknowledged = True
+        self.inserted_id = inserted_id
+
+
+class InsertManyResult:
+    def __init__(self, inserted_ids: List):
+        self.acknowledged = True
+        self.inserted_ids = inserted_ids
+
+
+class BulkWriteResult:
+    def __init__(self, counts: Dict[str, int], upserted_ids: Dict[int, Any]):
+        self.acknowledged = True
+        self.inserted_count = counts["inserted"]
+        self.matched_count = counts["matched"]
+        self.modified_count = counts["modified"]
+        self.deleted_count = counts["deleted"]
+        self.upserted_count = len(upserted_ids)
+        self.upserted_ids = upserted_ids
+
+
+class SQLiteCursor:
+    """Lazy find() result supporting sort() and limit() like a pymongo cursor
+
+    Rows are fetched as JSON text when iteration starts and decoded one by
+    one, so only the decoded document being processed is held as objects.
+    """
+
+    def __init__(self, collection: "SQLiteCollection", query: Optional[Dict], projection):
+        self.collection = collection
+        self.query = query or {}
+        self.projection = projection
+        self._sort: List[Tuple[str, int]] = []
+        self._limit = 0
+
+    def sort(self, key_or_list: Union[str, List[Tuple[str, int]]], direction: int = 1) -> "SQLiteCursor":
+        if isinstance(key_or_list, str):
+            self._sort = [(key_or_list, direction)]
+        else:
+            self._sort = [(field, int(direction)) for field, direction in key_or_list]
+        return self
+
+    def limit(self, limit: int) -> "SQLiteCursor":
+        self._limit = limit
+        return self
+
+    def __iter__(self) -> Iterator[Dict]:
+        where, params = where_sql(self.query)
+        sql = f"SELECT doc FROM {self.collection._table} WHERE {where}"
+        if self._sort:
+            sql += " ORDER BY " + ", ".join(
+                f"{field_sql(field)} {'DESC' if direction < 0 else 'ASC'}" for field, direction in self._sort
+            )
+        if self._limit:
+            sql += f" LIMIT {int(self._limit)}"
+        rows = self.collection._read(sql, params)
+        for (text,) in rows:
+            yield apply_projection(decode(text), self.projection)
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "SQLiteCursor":
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self.close()
+        return False
+
+
+class SQLiteCollection:
+    """A collection stored in one table of (_id, JSON document) rows
+
+    Implements the part of the pymongo Collection API used by the
+    DatabaseService and the factories: find (with sort and limit), find_one,
+    insert_one, insert_many, update_one, update_many, find_one_and_update,
+    delete_one, delete_many, bulk_write, create_index (unique, sparse, TTL
+    and partial), drop_index and index_information. Indexes are SQLite expression indexes
+    over the fields, their declarations are kept in the _indexes table so
+    that index_information() reports them like MongoDB.
+    """
+
+    def __init__(self, database: "SQLiteDatabase", name: str):
+        self.database = database
+        self.name = name
+        self._table = _quote_identifier(name)
+        self._lock = database.client._lock
+        self._exists = None
+        self._ttl_checked = 0.0
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        return self.database.client._connection()
+
+    def with_options(self, **kwargs) -> "SQLiteCollection":
+        """Read and write concerns do not apply to a single embedded file"""
+        return self
+
+    # -- table and index management -----------------------------------------
+
+    def _ensure_table(self) -> None:
+        if self._exists:
+            return
+        with self._lock:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self._table} (_id PRIMARY KEY NOT NULL, doc TEXT NOT NULL)"
+            )
+            self._exists = True
+
+    def _table_exists(self) -> bool:
+        if self._exists is None:
+            self._exists = self.name in self.database.list_collection_names()
+        return self._exists
+
+    def _read(self, sql: str, params: List) -> List[Tuple]:
+        if not self._table_exists():
+            return []
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _index_specs(self) -> Dict[str, Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT name, spec FROM {INDEX_TABLE} WHERE collection = ?", (self.name,)
+            ).fetchall()
+        return {name: decode(spec) for name, spec in rows}
+
+    def create_index(self, keys, name: Optional[str] = None, unique: bool = False, sparse: bool = False,
+                     expireAfterSeconds: Optional[int] = None, partialFilterExpression: Optional[Dict] = None,
+                     **kwargs) -> str:
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        keys = [(field, int(direction)) for field, direction in keys]
+        name = name or "_".join(f"{field}_{direction}" for field, direction in keys)
+        spec = {"key": keys}
+        if unique:
+            spec["unique"] = True
+        if sparse:
+            spec["sparse"] = True
+        if expireAfterSeconds is not None:
+            spec["expireAfterSeconds"] = expireAfterSeconds
+        if partialFilterExpression is not None:
+            spec["partialFilterExpression"] = partialFilterExpression
+
+        self._ensure_table()
+        existing = self._index_specs().get(name)
+        if existing is not None:
+            existing["key"] = [tuple(key) for key in existing["key"]]
+            if existing == {**spec, "key": [tuple(key) for key in keys]}:
+                return name
+            raise OperationFailure(f"Index with name: {name} already exists with different options", 85)
+
+        conditions = []
+        if sparse:
+            conditions.append("(" + " OR ".join(f"{field_sql(field)} IS NOT NULL" for field, _ in keys) + ")")
+        if partialFilterExpression is not None:
+            conditions.append(where_sql(partialFilterExpression, inline=True)[0])
+        sql = (
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX {_quote_identifier(self.name + '.' + name)} ON {self._table} ("
+            + ", ".join(f"{field_sql(field)} {'DESC' if direction < 0 else 'ASC'}" for field, direction in keys)
+            + ")"
+        )
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        with self._lock:
+            try:
+                with self._conn:
+                    self._conn.execute(sql)
+                    self._conn.execute(
+                        f"INSERT INTO {INDEX_TABLE} (collection, name, spec) VALUES (?, ?, ?)",
+                        (self.name, name, encode(spec)),
+                    )
+            except sqlite3.IntegrityError as e:
+                raise DuplicateKeyError(f"E11000 duplicate key error building index {name}: {e}", 11000)
+        return name
+
+    def drop_index(self, name: str) -> None:
+        with self._lock:
+            if name not in self._index_specs():
+                raise OperationFailure(f"index not found with name [{name}]", 27)
+            with self._conn:
+                self._conn.execute(f"DROP INDEX IF EXISTS {_quote_identifier(self.name + '.' + name)}")
+                self._conn.execute(
+                    f"DELETE FROM {INDEX_TABLE} WHERE collection = ? AND name = ?", (self.name, name)
+                )
+
+    def index_information(self) -> Dict[str, Dict]:
+        information = {"_id_": {"key": [("_id", 1)], "v": 2}}
+        for name, spec in self._index_specs().items():
+            spec["key"] = [tuple(key) for key in spec["key"]]
+            information[name] = {**spec, "v": 2}
+        return information
+
+    def _expire(self) -> None:
+        """Delete documents past the expireAfterSeconds of a TTL index, at most every TTL_INTERVAL"""
+        now = time.monotonic()
+        if now - self._ttl_checked < TTL_INTERVAL:
+            return
+        self._ttl_checked = now
+        for spec in self._index_specs().values():
+            if spec.get("expireAfterSeconds") is None or len(spec["key"]) != 1:
+                continue
+            cutoff = datetime.utcnow() - timedelta(seconds=spec["expireAfterSeconds"])
+            with self._lock, self._conn:
+                self._conn.execute(
+                    f"DELETE FROM {self._table} WHERE {field_sql(spec['key'][0][0])} < ?", (_iso(cutoff),)
+                )
+
+    # -- reads ----------------------------------------------------------------
+
+    def find(self, filter: Optional[Dict] = None, projection=None, batch_size: int = 0, **kwargs) -> SQLiteCursor:
+        return SQLiteCursor(self, filter, projection)
+
+    def find_one(self, filter: Optional[Dict] = None, projection=None, **kwargs) -> Optional[Dict]:
+        return next(iter(SQLiteCursor(self, filter, projection).limit(1)), None)
+
+    # -- writes ---------------------------------------------------------------
+
+    def _insert(self, doc: Dict) -> Any:
+        if "_id" not in doc:
+            doc["_id"] = uuid.uuid4().hex
+        try:
+            self._conn.execute(f"INSERT INTO {self._table} (_id, doc) VALUES (?, ?)", (doc["_id"], encode(doc)))
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} ({e})", 11000)
+        return doc["_id"]
+
+    def _update(self, query: Dict, update: Dict, upsert: bool, multi: bool) -> Tuple[int, int, Any, Optional[Dict], Optional[Dict]]:
+        """Apply an update inside the caller's transaction; returns matched, modified, upserted_id, before, after"""
+        where, params = where_sql(query)
+        sql = f"SELECT doc FROM {self._table} WHERE {where}" + ("" if multi else " LIMIT 1")
+        rows = self._conn.execute(sql, params).fetchall()
+        if not rows:
+            if not upsert:
+                return 0, 0, None, None, None
+            doc = _upsert_document(query)
+            apply_update(doc, update, inserting=True)
+            upserted_id = self._insert(doc)
+            return 0, 0, upserted_id, None, doc
+
+        modified = 0
+        before = after = None
+        for (text,) in rows:
+            before = decode(text)
+            after = decode(text)
+            apply_update(after, update)
+            new_text = encode(after)
+            if new_text != text:
+                try:
+                    self._conn.execute(f"UPDATE {self._table} SET doc = ? WHERE _id = ?", (new_text, after["_id"]))
+                except sqlite3.IntegrityError as e:
+                    raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} ({e})", 11000)
+                modified += 1
+        return len(rows), modified, None, before, after
+
+    def _write(self, function, *args):
+        """Run a write in one transaction, creating the table on first use"""
+        self._ensure_table()
+        self._expire()
+        with self._lock, self._conn:
+            # Take the write lock before reading, other processes may share the file
+            self._conn.execute("BEGIN IMMEDIATE")
+            return function(*args)
+
+    def insert_one(self, document: Dict, **kwargs) -> InsertOneResult:
+        return InsertOneResult(self._write(self._insert, document))
+
+    def insert_many(self, documents: List[Dict], ordered: bool = True, **kwargs) -> InsertManyResult:
+        errors = []
+        inserted = []
+
+        def insert_all():
+            for index, doc in enumerate(documents):
+                try:
+                    inserted.append(self._insert(doc))
+                except DuplicateKeyError as e:
+                    errors.append({"index": index, "code": 11000, "errmsg": str(e), "op": doc})
+                    if ordered:
+                        break
+
+        self._write(insert_all)
+        if errors:
+            raise BulkWriteError({
+                "writeErrors": errors, "writeConcernErrors": [], "nInserted": len(inserted),
+                "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": [],
+            })
+        return InsertManyResult(inserted)
+
+    def update_one(self, filter: Dict, update: Dict, upsert: bool = False, **kwargs) -> UpdateResult:
+        matched, modified, upserted_id, _, _ = self._write(self._update, filter, update, upsert, False)
+        return UpdateResult(matched, modified, upserted_id)
+
+    def update_many(self, filter: Dict, update: Dict, upsert: bool = False, **kwargs) -> UpdateResult:
+        matched, modified, upserted_id, _, _ = self._write(self._update, filter, update, upsert, True)
+        return UpdateResult(matched, modified, upserted_id)
+
+    def find_one_and_update(self, filter: Dict, update: Dict, projection=None, upsert: bool = False,
+                            return_document: bool = False, **kwargs) -> Optional[Dict]:
+        _, _, _, before, after = self._write(self._update, filter, update, upsert, False)
+        doc = after if return_document else before
+        return apply_projection(doc, projection) if doc is not None else None
+
+    def _delete(self, query: Dict, multi: bool) -> int:
+        where, params = where_sql(query)
+        if multi:
+            return self._conn.execute(f"DELETE FROM {self._table} WHERE {where}", params).rowcount
+        return self._conn.execute(
+            f"DELETE FROM {self._table} WHERE rowid IN (SELECT rowid FROM {self._table} WHERE {where} LIMIT 1)",
+            params,
+        ).rowcount
+
+    def delete_one(self, filter: Dict, **kwargs) -> DeleteResult:
+        if not self._table_exists():
+            return DeleteResult(0)
+        return DeleteResult(self._write(self._delete, filter, False))
+
+    def delete_many(self, filter: Dict, **kwargs) -> DeleteResult:
+        if not self._table_exists():
+            return DeleteResult(0)
+        return DeleteResult(self._write(self._delete, filter, True))
+
+    def bulk_write(self, requests: List, ordered: bool = True, **kwargs) -> BulkWriteResult:
+        counts = {"inserted": 0, "matched": 0, "modified": 0, "deleted": 0}
+        upserted_ids: Dict[int, Any] = {}
+        errors = []
+
+        def run_all():
+            for index, request in enumerate(requests):
+                # pymongo keeps the arguments of its operation objects private
+                try:
+                    if isinstance(request, (UpdateOne, UpdateMany)):
+                        matched, modified, upserted_id, _, _ = self._update(
+                            request._filter, request._doc, request._upsert, isinstance(request, UpdateMany)
+                        )
+                        counts["matched"] += matched
+                        counts["modified"] += modified
+                        if upserted_id is not None:
+                            upserted_ids[index] = upserted_id
+                    elif isinstance(request, InsertOne):
+                        self._insert(request._doc)
+                        counts["inserted"] += 1
+                    elif isinstance(request, (DeleteOne, DeleteMany)):
+                        counts["deleted"] += self._delete(request._filter, isinstance(request, DeleteMany))
+                    else:
+                        raise ValueError(f"Unsupported bulk operation: {type(request).__name__}")
+                except DuplicateKeyError as e:
+                    errors.append({"index": index, "code": 11000, "errmsg": str(e), "op": request})
+                    if ordered:
+                        break
+
+        self._write(run_all)
+        if errors:
+            raise BulkWriteError({
+                "writeErrors": errors, "writeConcernErrors": [], "nInserted": counts["inserted"],
+                "nUpserted": len(upserted_ids), "nMatched": counts["matched"],
+                "nModified": counts["modified"], "nRemoved": counts["deleted"],
+                "upserted": [{"index": i, "_id": _id} for i, _id in upserted_ids.items()],
+            })
+        return BulkWriteResult(counts, upserted_ids)
+
+
+class SQLiteDatabase:
+    """All collections of one SQLite file"""
+
+    def __init__(self, client: "SQLiteClient", name: str):
+        self.client = client
+        self.name = name
+        self._collections: Dict[str, SQLiteCollection] = {}
+
+    def __getitem__(self, name: str) -> SQLiteCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections.setdefault(name, SQLiteCollection(self, name))
+        return collection
+
+    def get_collection(self, name: str, **kwargs) -> SQLiteCollection:
+        return self[name]
+
+    def list_collection_names(self) -> List[str]:
+        with self.client._lock:
+            rows = self.client._connection().execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' AND name != ?",
+                (INDEX_TABLE,),
+            ).fetchall()
+        return [name for (name,) in rows]
+
+    def create_collection(self, name: str, **kwargs) -> SQLiteCollection:
+        if name in self.list_collection_names():
+            raise CollectionInvalid(f"collection {name} already exists")
+        collection = self[name]
+        collection._ensure_table()
+        return collection
+
+    def drop_collection(self, name: str) -> None:
+        collection = self[name]
+        with self.client._lock, self.client._connection() as conn:
+            conn.execute(f"DROP TABLE IF EXISTS {collection._table}")
+            conn.execute(f"DELETE FROM {INDEX_TABLE} WHERE collection = ?", (name,))
+        collection._exists = False
+
+
+class SQLiteClient:
+    """Embedded stand-in for MongoClient storing every database in one SQLite file
+
+    Meant for single-house edge nodes where running mongod costs more than
+    the application. One connection is shared by all threads and serialized
+    by a lock; the file is opened in WAL mode, so standalone ingest workers
+    in other processes can use the same file.
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0, **options):
+        """
+        Args:
+            path: Database file, ':memory:' for a private in-memory database
+            timeout: Seconds to wait for a lock held by another process
+            options: MongoClient options, ignored
+        """
+        if options:
+            logger.debug(f"Ignoring MongoDB client options for SQLite: {', '.join(sorted(options))}")
+        self.path = path
+        self._lock = RLock()
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn: Optional[sqlite3.Connection] = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {INDEX_TABLE} "
+            "(collection TEXT NOT NULL, name TEXT NOT NULL, spec TEXT NOT NULL, PRIMARY KEY (collection, name))"
+        )
+        self._conn.commit()
+        self._databases: Dict[str, SQLiteDatabase] = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            raise OperationFailure("SQLite client is closed")
+        return self._conn
+
+    def __getitem__(self, name: str) -> SQLiteDatabase:
+        """The database of the file; one file holds a single database whatever its name"""
+        database = self._databases.get(name)
+        if database is None:
+            database = self._databases.setdefault(name, SQLiteDatabase(self, name))
+        return database
+
+    def get_database(self, name: str, **kwargs) -> SQLiteDatabase:
+        return self[name]
+
+    def drop_database(self, name: str) -> None:
+        database = self[name]
+        for collection in database.list_collection_names():
+            database.drop_collection(collection)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
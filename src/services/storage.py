@@ -0,0 +1,39 @@
+from typing import Any
+
+from pymongo import MongoClient
+
+from src.services.sqlite_storage import SQLiteClient
+
+# The DatabaseService and the factories talk to the pymongo client API, the
+# connection string selects the backend providing it:
+#   mongodb://...                  pymongo MongoClient
+#   sqlite:///data/dt.sqlite3      embedded SQLiteClient, relative path
+#   sqlite:////var/lib/dt.sqlite3  embedded SQLiteClient, absolute path
+#   sqlite:///:memory:             embedded, in memory
+# The embedded backend serves single house edge nodes without a MongoDB
+# server, see sqlite_storage.py for the part of the API it implements.
+SQLITE_SCHEME = "sqlite://"
+
+
+def is_embedded(connection_string: str) -> bool:
+    """Whether a connection string selects the embedded SQLite backend"""
+    return connection_string.startswith(SQLITE_SCHEME)
+
+
+def create_client(connection_string: str, **options) -> Any:
+    """
+    Open the client of the backend selected by the connection string
+
+    Args:
+        connection_string: MongoDB URI or sqlite:///<path>
+        options: MongoClient keyword arguments, ignored by SQLite
+
+    Returns:
+        A MongoClient or a SQLiteClient
+    """
+    if is_embedded(connection_string):
+        path = connection_string[len(SQLITE_SCHEME):]
+        if path.startswith("/"):
+            path = path[1:]
+        return SQLiteClient(path or ":memory:", **options)
+    return MongoClient(connection_string, **options)
@@ -0,0 +1,169 @@
+import copy
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.digital_twin.dt_factory import DT_CACHE_KIND
+
+logger = logging.getLogger(__name__)
+
+
+def _covered(loaded: Optional[List[str]], fields: Optional[Iterable[str]]) -> bool:
+    """Whether a document loaded with some fields (None: whole) serves a read"""
+    if loaded is None:
+        return True
+    if fields is None:
+        return False
+    return all(any(path == field or path.startswith(field + ".") for field in loaded) for path in fields)
+
+
+def _set_path(doc: Dict, path: str, value) -> None:
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+class UnitOfWork:
+    """Identity map and pending writes for one request or measurement message
+
+    Every Digital Replica and Digital Twin is loaded at most once, later
+    lookups by the caller or by the services it runs are served from the
+    map. Documents the caller already holds, e.g. read back by a bulk
+    update, are registered instead of loaded. Fields changed through
+    set_fields() are applied to the mapped document at once and written in
+    one update per DR type by flush().
+
+    Used as a context manager the pending writes are flushed on a normal
+    exit and dropped if the block raised.
+    """
+
+    def __init__(self, db_service, dt_factory=None, house_factory=None, profile: Optional[str] = None):
+        """
+        Args:
+            db_service: DatabaseService used for loads and the flush
+            dt_factory: Optional DTFactory for Digital Twin documents
+            house_factory: Optional factory for live Digital Twin instances
+            profile: Read/write concern profile of the loads and the flush
+        """
+        self.db_service = db_service
+        self.dt_factory = dt_factory
+        self.house_factory = house_factory
+        self.profile = profile
+        # (kind, id) -> (document or None, loaded fields or None for all)
+        self._documents: Dict[Tuple[str, str], Tuple[Optional[Dict], Optional[List[str]]]] = {}
+        self._instances: Dict[str, object] = {}
+        self._dirty: Dict[str, Dict[str, Dict]] = {}
+        self.stats = {"loads": 0, "hits": 0, "writes": 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            self.discard()
+        return False
+
+    def register(self, kind: str, doc: Dict, fields: Optional[List[str]] = None) -> None:
+        """
+        Put a document the caller already holds into the map
+
+        Args:
+            kind: DR type or 'digital_twin'
+            doc: The document, with its _id
+            fields: Dotted paths the document carries, None if complete
+        """
+        self._documents[(kind, doc["_id"])] = (doc, list(fields) if fields is not None else None)
+
+    def get_dr(self, dr_type: str, dr_id: str, fields: Optional[List[str]] = None) -> Optional[Dict]:
+        """
+        Get a Digital Replica, loading it on the first lookup only
+
+        Args:
+            dr_type: Type of Digital Replica
+            dr_id: Digital Replica ID
+            fields: Optional dotted paths needed; a registered partial
+                document is used if it carries them
+
+        Returns:
+            Optional[Dict]: The mapped document, shared by all lookups of
+            this unit of work, None if not found
+        """
+        return self._get(
+            dr_type, dr_id, fields,
+            lambda: self.db_service.get_dr(dr_type, dr_id, profile=self.profile),
+        )
+
+    def get_dt(self, dt_id: str) -> Optional[Dict]:
+        """Get a Digital Twin document, loading it on the first lookup only"""
+        return self._get(DT_CACHE_KIND, dt_id, None, lambda: self.dt_factory.get_dt(dt_id))
+
+    def get_dt_instance(self, dt_id: str):
+        """Get a live Digital Twin instance from the house factory once"""
+        if dt_id in self._instances:
+            self.stats["hits"] += 1
+            return self._instances[dt_id]
+        self.stats["loads"] += 1
+        instance = self.house_factory.get_dt_instance(dt_id)
+        self._instances[dt_id] = instance
+        return instance
+
+    def _get(self, kind: str, doc_id: str, fields: Optional[List[str]], load) -> Optional[Dict]:
+        entry = self._documents.get((kind, doc_id))
+        if entry is not None and (entry[0] is None or _covered(entry[1], fields)):
+            self.stats["hits"] += 1
+            return entry[0]
+        self.stats["loads"] += 1
+        doc = load()
+        if doc is not None:
+            # Pending changes stay visible over a fresh full load
+            for path, value in self._dirty.get(kind, {}).get(doc_id, {}).items():
+                _set_path(doc, path, copy.deepcopy(value))
+        self._documents[(kind, doc_id)] = (doc, None)
+        return doc
+
+    def set_fields(self, dr_type: str, dr_id: str, fields: Dict) -> None:
+        """
+        Change fields of a Digital Replica, written by the next flush()
+
+        Args:
+            dr_type: Type of Digital Replica
+            dr_id: Digital Replica ID
+            fields: {dotted field path: value}
+        """
+        if not fields:
+            return
+        self._dirty.setdefault(dr_type, {}).setdefault(dr_id, {}).update(fields)
+        entry = self._documents.get((dr_type, dr_id))
+        if entry is not None and entry[0] is not None:
+            for path, value in fields.items():
+                _set_path(entry[0], path, value)
+
+    def is_dirty(self) -> bool:
+        return bool(self._dirty)
+
+    def flush(self) -> int:
+        """
+        Write all pending field changes, one bulk update per DR type
+
+        Returns:
+            int: Number of Digital Replicas written
+        """
+        written = 0
+        while self._dirty:
+            dr_type, updates = next(iter(self._dirty.items()))
+            try:
+                self.db_service.update_dr_fields_many(dr_type, updates, profile=self.profile)
+            except Exception as e:
+                raise Exception(f"Failed to flush unit of work: {str(e)}")
+            del self._dirty[dr_type]
+            written += len(updates)
+        self.stats["writes"] += written
+        return written
+
+    def discard(self) -> None:
+        """Drop the pending changes without writing them"""
+        if self._dirty:
+            logger.debug(f"Discarding unflushed changes of {sum(map(len, self._dirty.values()))} DRs")
+        self._dirty.clear()
@@ -3,10 +3,15 @@ from datetime import datetime
 from src.services.base import BaseService
 from src.application.telegram.handlers.login_handlers import logged_users
 from src.application.telegram.config.settings import (TELEGRAM_TOKEN)
+from flask import current_app
 import asyncio
+import logging
 import requests
 
 
+logger = logging.getLogger(__name__)
+
+
 class UserNotificationService(BaseService):
     """Service to predict the best room for a bottle based on temperature requirements"""
 
@@ -18,7 +23,8 @@ class UserNotificationService(BaseService):
         Notify the user if the data are out of bounds
 
         Args:
-            data: Dictionary containing room_id, user_id and text
+            data: Dictionary containing room_id, user_id and text, and
+                optionally the 'unit_of_work' the user is looked up in
             kwargs: contains user_id and text
         """
                 
@@ -31,13 +37,27 @@ class UserNotificationService(BaseService):
             raise ValueError("text is required")
         
         # check if user is connected in telegram otherwise do nothing
-        if user_id not in logged_users.values():
-            return
+        if user_id in logged_users.values():
+            # get the telegram user from a reverse dict search by values, Solution by: https://stackoverflow.com/a/8023306
+            telegram_user_id = list(logged_users.keys())[list(logged_users.values()).index(user_id)]
+        else:
+            # The login may have happened in another process (standalone ingest workers)
+            unit_of_work = data.get('unit_of_work')
+            if unit_of_work is not None:
+                user = unit_of_work.get_dr("user", user_id, fields=["data.telegram_id"])
+            else:
+                user = current_app.config["DB_SERVICE"].get_dr("user", user_id)
+            telegram_user_id = (user or {}).get("data", {}).get("telegram_id")
+            if not telegram_user_id:
+                return
 
-        # get the telegram user from a reverse dict search by values, Solution by: https://stackoverflow.com/a/8023306
-        telegram_user_id = list(logged_users.keys())[list(logged_users.values()).index(user_id)]
+        # hand the message to the shared dispatcher, fall back to a direct send
+        dispatcher = current_app.config.get("NOTIFICATION_DISPATCHER")
+        if dispatcher is not None:
+            if not dispatcher.submit(telegram_user_id, text):
+                logger.warning(f"Notification for user {user_id} dropped by the dispatcher")
+            return
 
-        # send the message to the user
         asyncio.run(telegram_message(telegram_user_id, text=text))
 
         return
@@ -0,0 +1,238 @@
+import logging
+from datetime import datetime
+from threading import Thread, Event, Lock
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+LocationKey = Tuple[float, float]
+
+
+class WeatherCache:
+    """Outdoor conditions shared by all houses, keyed by rounded coordinates
+
+    Lookups only read memory. A background thread refreshes every registered
+    location once its entry is older than the TTL, so houses close to each
+    other share one upstream fetch. Listeners are told about every refresh
+    round with the new entries and the owners (e.g. house ids) registered for
+    each location.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[float, float], Dict[str, Any]],
+        ttl: float = 900.0,
+        precision: int = 2,
+        refresh_interval: float = 60.0,
+        fetch_many: Optional[Callable[[List[LocationKey]], List[Dict[str, Any]]]] = None,
+    ):
+        """
+        Args:
+            fetch: Callable(longitude, latitude) returning at least
+                'temperature' and 'humidity'
+            fetch_many: Optional Callable(list of (longitude, latitude))
+                returning one result per location (None if it failed), used
+                to refresh all stale locations at once
+            ttl: Seconds after which an entry is refreshed
+            precision: Decimal places the coordinates are rounded to
+                (2 decimals are roughly 1 km)
+            refresh_interval: Seconds between checks for stale entries
+        """
+        self.fetch = fetch
+        self.fetch_many = fetch_many
+        self.ttl = ttl
+        self.precision = precision
+        self.refresh_interval = refresh_interval
+
+        self._entries: Dict[LocationKey, Dict] = {}
+        self._owners: Dict[LocationKey, Set[str]] = {}
+        self._listeners: List[Callable] = []
+        self._lock = Lock()
+        self._wakeup = Event()
+        self._stopping = Event()
+        self._thread = None
+        self._stats = {"hits": 0, "misses": 0, "fetches": 0, "fetch_errors": 0}
+
+    def location_key(self, longitude: float, latitude: float) -> LocationKey:
+        """Round coordinates to the cache resolution"""
+        return (round(float(longitude), self.precision), round(float(latitude), self.precision))
+
+    def register(self, longitude: float, latitude: float, owner: Optional[str] = None) -> LocationKey:
+        """
+        Register a location for background refreshing
+
+        Args:
+            longitude: Position
+            latitude: Position
+            owner: Optional id passed to the listeners, e.g. a house id
+
+        Returns:
+            LocationKey: The rounded key of the location
+        """
+        key = self.location_key(longitude, latitude)
+        with self._lock:
+            owners = self._owners.setdefault(key, set())
+            is_new = owner is not None and owner not in owners
+            if owner is not None:
+                owners.add(owner)
+            entry = self._entries.get(key)
+        if entry is None:
+            self._wakeup.set()
+        elif is_new:
+            # A new neighbour gets the shared value without another fetch
+            self._notify([(key, dict(entry), [owner])])
+        return key
+
+    def unregister(self, owner: str) -> None:
+        """Remove an owner from all locations"""
+        with self._lock:
+            for owners in self._owners.values():
+                owners.discard(owner)
+
+    def get(self, longitude: float, latitude: float, owner: Optional[str] = None) -> Optional[Dict]:
+        """
+        Memory lookup of the outdoor conditions at a location
+
+        Unknown locations are registered and fetched in the background.
+
+        Returns:
+            Optional[Dict]: temperature, humidity and fetched_at, None on a miss
+        """
+        key = self.location_key(longitude, latitude)
+        with self._lock:
+            entry = self._entries.get(key)
+            known_owner = owner is None or owner in self._owners.get(key, ())
+            if entry:
+                self._stats["hits"] += 1
+            else:
+                self._stats["misses"] += 1
+        if not entry or not known_owner:
+            self.register(longitude, latitude, owner)
+        return dict(entry) if entry else None
+
+    def age(self, longitude: float, latitude: float) -> Optional[float]:
+        """Seconds since the entry of a location was fetched, None if never"""
+        with self._lock:
+            entry = self._entries.get(self.location_key(longitude, latitude))
+        if not entry:
+            return None
+        return (datetime.utcnow() - entry["fetched_at"]).total_seconds()
+
+    def add_listener(self, listener: Callable[[List[Tuple[LocationKey, Dict, List[str]]]], None]) -> None:
+        """Call listener([(key, entry, owners), ...]) after every refresh round"""
+        self._listeners.append(listener)
+
+    def stale_keys(self) -> List[LocationKey]:
+        """Registered locations that were never fetched or are older than the TTL"""
+        now = datetime.utcnow()
+        with self._lock:
+            return [
+                key
+                for key in self._owners
+                if key not in self._entries
+                or (now - self._entries[key]["fetched_at"]).total_seconds() >= self.ttl
+            ]
+
+    def refresh(self, keys: Optional[List[LocationKey]] = None) -> int:
+        """
+        Fetch the given (default: stale) locations and notify the listeners
+
+        Returns:
+            int: Number of locations refreshed
+        """
+        keys = self.stale_keys() if keys is None else keys
+        if not keys:
+            return 0
+
+        fetched = []
+        if self.fetch_many is not None:
+            try:
+                fetched = list(zip(keys, self.fetch_many(keys)))
+            except Exception as e:
+                logger.error(f"Failed to fetch weather for {len(keys)} locations: {e}")
+                with self._lock:
+                    self._stats["fetch_errors"] += 1
+        else:
+            for key in keys:
+                longitude, latitude = key
+                try:
+                    fetched.append((key, self.fetch(longitude, latitude)))
+                except Exception as e:
+                    logger.error(f"Failed to fetch weather for {key}: {e}")
+                    with self._lock:
+                        self._stats["fetch_errors"] += 1
+
+        updates = []
+        now = datetime.utcnow()
+        with self._lock:
+            for key, weather in fetched:
+                if weather is None:
+                    # Kept stale, retried on the next round
+                    self._stats["fetch_errors"] += 1
+                    continue
+                entry = {
+                    "temperature": weather["temperature"],
+                    "humidity": weather["humidity"],
+                    "fetched_at": now,
+                }
+                self._entries[key] = entry
+                self._stats["fetches"] += 1
+                updates.append((key, dict(entry), sorted(self._owners.get(key, ()))))
+        self._notify(updates)
+        return len(updates)
+
+    def refresh_all(self) -> int:
+        """Refresh every registered location regardless of its age"""
+        with self._lock:
+            keys = list(self._owners)
+        return self.refresh(keys)
+
+    def _notify(self, updates: List[Tuple[LocationKey, Dict, List[str]]]) -> None:
+        """Pass a refresh round to all listeners"""
+        if not updates:
+            return
+        for listener in self._listeners:
+            try:
+                listener(updates)
+            except Exception as e:
+                logger.error(f"Weather cache listener failed: {e}")
+
+    def start(self) -> None:
+        """Start the background refresh thread"""
+        self._stopping.clear()
+        self._thread = Thread(target=self._refresh_loop, name="weather-cache")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def is_running(self) -> bool:
+        """Whether the background refresh thread is running"""
+        return self._thread is not None and self._thread.is_alive() and not self._stopping.is_set()
+
+    def stop(self) -> None:
+        """Stop the background refresh thread"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+
+    def _refresh_loop(self) -> None:
+        """Refresh stale entries periodically or when new locations appear"""
+        while not self._stopping.is_set():
+            self._wakeup.clear()
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Weather refresh failed: {e}")
+            self._wakeup.wait(self.refresh_interval)
+
+    def stats(self) -> Dict:
+        """Snapshot of the cache counters"""
+        now = datetime.utcnow()
+        with self._lock:
+            stats = dict(self._stats)
+            stats["locations"] = len(self._owners)
+            stats["entries"] = len(self._entries)
+            ages = [(now - e["fetched_at"]).total_seconds() for e in self._entries.values()]
+        stats["max_age_seconds"] = max(ages) if ages else None
+        return stats
@@ -1,10 +1,17 @@
-from typing import Dict, Any
+from typing import Dict, Any, List
 import yaml
 
+# Options an index declaration may carry besides its keys
+INDEX_OPTIONS = {"keys", "name", "unique", "sparse", "expire_after_seconds", "partial_filter"}
+# Options of the read-through cache section, see DocumentCache.configure
+CACHE_OPTIONS = {"max_entries", "ttl", "fields", "enabled"}
+
 
 class SchemaRegistry:
     def __init__(self):
         self.schemas = {}
+        self.indexes = {}
+        self.cache_configs = {}
 
     def load_schema(self, schema_type: str, yaml_path: str) -> None:
         """Load schema from YAML file"""
@@ -20,6 +27,15 @@ class SchemaRegistry:
                 raw_schema["schemas"]
             )
             self.schemas[schema_type] = validation_schema
+            self.indexes[schema_type] = self._parse_indexes(
+                raw_schema["schemas"].get("indexes") or []
+            )
+            cache_config = raw_schema["schemas"].get("cache")
+            if cache_config is not None:
+                unknown = set(cache_config) - CACHE_OPTIONS
+                if unknown:
+                    raise ValueError(f"Unknown cache options: {sorted(unknown)}")
+                self.cache_configs[schema_type] = cache_config
 
         except Exception as e:
             raise ValueError(f"Failed to load schema from {yaml_path}: {str(e)}")
@@ -85,6 +101,63 @@ class SchemaRegistry:
 
         return validation_schema
 
+    def _parse_indexes(self, yaml_indexes: List) -> List[Dict]:
+        """
+        Normalize the index declarations of a template
+
+        Keys are field paths, ascending, or {field: 1|-1} mappings. The
+        name defaults to the one MongoDB would generate.
+        """
+        indexes = []
+        for index in yaml_indexes:
+            if not isinstance(index, dict):
+                raise ValueError(f"Invalid index declaration: {index}")
+            unknown = set(index) - INDEX_OPTIONS
+            if unknown:
+                raise ValueError(f"Unknown index options: {sorted(unknown)}")
+
+            keys = []
+            for key in index.get("keys") or []:
+                if isinstance(key, str):
+                    keys.append((key, 1))
+                elif isinstance(key, dict) and len(key) == 1:
+                    field, direction = next(iter(key.items()))
+                    if direction not in (1, -1):
+                        raise ValueError(f"Invalid direction {direction} for index field {field}")
+                    keys.append((field, direction))
+                else:
+                    raise ValueError(f"Invalid index key: {key}")
+            if not keys:
+                raise ValueError("Index declaration without keys")
+
+            expire_after_seconds = index.get("expire_after_seconds")
+            if expire_after_seconds is not None and len(keys) != 1:
+                raise ValueError("TTL indexes must have exactly one key")
+
+            indexes.append({
+                "keys": keys,
+                "name": index.get("name") or "_".join(f"{field}_{direction}" for field, direction in keys),
+                "unique": bool(index.get("unique", False)),
+                "sparse": bool(index.get("sparse", False)),
+                "expire_after_seconds": expire_after_seconds,
+                "partial_filter": index.get("partial_filter"),
+            })
+        return indexes
+
+    def get_indexes(self, schema_type: str) -> List[Dict]:
+        """Get the declared indexes for type, normalized by _parse_indexes"""
+        if schema_type not in self.schemas:
+            raise ValueError(f"Schema not found for type: {schema_type}")
+        return self.indexes.get(schema_type, [])
+
+    def get_cache_config(self, schema_type: str) -> Dict:
+        """Get the read-through cache settings for type, empty if not cached"""
+        return self.cache_configs.get(schema_type, {})
+
+    def list_schema_types(self) -> List[str]:
+        """Types of all loaded schemas"""
+        return list(self.schemas.keys())
+
     def get_collection_name(self, schema_type: str) -> str:
         """Get collection name for schema type"""
         return f"{schema_type}_collection"
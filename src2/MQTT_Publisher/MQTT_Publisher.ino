@@ -1,6 +1,7 @@
 #include <ESP8266WiFi.h>
 #include <PubSubClient.h>
 #include <time.h>
+#include <sys/time.h>
 #include <TZ.h>
 #include <FS.h>
 #include <LittleFS.h>
@@ -8,9 +9,26 @@
 #include <DHT.h>
 #include <ArduinoJson.h>
 
-// Update this value with the room_id of the room where you want to use the sensor.
+// Update these values with the house_id and room_id of the room where you want to use the sensor.
+const char* house_id = "67a0c8e2f1b2c3d4e5f60718";
 const char* room_id = "eacb999b-fba9-432b-a0c9-40b444d18a77";
 
+// Set to 1 to publish the compact 8 byte binary payload instead of JSON
+// (see src/application/payload_codec.py)
+#define PAYLOAD_BINARY 0
+uint16_t seq = 0;
+
+// Number of readings sent together in one message, each with its own timestamp
+#define SAMPLES_PER_MESSAGE 1
+struct Sample {
+  unsigned long ms;
+  float temperature;
+  float humidity;
+};
+Sample samples[SAMPLES_PER_MESSAGE];
+double firstSampleTime = 0;
+uint8_t sampleCount = 0;
+
 // config.h contains all credentials
 #include "config.h"
 
@@ -124,6 +142,16 @@ void reconnect() {
   }
 }
 
+// Unix time with millisecond resolution, 0 before the NTP sync
+double currentTime() {
+  struct timeval tv;
+  gettimeofday(&tv, nullptr);
+  if (tv.tv_sec < 8 * 3600 * 2) {
+    return 0;
+  }
+  return tv.tv_sec + tv.tv_usec / 1000000.0;
+}
+
 void publishMessage(const char* topic, String payload, boolean retained){
   if (client->publish(topic, payload.c_str(), true)){
     Serial.println("Message published ["+String(topic)+"]: "+payload);
@@ -161,6 +189,8 @@ void setup() {
 
   client->setServer(mqtt_server, 8883);
   client->setCallback(callback);
+  // Room for batched JSON samples, PubSubClient defaults to 256 bytes
+  client->setBufferSize(256 + 96 * SAMPLES_PER_MESSAGE);
 
   dht.begin();
 }
@@ -181,16 +211,84 @@ void loop() {
     float humidity = dht.readHumidity();
     float temperature = dht.readTemperature();
 
-    // Create JSON payload
-    DynamicJsonDocument doc(1024);
-    doc["room_id"] = room_id;
-    doc["device_id"] = "NodeMCU";
-    doc["humidity"] = humidity;
-    doc["temperature"] = temperature;
-
-    // Publish MQTT message
-    char mqtt_message[128];
-    serializeJson(doc, mqtt_message);
-    publishMessage("measurement", mqtt_message, true);
+    if (sampleCount == 0) {
+      firstSampleTime = currentTime();
+    }
+    samples[sampleCount++] = { currentMillis, temperature, humidity };
+    if (sampleCount >= SAMPLES_PER_MESSAGE) {
+      publishSamples();
+      sampleCount = 0;
+    }
   }
-}
\ No newline at end of file
+}
+
+void publishSamples() {
+  // Publish MQTT message on measurement/<house_id>/<room_id>
+  String topic = String("measurement/") + house_id + "/" + room_id;
+  seq++;
+
+#if PAYLOAD_BINARY
+#if SAMPLES_PER_MESSAGE == 1
+  // version, flags, seq, temperature and humidity in hundredths, little endian
+  int16_t t = (int16_t) lroundf(samples[0].temperature * 100);
+  uint16_t h = (uint16_t) lroundf(samples[0].humidity * 100);
+  uint8_t payload[8] = {
+    1, 0,
+    (uint8_t) (seq & 0xFF), (uint8_t) (seq >> 8),
+    (uint8_t) (t & 0xFF), (uint8_t) ((t >> 8) & 0xFF),
+    (uint8_t) (h & 0xFF), (uint8_t) (h >> 8)
+  };
+#else
+  // version, flags (batch, millisecond offsets), seq, base time, count,
+  // then per sample the offset in ms, temperature and humidity in hundredths
+  uint8_t payload[9 + 8 * SAMPLES_PER_MESSAGE];
+  uint32_t base = (uint32_t) firstSampleTime;
+  uint32_t baseMillis = (uint32_t) ((firstSampleTime - base) * 1000);
+  payload[0] = 1;
+  payload[1] = 0x06;
+  payload[2] = seq & 0xFF;
+  payload[3] = seq >> 8;
+  for (int i = 0; i < 4; i++) {
+    payload[4 + i] = (base >> (8 * i)) & 0xFF;
+  }
+  payload[8] = SAMPLES_PER_MESSAGE;
+  for (int k = 0; k < SAMPLES_PER_MESSAGE; k++) {
+    uint32_t offset = baseMillis + (uint32_t) (samples[k].ms - samples[0].ms);
+    int16_t t = (int16_t) lroundf(samples[k].temperature * 100);
+    uint16_t h = (uint16_t) lroundf(samples[k].humidity * 100);
+    uint8_t* p = payload + 9 + 8 * k;
+    for (int i = 0; i < 4; i++) {
+      p[i] = (offset >> (8 * i)) & 0xFF;
+    }
+    p[4] = t & 0xFF; p[5] = (t >> 8) & 0xFF;
+    p[6] = h & 0xFF; p[7] = h >> 8;
+  }
+#endif
+  client->publish(topic.c_str(), payload, sizeof(payload), true);
+#else
+  // Create JSON payload, house and room are part of the topic
+  DynamicJsonDocument doc(256 + 96 * SAMPLES_PER_MESSAGE);
+  doc["device_id"] = "NodeMCU";
+  // Device time and sequence let the backend drop redelivered messages
+  doc["seq"] = seq;
+#if SAMPLES_PER_MESSAGE == 1
+  if (firstSampleTime > 0) {
+    doc["ts"] = firstSampleTime;
+  }
+  doc["humidity"] = samples[0].humidity;
+  doc["temperature"] = samples[0].temperature;
+#else
+  JsonArray list = doc.createNestedArray("samples");
+  for (int k = 0; k < SAMPLES_PER_MESSAGE; k++) {
+    JsonObject sample = list.createNestedObject();
+    sample["ts"] = firstSampleTime + (samples[k].ms - samples[0].ms) / 1000.0;
+    sample["temperature"] = samples[k].temperature;
+    sample["humidity"] = samples[k].humidity;
+  }
+#endif
+
+  String mqtt_message;
+  serializeJson(doc, mqtt_message);
+  publishMessage(topic.c_str(), mqtt_message, true);
+#endif
+}
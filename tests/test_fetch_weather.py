@@ -0,0 +1,135 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import flatbuffers
+import openmeteo_requests
+import pytest
+
+from src.services import fetch_weather
+from src.services.fetch_weather import FetchWeatherService
+from src.services.weather_cache import WeatherCache
+
+
+def _values(query, name):
+    return [float(value) for item in query.get(name, []) for value in item.split(",")]
+
+
+def _location(builder, latitude, longitude, temperature, humidity, rain=0.0):
+    """One WeatherApiResponse with the three current variables requested"""
+    variables = []
+    for value in (temperature, humidity, rain):
+        builder.StartObject(3)
+        builder.PrependFloat32Slot(2, value, 0.0)
+        variables.append(builder.EndObject())
+    builder.StartVector(4, len(variables), 4)
+    for variable in reversed(variables):
+        builder.PrependUOffsetTRelative(variable)
+    vector = builder.EndVector()
+    builder.StartObject(4)
+    builder.PrependUOffsetTRelativeSlot(3, vector, 0)
+    current = builder.EndObject()
+    builder.StartObject(10)
+    builder.PrependFloat32Slot(0, latitude, 0.0)
+    builder.PrependFloat32Slot(1, longitude, 0.0)
+    builder.PrependUOffsetTRelativeSlot(9, current, 0)
+    return builder.EndObject()
+
+
+def _encode(latitude, longitude):
+    # Temperature and humidity echo the coordinates so the order can be checked
+    builder = flatbuffers.Builder(256)
+    builder.FinishSizePrefixed(_location(builder, latitude, longitude, latitude, longitude))
+    return bytes(builder.Output())
+
+
+class StubOpenMeteo(BaseHTTPRequestHandler):
+    """Answers like the Open-Meteo forecast API in the flatbuffers format"""
+
+    requests = []
+    failing_latitudes = set()
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        latitudes, longitudes = _values(query, "latitude"), _values(query, "longitude")
+        self.requests.append(latitudes)
+        if self.failing_latitudes & set(latitudes):
+            self.send_response(500)
+            self.end_headers()
+            return
+        body = b"".join(_encode(latitude, longitude) for latitude, longitude in zip(latitudes, longitudes))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_url(monkeypatch):
+    StubOpenMeteo.requests = []
+    StubOpenMeteo.failing_latitudes = set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenMeteo)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    # No HTTP cache or retries in front of the stub
+    monkeypatch.setattr(fetch_weather, "_openmeteo_client", openmeteo_requests.Client())
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1/forecast"
+    server.shutdown()
+    server.server_close()
+
+
+def _locations(count):
+    return [(float(i), float(i)) for i in range(count)]
+
+
+def test_batch_is_chunked_at_50_locations(stub_url):
+    service = FetchWeatherService(url=stub_url)
+
+    results = service.fetch_weather_batch(_locations(120))
+
+    assert [len(latitudes) for latitudes in StubOpenMeteo.requests] == [50, 50, 20]
+    assert [result["temperature"] for result in results] == [float(i) for i in range(120)]
+
+
+def test_single_location_uses_the_batch_request(stub_url):
+    service = FetchWeatherService(url=stub_url)
+
+    assert service.fetch_weather(9.5, 45.5) == {"temperature": 45.5, "humidity": 9.5}
+    assert len(StubOpenMeteo.requests) == 1
+
+
+def test_failed_chunk_keeps_the_other_chunks(stub_url):
+    StubOpenMeteo.failing_latitudes = {60.0}
+    service = FetchWeatherService(url=stub_url)
+
+    results = service.fetch_weather_batch(_locations(120))
+
+    assert results[50:100] == [None] * 50
+    assert [result["temperature"] for result in results[:50] + results[100:]] == [
+        float(i) for i in list(range(50)) + list(range(100, 120))
+    ]
+
+
+def test_single_location_failure_raises(stub_url):
+    StubOpenMeteo.failing_latitudes = {1.0}
+    service = FetchWeatherService(url=stub_url)
+
+    with pytest.raises(ValueError):
+        service.fetch_weather(1.0, 1.0)
+
+
+def test_weather_cache_refresh_keeps_successful_chunks(stub_url):
+    StubOpenMeteo.failing_latitudes = {60.0}
+    service = FetchWeatherService(url=stub_url)
+    cache = WeatherCache(service.fetch_weather, fetch_many=service.fetch_weather_batch)
+    for longitude, latitude in _locations(120):
+        cache.register(longitude, latitude, owner=f"house-{int(latitude)}")
+
+    assert cache.refresh_all() == 70
+    assert cache.get(10.0, 10.0)["temperature"] == 10.0
+    assert cache.get(60.0, 60.0) is None
+    assert cache.stats()["fetch_errors"] == 50
@@ -0,0 +1,248 @@
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+
+from src.digital_twin.house_factory import HouseFactory
+from src.services.database_service import DatabaseService
+from src.services.latest_state import LatestStateTable
+from src.virtualization.digital_replica.schema_registry import SchemaRegistry
+
+BACKENDS = ["mongomock", "sqlite"]
+T0 = datetime(2024, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def schema_registry():
+    registry = SchemaRegistry()
+    registry.load_schema("ventilation", "src/virtualization/templates/ventilation.yaml")
+    registry.load_schema("user", "src/virtualization/templates/user.yaml")
+    registry.load_schema("room", "src/virtualization/templates/room.yaml")
+    return registry
+
+
+def _db_service(backend, schema_registry, tmp_path):
+    if backend == "sqlite":
+        db_service = DatabaseService(f"sqlite:///{tmp_path / 'test.sqlite3'}", "test", schema_registry, bucket_size=3)
+        db_service.connect()
+        return db_service
+    db_service = DatabaseService("mongodb://localhost", "test", schema_registry, bucket_size=3)
+    db_service.client = mongomock.MongoClient()
+    db_service.db = db_service.client["test"]
+    db_service._init_measurement_collection()
+    db_service._init_dedup_collection()
+    return db_service
+
+
+@pytest.fixture(params=BACKENDS)
+def db_service(request, schema_registry, tmp_path):
+    db_service = _db_service(request.param, schema_registry, tmp_path)
+    yield db_service
+    db_service.disconnect()
+
+
+def _room(number, floor, status="active", house_id="h1", humidity=50.0, handle=None):
+    room = {
+        "_id": f"room-{number}",
+        "type": "room",
+        "profile": {"name": f"Room {number}", "room_number": str(number), "floor": floor},
+        "metadata": {"created_at": T0, "updated_at": T0, "privacy_level": "private"},
+        "data": {
+            "status": status,
+            "temperature": 20.0 + number,
+            "humidity": humidity,
+            "house_id": house_id,
+            "user": [f"user-{number % 2}"],
+            "devices": [],
+        },
+    }
+    if handle is not None:
+        room["profile"]["device_handle"] = handle
+    return room
+
+
+def _strip_updated_at(doc):
+    """The document without the write time set by the update methods"""
+    doc = {key: value for key, value in doc.items()}
+    if isinstance(doc.get("metadata"), dict):
+        doc["metadata"] = {key: value for key, value in doc["metadata"].items() if key != "updated_at"}
+    return doc
+
+
+def _scenario(db_service):
+    """The same DatabaseService and HouseFactory calls on one backend, results by step"""
+    results = {}
+    db_service.ensure_indexes()
+    db_service.save_drs("room", [_room(i, i % 3, handle=i + 1) for i in range(1, 7)])
+    db_service.save_dr("room", _room(7, 2, status="inactive", house_id="h2"))
+
+    results["get"] = db_service.get_dr("room", "room-3")
+    results["get_fields"] = db_service.get_dr("room", "room-3", fields=["profile.name", "data.humidity"])
+    results["get_missing"] = db_service.get_dr("room", "room-99")
+    results["in"] = db_service.query_drs("room", {"_id": {"$in": ["room-2", "room-5", "room-99"]}}, projection=["_id"])
+    results["gt_nested"] = db_service.query_drs(
+        "room", {"data.temperature": {"$gt": 23.0}, "profile.floor": {"$lte": 1}}, projection=["data.temperature"]
+    )
+    results["or"] = db_service.query_drs(
+        "room", {"$or": [{"data.status": "inactive"}, {"profile.floor": 0}]}, projection=["data.status", "profile.floor"]
+    )
+    results["exists"] = db_service.query_drs("room", {"profile.device_handle": {"$exists": False}}, projection=["_id"])
+    results["exclude"] = db_service.query_drs("room", {"_id": "room-1"}, projection={"data": 0, "metadata": 0})
+    results["iter"] = list(db_service.iter_drs("room", {"data.house_id": "h1"}, projection=["_id"], batch_size=2))
+
+    pages, after = [], None
+    while True:
+        page, after = db_service.page_drs("room", {"data.status": "active"}, projection=["_id"], limit=4, after=after)
+        pages.append(page)
+        if after is None:
+            break
+    results["pages"] = pages
+
+    db_service.update_dr("room", "room-1", {"data": {**_room(1, 1)["data"], "status": "maintenance"}})
+    results["update_dr"] = _strip_updated_at(db_service.get_dr("room", "room-1"))
+
+    results["update_fields"] = db_service.update_dr_fields(
+        "room", "room-2", {"data.humidity": 61.5, "profile.description": "Bath"}, projection=["data.humidity", "profile"]
+    )
+    results["update_fields_missing"] = db_service.update_dr_fields("room", "room-99", {"data.humidity": 1.0}, projection=["_id"])
+    results["update_many"] = db_service.update_dr_fields_many(
+        "room",
+        {"room-3": {"data.humidity": 70.0}, "room-4": {"data.humidity": 71.0}, "room-7": {"data.humidity": 72.0}},
+        projection=["data.humidity"],
+        match={"room-3": {"data.house_id": "h1"}, "room-4": {"data.house_id": "h1"}, "room-7": {"data.house_id": "h1"}},
+    )
+    results["update_many_stored"] = db_service.query_drs(
+        "room", {"_id": {"$in": ["room-3", "room-4", "room-7"]}}, projection=["data.humidity"]
+    )
+
+    results["sequence"] = [db_service.next_sequence("device_handle") for _ in range(3)]
+    results["claim_first"] = db_service.claim_ingest_keys(["a", "b", "a"])
+    results["claim_again"] = db_service.claim_ingest_keys(["b", "c"])
+
+    db_service.append_measurements(
+        "room", [("room-1", {"timestamp": T0 + timedelta(seconds=s), "humidity": float(s)}) for s in (50, 10, 30, 40, 20)]
+    )
+    db_service.append_measurement("room", "room-2", {"timestamp": T0, "humidity": 1.0})
+    results["measurements"] = db_service.get_measurements("room", "room-1")
+    results["measurements_range"] = db_service.get_measurements(
+        "room", "room-1", start=T0 + timedelta(seconds=20), end=T0 + timedelta(seconds=40)
+    )
+
+    db_service.delete_dr("room", "room-1")
+    results["deleted"] = db_service.get_dr("room", "room-1")
+    results["deleted_measurements"] = db_service.get_measurements("room", "room-1")
+    results["other_measurements"] = db_service.get_measurements("room", "room-2")
+    with pytest.raises(Exception, match="not found"):
+        db_service.delete_dr("room", "room-1")
+    with pytest.raises(Exception):
+        db_service.save_dr("room", _room(8, 0, handle=3))
+
+    house_factory = HouseFactory(db_service, db_service.schema_registry)
+    house_id = house_factory.create_dt("House", longitude=7.1, latitude=50.7)
+    house_factory.add_room(house_id, "room", "room-2")
+    house_factory.add_room(house_id, "room", "room-3")
+    house_factory.remove_room(house_id, "room-2")
+    house_factory.update_temperature_humidity_many(
+        {house_id: {"temperature": 4.5, "relative_humidity": 80.0, "absolute_humidity": 5.2}}
+    )
+    house = _strip_updated_at(house_factory.get_dt(house_id))
+    results["house"] = {**house, "_id": "house", "metadata": {**house["metadata"], "created_at": None}}
+    results["houses_page"] = [
+        doc["name"] for doc in house_factory.page_dts({"relative_humidity": {"$gte": 80.0}}, projection=["name"])[0]
+    ]
+    return results
+
+
+def test_scenario_results(db_service):
+    results = _scenario(db_service)
+
+    assert results["get"] == _room(3, 0, handle=4)
+    assert results["get_fields"] == {"_id": "room-3", "profile": {"name": "Room 3"}, "data": {"humidity": 50.0}}
+    assert results["get_missing"] is None
+    assert sorted(doc["_id"] for doc in results["in"]) == ["room-2", "room-5"]
+    assert sorted(doc["_id"] for doc in results["gt_nested"]) == ["room-4", "room-6"]
+    assert sorted(doc["_id"] for doc in results["or"]) == ["room-3", "room-6", "room-7"]
+    assert [doc["_id"] for doc in results["exists"]] == ["room-7"]
+    assert results["exclude"] == [{"_id": "room-1", "type": "room", "profile": _room(1, 1, handle=2)["profile"]}]
+    assert sorted(doc["_id"] for doc in results["iter"]) == [f"room-{i}" for i in range(1, 7)]
+    assert [[doc["_id"] for doc in page] for page in results["pages"]] == [
+        ["room-1", "room-2", "room-3", "room-4"],
+        ["room-5", "room-6"],
+    ]
+
+    assert results["update_dr"]["data"]["status"] == "maintenance"
+    assert results["update_fields"]["data"] == {"humidity": 61.5}
+    assert results["update_fields"]["profile"]["description"] == "Bath"
+    assert results["update_fields"]["profile"]["name"] == "Room 2"
+    assert results["update_fields_missing"] is None
+    assert {doc_id: doc["data"]["humidity"] for doc_id, doc in results["update_many"].items()} == {
+        "room-3": 70.0,
+        "room-4": 71.0,
+    }
+    assert {doc["_id"]: doc["data"]["humidity"] for doc in results["update_many_stored"]} == {
+        "room-3": 70.0,
+        "room-4": 71.0,
+        "room-7": 50.0,
+    }
+
+    assert results["sequence"] == [1, 2, 3]
+    assert results["claim_first"] == {"a", "b"}
+    assert results["claim_again"] == {"c"}
+
+    assert [m["humidity"] for m in results["measurements"]] == [10.0, 20.0, 30.0, 40.0, 50.0]
+    assert [m["humidity"] for m in results["measurements_range"]] == [20.0, 30.0, 40.0]
+    assert results["deleted"] is None
+    assert results["deleted_measurements"] == []
+    assert [m["humidity"] for m in results["other_measurements"]] == [1.0]
+
+    assert [room["id"] for room in results["house"]["rooms"]] == ["room-3"]
+    assert results["house"]["temperature"] == 4.5
+    assert results["house"]["relative_humidity"] == 80.0
+    assert results["houses_page"] == ["House"]
+
+
+def _sorted_lists(value):
+    """Query results whose order the backends may choose freely, sorted by _id"""
+    if isinstance(value, list) and all(isinstance(item, dict) and "_id" in item for item in value):
+        return sorted(value, key=lambda item: item["_id"])
+    return value
+
+
+def test_backends_agree(schema_registry, tmp_path):
+    mongo = _db_service("mongomock", schema_registry, tmp_path)
+    sqlite = _db_service("sqlite", schema_registry, tmp_path)
+    try:
+        expected, actual = _scenario(mongo), _scenario(sqlite)
+    finally:
+        mongo.disconnect()
+        sqlite.disconnect()
+
+    assert expected.keys() == actual.keys()
+    for step in expected:
+        assert _sorted_lists(actual[step]) == _sorted_lists(expected[step]), step
+
+
+def test_reads_apply_pending_latest_values(db_service):
+    db_service.save_drs("room", [_room(1, 0), _room(2, 0)])
+    table = LatestStateTable(interval=3600)
+    table.configure("room", lambda updates: db_service.update_dr_fields_many("room", updates))
+    db_service.latest_state = table
+    table.write("room", table.offer("room", {"room-1": {"data.humidity": 55.0}}))
+    # Within the interval and without a delta the new value stays pending
+    assert table.offer("room", {"room-1": {"data.humidity": 60.0}}) == {}
+
+    assert db_service.get_dr("room", "room-1")["data"]["humidity"] == 60.0
+    assert db_service.get_drs("room", ["room-1"], ["data.humidity"])["room-1"]["data"] == {"humidity": 60.0}
+    assert [doc["data"]["humidity"] for doc in db_service.query_drs("room", {}, projection=["data.humidity"])] == [60.0, 50.0]
+    assert [doc["data"]["humidity"] for doc in db_service.iter_drs("room", {}, projection=["data"])] == [60.0, 50.0]
+    docs, _ = db_service.page_drs("room", projection=["data.humidity"], limit=1)
+    assert docs[0]["data"] == {"humidity": 60.0}
+    # Pending values outside the projection are not added
+    assert db_service.page_drs("room", projection=["profile.name"], limit=1)[0][0] == {
+        "_id": "room-1",
+        "profile": {"name": "Room 1"},
+    }
+    assert "data" not in db_service.query_drs("room", {"_id": "room-1"}, projection={"data": 0})[0]
+
+    table.flush(force=True)
+    assert db_service.query_drs("room", {"_id": "room-1"}, projection=["data.humidity"])[0]["data"]["humidity"] == 60.0
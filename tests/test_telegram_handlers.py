@@ -0,0 +1,155 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import mongomock
+import pytest
+from flask import Flask
+
+pytest.importorskip("telegram")
+from telegram.ext import Application, CommandHandler
+from telegram.request import BaseRequest
+
+# The settings module refuses to load without its tokens
+os.environ.setdefault("TELEGRAM_TOKEN", "123456:TEST")
+os.environ.setdefault("NGROK_TOKEN", "test")
+
+from src.application.telegram.handlers.login_handlers import login_handler, logged_users
+from src.application.telegram.handlers.room_handlers import list_rooms
+from src.application.telegram.routes.webhook_routes import init_routes, register_webhook
+from src.services.async_database_service import AsyncDatabaseService
+from src.services.database_service import DatabaseService
+from src.virtualization.digital_replica.schema_registry import SchemaRegistry
+
+CHAT_ID = 4242
+
+
+class RecordingRequest(BaseRequest):
+    """Bot API answering getMe and recording the messages sent, without a network"""
+
+    def __init__(self):
+        self.sent = []
+
+    @property
+    def read_timeout(self):
+        return 5.0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        endpoint = url.rsplit("/", 1)[-1]
+        if endpoint == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Test", "username": "test_bot"}
+        elif endpoint == "sendMessage":
+            params = request_data.parameters
+            self.sent.append(params["text"])
+            result = {
+                "message_id": len(self.sent),
+                "date": int(time.time()),
+                "chat": {"id": params["chat_id"], "type": "private"},
+                "text": params["text"],
+            }
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def _update(update_id, text):
+    command = text.split()[0]
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": CHAT_ID, "type": "private"},
+            "from": {"id": CHAT_ID, "is_bot": False, "first_name": "Mario"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}],
+        },
+    }
+
+
+@pytest.fixture
+def db_service():
+    registry = SchemaRegistry()
+    registry.load_schema("user", "src/virtualization/templates/user.yaml")
+    registry.load_schema("room", "src/virtualization/templates/room.yaml")
+    db_service = DatabaseService("mongodb://localhost", "test", registry)
+    db_service.client = mongomock.MongoClient()
+    db_service.db = db_service.client["test"]
+    db_service.save_dr(
+        "user",
+        {
+            "_id": "user-1",
+            "type": "user",
+            "profile": {"username": "mario", "password": "secret"},
+            "data": {"assigned_rooms": ["room-1", "room-2"]},
+            "metadata": {"created_at": datetime.utcnow(), "updated_at": datetime.utcnow()},
+        },
+    )
+    return db_service
+
+
+@pytest.fixture
+def telegram_loop(db_service):
+    """Application started like FlaskServer does, its loop running in a thread"""
+    request = RecordingRequest()
+    loop = asyncio.new_event_loop()
+    application = (
+        Application.builder()
+        .token(os.environ["TELEGRAM_TOKEN"])
+        .request(request)
+        .get_updates_request(RecordingRequest())
+        .concurrent_updates(4)
+        .build()
+    )
+    application.loop = loop
+    application.add_handler(CommandHandler("login", login_handler))
+    application.add_handler(CommandHandler("list_rooms", list_rooms))
+    loop.run_until_complete(application.initialize())
+    loop.run_until_complete(application.start())
+    thread = threading.Thread(target=loop.run_forever, name="telegram-loop", daemon=True)
+    thread.start()
+    async_db_service = AsyncDatabaseService(db_service, max_workers=2)
+    application.bot_data["ASYNC_DB_SERVICE"] = async_db_service
+    yield application, request
+
+    async def shutdown():
+        await application.stop()
+        await application.shutdown()
+
+    asyncio.run_coroutine_threadsafe(shutdown(), loop).result(timeout=10)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=5)
+    loop.close()
+    async_db_service.shutdown()
+    logged_users.pop(CHAT_ID, None)
+
+
+def _wait_for(request, count, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while len(request.sent) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return request.sent
+
+
+def test_queued_updates_reach_the_database_outside_an_app_context(telegram_loop, db_service):
+    application, request = telegram_loop
+    app = Flask(__name__)
+    register_webhook(app)
+    init_routes(application)
+    client = app.test_client()
+
+    assert client.post("/api/webhook/telegram", json=_update(1, "/login mario secret")).data == b"OK"
+    assert _wait_for(request, 1) == ["Login successful! Your rooms:\n- room-1\n- room-2"]
+    assert db_service.get_dr("user", "user-1")["data"]["telegram_id"] == CHAT_ID
+
+    assert client.post("/api/webhook/telegram", json=_update(2, "/list_rooms")).data == b"OK"
+    assert _wait_for(request, 2)[1] == "Rooms assigned to user:\n- room-1\n- room-2"